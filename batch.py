@@ -0,0 +1,215 @@
+"""
+Batch runner for `summarizer.scrape` over large lists of company URLs.
+
+URLs are read lazily from a file or stdin and scraped on a thread or process pool.
+Each `WebsiteSummary.dict()` is appended to a JSONL file as soon as it is ready,
+and the domain is then recorded in a checkpoint file, so a crashed run can be
+started again with the same arguments and will skip the domains already done.
+Failed scrapes are written with an "error" field and retried on the next run.
+With --store, records are also appended to a columnar `results_store.ResultsStore`.
+With --extract-workers, the thread workers share an `extract_pool.ExtractionPool`
+that parses pages in that many processes.
+
+    python batch.py companies.txt --output results.jsonl --workers 8
+    cat companies.txt | python batch.py - --output results.jsonl --executor process
+"""
+import argparse
+import contextlib
+import functools
+import json
+import logging
+import os
+import sys
+import traceback
+from concurrent.futures import (
+    ALL_COMPLETED,
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from datetime import datetime, timezone
+
+import domains
+import instrumentation
+
+
+def read_urls(source):
+    """
+    Yield URLs from a file path, "-" for stdin, or any iterable of lines.
+    Blank lines and lines starting with "#" are skipped.
+    """
+    if source == "-":
+        lines = sys.stdin
+    elif isinstance(source, str):
+        lines = open(source, encoding="utf-8")
+    else:
+        lines = source
+    try:
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+    finally:
+        if isinstance(source, str) and source != "-":
+            lines.close()
+
+
+def load_checkpoint(checkpoint_path):
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def scrape_one(url, chain_type="auto", max_urls=5, extraction_pool=None):
+    """
+    Scrape one company and return a JSONL record. Runs inside the worker pool, so it
+    imports the summarizer there and never raises.
+    """
+    record = {
+        "url": url,
+        "domain": domains.domain_of(url),
+        "scraped_at": datetime.now(timezone.utc).isoformat(),
+    }
+    try:
+        import summarizer
+
+        record["summary"] = summarizer.scrape(
+            url, chain_type=chain_type, max_urls=max_urls, extraction_pool=extraction_pool
+        )
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        record["traceback"] = traceback.format_exc()
+    return record
+
+
+def run_batch(
+    urls,
+    output_path,
+    checkpoint_path=None,
+    workers=4,
+    executor="thread",
+    chain_type="auto",
+    max_urls=5,
+    scrape=scrape_one,
+    store=None,
+    extract_workers=0,
+):
+    """
+    Scrape every URL in `urls` (any iterable, consumed lazily) and append the results
+    to `output_path`, and to `store` (a `results_store.ResultsStore`) if given.
+    With `extract_workers`, pages are parsed on an `extract_pool.ExtractionPool` of
+    that many processes, passed to `scrape` as `extraction_pool` (thread executor only).
+    Returns counts of completed, failed and skipped URLs.
+    """
+    if extract_workers and executor == "process":
+        raise ValueError("extract_workers needs the thread executor; process workers already parse in parallel")
+    extraction = contextlib.nullcontext()
+    if extract_workers:
+        import extract_pool
+
+        extraction = extract_pool.ExtractionPool(workers=extract_workers)
+        scrape = functools.partial(scrape, extraction_pool=extraction)
+    checkpoint_path = checkpoint_path or output_path + ".checkpoint"
+    done = load_checkpoint(checkpoint_path)
+    stats = {"completed": 0, "failed": 0, "skipped": 0}
+    pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    # Keep a bounded number of scrapes queued so huge inputs are streamed, not loaded.
+    max_pending = workers * 2
+    pending = {}
+    submitted = set()
+
+    with open(output_path, "a", encoding="utf-8") as output, open(
+        checkpoint_path, "a", encoding="utf-8"
+    ) as checkpoint, extraction, pool_class(max_workers=workers) as pool:
+
+        def drain(return_when):
+            finished, _ = wait(pending, return_when=return_when)
+            for future in finished:
+                url = pending.pop(future)
+                record = future.result()
+                output.write(json.dumps(record, default=str) + "\n")
+                output.flush()
+                if store is not None:
+                    store.append(record)
+                if "error" in record:
+                    stats["failed"] += 1
+                    print(f"Failed to scrape {url}: {record['error']}")
+                    continue
+                checkpoint.write(record["domain"] + "\n")
+                checkpoint.flush()
+                stats["completed"] += 1
+
+        for url in urls:
+            domain = domains.domain_of(url)
+            if domain in done or domain in submitted:
+                stats["skipped"] += 1
+                continue
+            submitted.add(domain)
+            pending[pool.submit(scrape, url, chain_type, max_urls)] = url
+            if len(pending) >= max_pending:
+                drain(FIRST_COMPLETED)
+        if pending:
+            drain(ALL_COMPLETED)
+    if store is not None:
+        store.flush()
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape and summarize many company websites.")
+    parser.add_argument("input", help="File with one URL per line, or - for stdin")
+    parser.add_argument("--output", "-o", default="results.jsonl")
+    parser.add_argument("--checkpoint", default=None, help="Defaults to <output>.checkpoint")
+    parser.add_argument("--workers", "-w", type=int, default=4)
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument(
+        "--chain-type", choices=["auto", "stuff", "refine", "map_reduce"], default="auto"
+    )
+    parser.add_argument("--max-urls", type=int, default=5)
+    parser.add_argument("--store", help="Also append records to this columnar results store directory")
+    parser.add_argument(
+        "--extract-workers",
+        type=int,
+        default=0,
+        help="Parse pages in this many processes shared by the thread workers",
+    )
+    parser.add_argument(
+        "--metrics",
+        help="Write timings and counters here (.prom for Prometheus text, else JSON); "
+        "with --executor process only the parent process is measured",
+    )
+    parser.add_argument("--verbose", "-v", action="store_true", help="Log progress and dump page text")
+    args = parser.parse_args(argv)
+    if args.extract_workers and args.executor == "process":
+        parser.error("--extract-workers needs --executor thread")
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    instrumentation.set_verbose(args.verbose)
+    metrics = instrumentation.enable() if args.metrics else None
+    store = None
+    if args.store:
+        import results_store
+
+        store = results_store.ResultsStore(args.store)
+
+    stats = run_batch(
+        read_urls(args.input),
+        args.output,
+        checkpoint_path=args.checkpoint,
+        workers=args.workers,
+        executor=args.executor,
+        chain_type=args.chain_type,
+        max_urls=args.max_urls,
+        store=store,
+        extract_workers=args.extract_workers,
+    )
+    if metrics is not None:
+        metrics.write(args.metrics)
+    print(json.dumps(stats))
+    return 0 if stats["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Throughput and guarantees of the distributed job queue (distributed.py).
+
+`--domains` x `--urls-per-domain` jobs are processed by `--workers` worker
+threads with a stand-in scrape that sleeps `--work-ms`. `--crashes` extra
+workers each lease one job and die without acking it, so their jobs must come
+back after the lease runs out. The report gives jobs/s, jobs completed, jobs
+redelivered, and the highest number of workers seen on one domain at the same
+time (1 means no two workers ever crawled the same site at once). Both backends
+run: SQLite and the Redis queue on InMemoryRedis.
+
+    python benchmarks/bench_distributed.py [--workers 8] [--domains 40] [--urls-per-domain 5]
+        [--work-ms 20] [--crashes 2] [--lease-seconds 1] [--json out.json]
+"""
+import argparse
+import collections
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import distributed  # noqa: E402
+
+
+class Probe:
+    """
+    Stand-in scrape that tracks how many workers are on each domain at once.
+    """
+
+    def __init__(self, work_seconds):
+        self.work_seconds = work_seconds
+        self.active = collections.Counter()
+        self.max_per_domain = 0
+        self.calls = collections.Counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, url, **payload):
+        domain = distributed.registrable_domain(url)
+        with self._lock:
+            self.active[domain] += 1
+            self.calls[url] += 1
+            self.max_per_domain = max(self.max_per_domain, self.active[domain])
+        time.sleep(self.work_seconds)
+        with self._lock:
+            self.active[domain] -= 1
+        return {"url": url, "summary": {"company_name": domain}}
+
+
+def run(queue, args):
+    urls = [
+        f"https://{'www' if i % 2 else 'shop'}.company{d}.co.uk/page{i}"
+        for d in range(args.domains)
+        for i in range(args.urls_per_domain)
+    ]
+    queue.put_many(distributed.new_job(url, max_urls=5) for url in urls)
+
+    # Workers that die mid-job: lease one job each and never heartbeat or ack.
+    for crash in range(args.crashes):
+        queue.lease(f"crashed-{crash}")
+
+    probe = Probe(args.work_ms / 1000)
+    workers = [distributed.Worker(queue, scrape=probe, worker_id=f"worker-{n}") for n in range(args.workers)]
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker.run, kwargs={"poll_interval": 0.05}) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    stats = queue.stats()
+    return {
+        "jobs": len(urls),
+        "seconds": round(seconds, 3),
+        "jobs_per_second": round(len(urls) / seconds, 1),
+        "done": stats["done"],
+        "failed": stats["failed"],
+        "redelivered": args.crashes,
+        "scraped_twice": sum(1 for count in probe.calls.values() if count > 1),
+        "max_workers_per_domain": probe.max_per_domain,
+        "lost_leases": sum(worker.stats["lost_leases"] for worker in workers),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--domains", type=int, default=40)
+    parser.add_argument("--urls-per-domain", type=int, default=5)
+    parser.add_argument("--work-ms", type=float, default=20)
+    parser.add_argument("--crashes", type=int, default=2)
+    parser.add_argument("--lease-seconds", type=float, default=1.0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = {}
+    ok = True
+    with tempfile.TemporaryDirectory() as directory:
+        queues = {
+            "sqlite": distributed.SQLiteQueue(os.path.join(directory, "jobs.sqlite"), lease_seconds=args.lease_seconds),
+            "redis (in memory)": distributed.RedisQueue(distributed.InMemoryRedis(), lease_seconds=args.lease_seconds),
+        }
+        for name, queue in queues.items():
+            row = report[name] = run(queue, args)
+            ok = ok and row["done"] == row["jobs"] and row["max_workers_per_domain"] == 1
+            print(
+                f"{name:<18} {row['jobs_per_second']:7.1f} jobs/s  done {row['done']}/{row['jobs']}  "
+                f"redelivered {row['redelivered']}  max workers per domain {row['max_workers_per_domain']}"
+            )
+        queues["sqlite"].close()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Micro-benchmark for html_text backends over the saved HTML fixtures.
+
+For each fixture and extraction mode it checks that every backend produces the
+same text as the original BeautifulSoup code (compared with whitespace
+normalized), then times each backend. selectolax parses by the HTML5 rules, so it
+is expected to differ on some malformed markup (e.g. an unclosed <title>) and on
+<template> contents; the exit status only reflects the default backend.
+
+    python benchmarks/bench_html_text.py [--repeat 200] [--fixtures DIR]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup  # noqa: E402
+from bs4.element import Comment  # noqa: E402
+
+import html_text  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "html")
+
+
+# The original BeautifulSoup implementations, kept here as the reference output.
+def reference_fallback(content):
+    soup = BeautifulSoup(content, "html.parser")
+    cleaned_text = ""
+    for item in soup.find_all(string=True):
+        if item.parent.name not in html_text.FALLBACK_BLACKLIST:
+            cleaned_text += "{} ".format(item)
+    return cleaned_text.replace("\t", "").strip()
+
+
+def reference_visible(content):
+    def tag_visible(element):
+        if element.parent.name in html_text.INVISIBLE_TAGS:
+            return False
+        return not isinstance(element, Comment)
+
+    soup = BeautifulSoup(content, "html.parser")
+    return " ".join(t.strip() for t in filter(tag_visible, soup.find_all(string=True)))
+
+
+def reference_all(content):
+    return BeautifulSoup(content, "html.parser").get_text(separator=" ", strip=True)
+
+
+REFERENCES = {"fallback": reference_fallback, "visible": reference_visible, "all": reference_all}
+
+
+def normalize(text):
+    return " ".join(text.split())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--fixtures", default=FIXTURES)
+    args = parser.parse_args(argv)
+
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(args.fixtures, "*.html"))):
+        with open(path, "rb") as f:
+            pages[os.path.basename(path)] = f.read()
+    backends = html_text.available_backends()
+    total_bytes = sum(len(raw) for raw in pages.values())
+    print(f"{len(pages)} fixtures, {total_bytes} bytes, backends: {', '.join(backends)}\n")
+
+    mismatches = dict.fromkeys(backends, 0)
+    for mode, reference in REFERENCES.items():
+        expected = {name: normalize(reference(raw)) for name, raw in pages.items()}
+        for backend in backends:
+            for name, raw in pages.items():
+                got = normalize(html_text.extract_text(raw, mode, backend))
+                if got != expected[name]:
+                    mismatches[backend] += 1
+                    print(f"MISMATCH mode={mode} backend={backend} fixture={name}")
+                    print(f"  expected: {expected[name][:200]!r}")
+                    print(f"  got:      {got[:200]!r}")
+
+        timings = {}
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for raw in pages.values():
+                reference(raw)
+        timings["reference"] = time.perf_counter() - start
+        for backend in backends:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                for raw in pages.values():
+                    html_text.extract_text(raw, mode, backend)
+            timings[backend] = time.perf_counter() - start
+
+        calls = args.repeat * len(pages)
+        print(f"mode={mode}")
+        for name, elapsed in timings.items():
+            speedup = timings["reference"] / elapsed if elapsed else float("inf")
+            print(f"  {name:<10} {elapsed / calls * 1e6:9.1f} us/page  {speedup:5.1f}x")
+    print()
+    for backend, count in mismatches.items():
+        print(f"{backend}: {count} mismatches")
+    return 1 if mismatches[html_text.default_backend()] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Import-time benchmark for the project's modules, based on `python -X importtime`.
+
+Each module is imported in a fresh interpreter `--repeat` times. The report
+gives the best cumulative import time of the module itself and the heaviest
+dependencies it pulled in. With --budget-ms the exit status is 1 when any
+module takes longer, so this can guard startup time in CI.
+
+    python benchmarks/bench_import_time.py [--modules summarizer,scraper] [--repeat 5]
+        [--top 5] [--budget-ms 1500] [--json out.json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = (
+    "summarizer",
+    "scraper",
+    "lang_tools_test",
+    "google",
+    "batch",
+    "extract_pool",
+    "crawler",
+    "tokens",
+    "html_text",
+)
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure(module):
+    """
+    Import `module` in a new interpreter and return `(cumulative_us, imported, direct)`:
+    the module's cumulative import time, how many modules it imported and the
+    `(package, cumulative_us)` of its direct dependencies.
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    # Modules must be importable without credentials.
+    env.pop("OPENAI_API_KEY", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    # -X importtime lists a module's dependencies before the module itself, indented
+    # one level deeper; interpreter start-up imports come first at the top level.
+    entries = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            _, cumulative_us, indent, package = match.groups()
+            entries.append((package, int(cumulative_us), len(indent) // 2))
+    end = max(i for i, entry in enumerate(entries) if entry[0] == module and entry[2] == 0)
+    start = end
+    while start > 0 and entries[start - 1][2] > 0:
+        start -= 1
+    direct = [(package, us) for package, us, level in entries[start:end] if level == 1]
+    return entries[end][1], end - start + 1, direct
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--modules", default=",".join(MODULES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="heaviest dependencies to list")
+    parser.add_argument("--budget-ms", type=float, help="fail if a module takes longer")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = {}
+    over_budget = []
+    for module in args.modules.split(","):
+        cumulative_us, imported, direct = min(
+            (measure(module) for _ in range(args.repeat)), key=lambda run: run[0]
+        )
+        total_ms = cumulative_us / 1000
+        dependencies = sorted(((name, us / 1000) for name, us in direct), key=lambda item: -item[1])
+        dependencies = dependencies[: args.top]
+        report[module] = {
+            "cumulative_ms": round(total_ms, 1),
+            "modules_imported": imported,
+            "heaviest": [{"module": name, "cumulative_ms": round(ms, 1)} for name, ms in dependencies],
+        }
+        print(f"{module:<16} {total_ms:8.1f} ms  ({imported} modules)")
+        for name, ms in dependencies:
+            print(f"    {name:<40} {ms:8.1f} ms")
+        if args.budget_ms is not None and total_ms > args.budget_ms:
+            over_budget.append(module)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if over_budget:
+        print(f"\nOver the {args.budget_ms} ms budget: {', '.join(over_budget)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
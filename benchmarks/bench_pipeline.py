@@ -0,0 +1,194 @@
+"""
+End-to-end benchmark of scrape, fetch_text and crawl_web_page, fully offline.
+
+A generated site corpus is served from a local HTTP server (benchmarks/fakes.py)
+with injected latency and transient 503s, start URLs come from a stub of
+`google.google_search`, and `Summarize.llm` is a stub LLM with configurable latency.
+Each target runs in its own process so peak RSS is per target. The report
+gives pages/sec (pages downloaded successfully), p50/p95 latency per stage (fetch,
+extract, extract_structured, tokenize, summarize, from the `instrumentation` spans) and peak RSS; --json writes it to a file to compare runs.
+
+    python benchmarks/bench_pipeline.py [--sites 5] [--latency 0.05] [--error-rate 0.1]
+        [--llm-latency 0.2] [--targets scrape,fetch_text,crawl_web_page] [--json out.json]
+
+--word-tokenizer swaps tiktoken for a whitespace tokenizer on machines that cannot
+download tiktoken's encoding files.
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fakes  # noqa: E402
+
+TARGETS = ("scrape", "fetch_text", "crawl_web_page")
+STAGES = ("fetch", "extract", "extract_structured", "tokenize", "summarize")
+COUNTERS = ("bytes_fetched", "http_retries", "tokens", "llm_prompt_tokens")
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def run_target(args):
+    """
+    Run one target against the fake web in this process and return its report.
+    """
+    # Benchmarks measure cold runs: no page or LLM cache, and a fixed retry jitter.
+    for name in ("SCRAPER_CACHE_PATH", "SCRAPER_LLM_CACHE_PATH"):
+        os.environ.pop(name, None)
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    random.seed(args.seed)
+
+    import fetcher
+    import instrumentation
+    import scraper
+    import summarizer
+    import tokens
+
+    if args.word_tokenizer:
+        encoding = fakes.WordEncoding()
+        tokens.get_encoding = lambda encoding_name=tokens.DEFAULT_ENCODING: encoding
+
+    metrics = instrumentation.enable()
+    llm = fakes.StubLLM(latency=args.llm_latency, jitter=args.llm_jitter)
+    search = fakes.FakeSearch(args.site_urls)
+    start_urls = [result["link"] for result in search("company websites", num_results=args.sites)]
+
+    runs = {
+        "scrape": lambda url: summarizer.scrape(url, max_urls=args.max_urls, llm=llm),
+        "fetch_text": lambda url: summarizer.fetch_text(url, max_urls=args.max_urls),
+        "crawl_web_page": lambda url: scraper.crawl_web_page(url, max_urls=args.max_urls),
+    }
+    run = runs[args.child]
+    # Pages are the successful downloads the pipeline handed to extraction.
+    fetched = []
+    fetch_iter = fetcher.fetch_iter
+
+    async def counting_fetch_iter(*fetch_args, **kwargs):
+        async for page in fetch_iter(*fetch_args, **kwargs):
+            fetched.append(page.ok)
+            yield page
+
+    fetcher.fetch_iter = counting_fetch_iter
+    errors = 0
+    start = time.perf_counter()
+    for url in start_urls:
+        # The targets print page text and summaries; keep them out of the report.
+        with contextlib.redirect_stdout(io.StringIO()):
+            try:
+                run(url)
+            except Exception as e:
+                errors += 1
+                print(f"{args.child} failed on {url}: {e!r}", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    pages = sum(fetched)
+    report = {
+        "target": args.child,
+        "sites": len(start_urls),
+        "pages": pages,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(pages / elapsed, 2) if elapsed else None,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages": {},
+        "counters": {name: metrics.counter(name) for name in COUNTERS},
+    }
+    for stage in STAGES:
+        samples = metrics.samples(stage)
+        p50, p95 = percentile(samples, 0.5), percentile(samples, 0.95)
+        report["stages"][stage] = {
+            "count": len(samples),
+            "p50_ms": round(p50 * 1000, 2) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 2) if p95 is not None else None,
+        }
+    return report
+
+
+def print_report(report):
+    print(
+        f"{report['target']:<15} {report['pages']:>4} pages  {report['seconds']:>7.2f}s  "
+        f"{report['pages_per_sec']:>7.2f} pages/s  peak RSS {report['peak_rss_mb']:.1f} MB"
+        + (f"  {report['errors']} errors" if report["errors"] else "")
+    )
+    for stage, stats in report["stages"].items():
+        if stats["count"]:
+            print(f"    {stage:<18} n={stats['count']:<5} p50 {stats['p50_ms']:>9.2f} ms  p95 {stats['p95_ms']:>9.2f} ms")
+    print("    " + "  ".join(f"{name}={value}" for name, value in report["counters"].items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--targets", default=",".join(TARGETS))
+    parser.add_argument("--sites", type=int, default=5)
+    parser.add_argument("--paragraphs", type=int, default=8, help="paragraphs per generated page")
+    parser.add_argument("--blog-pages", type=int, default=3)
+    parser.add_argument("--max-urls", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.1, help="fraction of pages that 503 once")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--llm-jitter", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--word-tokenizer", action="store_true")
+    parser.add_argument("--json", help="also write the reports to this file")
+    parser.add_argument("--child", choices=TARGETS, help=argparse.SUPPRESS)
+    parser.add_argument("--site-urls", nargs="*", default=[], help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_target(args)))
+        return 0
+
+    corpus = fakes.generate_corpus(
+        sites=args.sites, paragraphs=args.paragraphs, blog_pages=args.blog_pages, seed=args.seed
+    )
+    reports = []
+    with fakes.FakeWeb(corpus, args.latency, args.jitter, args.error_rate) as web:
+        print(
+            f"{len(corpus)} pages on {args.sites} sites at {web.base_url}, latency "
+            f"{args.latency}+{args.jitter}s, error rate {args.error_rate}, LLM latency {args.llm_latency}s\n"
+        )
+        # Re-run this script once per target so peak RSS is measured per target.
+        child_args = [
+            f"--sites={args.sites}",
+            f"--max-urls={args.max_urls}",
+            f"--llm-latency={args.llm_latency}",
+            f"--llm-jitter={args.llm_jitter}",
+            f"--seed={args.seed}",
+        ] + (["--word-tokenizer"] if args.word_tokenizer else [])
+        for target in args.targets.split(","):
+            web.reset()
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), *child_args, "--child", target,
+                 "--site-urls", *web.site_urls()],
+                stdout=subprocess.PIPE,
+                cwd=ROOT,
+                check=True,
+            )
+            report = json.loads(result.stdout.decode().strip().splitlines()[-1])
+            report["http_requests"], report["http_errors_injected"] = web.requests, web.errors
+            reports.append(report)
+            print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"arguments": vars(args), "reports": reports}, f, indent=2)
+    return 1 if any(report["errors"] for report in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
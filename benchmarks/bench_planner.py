@@ -0,0 +1,154 @@
+"""
+Summarization planner (planner.py) against the old fixed threshold, fully offline.
+
+Sites of `--sizes` tokens are summarized by `summarizer.summarize_site` as before
+the planner (sent directly under 14000 tokens, else map-reduced, gpt-4o for every
+step) and with the planner ("auto"). The stub LLMs take as long as
+their `planner.MODELS` profile predicts, scaled by `--time-scale`, so the report
+compares LLM calls, tokens, cost and latency, with the planner's predictions
+next to what was measured. `--map-model` gives the summarization steps a
+cheaper profile than the final prompt (gpt-4o).
+
+    python benchmarks/bench_planner.py [--sizes 2000,6000,20000,60000,150000]
+        [--map-model gpt-4o-mini] [--time-scale 0.01] [--json out.json]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Cached answers would make every run after the first free.
+os.environ.pop("SCRAPER_LLM_CACHE_PATH", None)
+
+import fakes  # noqa: E402
+import planner  # noqa: E402
+import structured  # noqa: E402
+import summarize_engine  # noqa: E402
+import summarizer  # noqa: E402
+import tokens  # noqa: E402
+
+WORDS = (
+    "the company builds software for teams customers data platform cloud analytics "
+    "founded headquartered employees ceo director engineering sales pricing product "
+    "market growth partners security compliance support service industry leading"
+).split()
+
+
+class ProfiledLLM(fakes.StubLLM):
+    """
+    `StubLLM` that sleeps as long as `profile` predicts for each call, times `time_scale`.
+    """
+
+    def __init__(self, model_name, time_scale, summary_words):
+        super().__init__(summary_words=summary_words)
+        self.model_name = model_name
+        self.profile = planner.profile(model_name)
+        self.time_scale = time_scale
+
+    def invoke(self, prompt, *args, **kwargs):
+        message = super().invoke(prompt, *args, **kwargs)
+        text = str(getattr(prompt, "to_string", lambda: prompt)())
+        seconds = self.profile.seconds(tokens.count_tokens(text), tokens.count_tokens(message.content))
+        time.sleep(seconds * self.time_scale)
+        return message
+
+    __call__ = invoke
+
+
+def site_text(size, seed):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(size))
+
+
+def run(size, mode, args):
+    text = " " + site_text(size, size)
+    counter = tokens.TokenCounter()
+    counter.add(text)
+    final_llm = ProfiledLLM("gpt-4o", args.time_scale, planner.REPORT_OUTPUT_TOKENS)
+    if mode == "before":
+        # Direct under the old 14000-token threshold, else map_reduce, gpt-4o throughout.
+        map_llm = ProfiledLLM("gpt-4o", args.time_scale, planner.MAP_OUTPUT_TOKENS)
+        chain_type, max_prompt_tokens = "map_reduce", 14000 + planner.REPORT_PROMPT_TOKENS
+    else:
+        map_llm = ProfiledLLM(args.map_model, args.time_scale, planner.MAP_OUTPUT_TOKENS)
+        chain_type, max_prompt_tokens = "auto", planner.MAX_PROMPT_TOKENS
+    plans = []
+    create_plan, saved_max_prompt_tokens = planner.plan, planner.MAX_PROMPT_TOKENS
+
+    def capture(*plan_args, **kwargs):
+        plans.append(create_plan(*plan_args, **kwargs))
+        return plans[-1]
+
+    planner.plan, planner.MAX_PROMPT_TOKENS = capture, max_prompt_tokens
+    # LLM time is scaled down but the rate limit windows are not, so each run gets
+    # fresh limiters instead of the budget the earlier runs used up.
+    summarize_engine._shared_limiters.clear()
+    try:
+        start = time.perf_counter()
+        summarizer.summarize_site(
+            "https://example.com",
+            text,
+            counter,
+            structured.StructuredData(),
+            chain_type=chain_type,
+            llm=final_llm,
+            map_llm=map_llm,
+            # Every size reaches the strategies instead of being cut to the budget.
+            token_budget=None,
+        )
+        seconds = (time.perf_counter() - start) / args.time_scale
+    finally:
+        planner.plan, planner.MAX_PROMPT_TOKENS = create_plan, saved_max_prompt_tokens
+    return plans[0], seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="2000,6000,20000,60000,150000")
+    parser.add_argument("--map-model", default="gpt-4o-mini")
+    parser.add_argument("--time-scale", type=float, default=0.01)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--verbose", "-v", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    # Token counts are in words: tiktoken's encoding files cannot be downloaded offline.
+    encoding = fakes.WordEncoding()
+    tokens.get_encoding = lambda encoding_name=tokens.DEFAULT_ENCODING: encoding
+
+    # Warm up imports and langchain's prompt machinery outside the measurements.
+    run(100, "planner", args)
+    report = {}
+    for size in (int(size) for size in args.sizes.split(",")):
+        row = report[size] = {}
+        for mode in ("before", "planner"):
+            plan, seconds = run(size, mode, args)
+            row[mode] = {
+                "strategy": plan.strategy,
+                "actual": dict(plan.actual.as_dict(), seconds=round(seconds, 1)),
+                "predicted": plan.predicted.as_dict(),
+            }
+        for mode in ("before", "planner"):
+            actual, predicted = row[mode]["actual"], row[mode]["predicted"]
+            print(
+                f"{size:>7} tokens {mode:<8} {row[mode]['strategy']:<10} "
+                f"{actual['calls']:>4} calls {actual['prompt_tokens'] + actual['output_tokens']:>7} tokens "
+                f"${actual['cost']:.4f} {actual['seconds']:6.1f} s | predicted {predicted['calls']:>4} calls "
+                f"{predicted['prompt_tokens'] + predicted['output_tokens']:>7} tokens "
+                f"${predicted['cost']:.4f} {predicted['seconds']:6.1f} s"
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
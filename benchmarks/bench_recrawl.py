@@ -0,0 +1,139 @@
+"""
+Cost of a weekly refresh with and without the incremental manifest (recrawl.py).
+
+Each generated site (benchmarks/fakes.py) is served by its own local server with a
+sitemap.xml carrying `lastmod` dates. Every site is scraped once, then
+`--changed` of the sites get a new About page (and lastmod), and all sites are
+scraped again. The report compares the second pass of a plain `scrape()` with
+the second pass of an incremental one: HTTP requests, LLM calls and wall time.
+
+    python benchmarks/bench_recrawl.py [--sites 20] [--changed 0.1] [--word-tokenizer]
+        [--json out.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The page and LLM caches would hide the difference being measured.
+for variable in ("SCRAPER_CACHE_PATH", "SCRAPER_LLM_CACHE_PATH", "SCRAPER_MANIFEST_PATH"):
+    os.environ.pop(variable, None)
+
+import fakes  # noqa: E402
+import recrawl  # noqa: E402
+import summarizer  # noqa: E402
+import tokens  # noqa: E402
+
+
+class CountingLLM(fakes.StubLLM):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+        return super().invoke(prompt, *args, **kwargs)
+
+    __call__ = invoke
+
+
+def sitemap(web, lastmods):
+    urls = "".join(
+        f"<url><loc>{web.base_url}{path}</loc><lastmod>{lastmods[path]}</lastmod></url>"
+        for path in sorted(lastmods)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'
+    ).encode("utf-8")
+
+
+def build_sites(count, seed):
+    corpus = fakes.generate_corpus(sites=count, seed=seed)
+    sites = []
+    for index in range(count):
+        prefix = f"/site{index}/"
+        pages = {path: body for path, body in corpus.items() if path.startswith(prefix)}
+        web = fakes.FakeWeb(pages).start()
+        lastmods = {path: "2024-01-01" for path in pages}
+        web.corpus["/sitemap.xml"] = sitemap(web, lastmods)
+        sites.append({"web": web, "start_url": web.base_url + prefix, "lastmods": lastmods})
+    return sites
+
+
+def change(site, path_suffix="about"):
+    web = site["web"]
+    path = site["start_url"][len(web.base_url):] + path_suffix
+    web.corpus[path] = web.corpus[path].replace(b"<h1>", b"<h1>New: ", 1)
+    site["lastmods"][path] = "2024-02-01"
+    web.corpus["/sitemap.xml"] = sitemap(web, site["lastmods"])
+
+
+def run_pass(sites, llm, manifest):
+    for site in sites:
+        site["web"].reset()
+    calls_before = llm.calls
+    start = time.perf_counter()
+    for site in sites:
+        summarizer.scrape(site["start_url"], llm=llm, manifest=manifest)
+    return {
+        "seconds": round(time.perf_counter() - start, 3),
+        "requests": sum(site["web"].requests for site in sites),
+        "llm_calls": llm.calls - calls_before,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sites", type=int, default=20)
+    parser.add_argument("--changed", type=float, default=0.1, help="share of sites changed between passes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--word-tokenizer", action="store_true")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    if args.word_tokenizer:
+        encoding = fakes.WordEncoding()
+        tokens.get_encoding = lambda encoding_name=tokens.DEFAULT_ENCODING: encoding
+
+    report = {}
+    changed = max(1, round(args.sites * args.changed)) if args.changed else 0
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ("full", "incremental"):
+            sites = build_sites(args.sites, args.seed)
+            manifest = recrawl.Manifest(os.path.join(directory, "manifest.sqlite")) if mode == "incremental" else None
+            llm = CountingLLM()
+            try:
+                first = run_pass(sites, llm, manifest)
+                for site in sites[:changed]:
+                    change(site)
+                second = run_pass(sites, llm, manifest)
+            finally:
+                for site in sites:
+                    site["web"].stop()
+            report[mode] = {"first_pass": first, "second_pass": second}
+            if manifest is not None:
+                report[mode]["manifest"] = dict(manifest.stats)
+                manifest.close()
+            print(
+                f"{mode:<12} first pass {first['requests']:>4} requests {first['llm_calls']:>4} LLM calls "
+                f"{first['seconds']:6.2f} s | second pass ({changed} of {args.sites} sites changed) "
+                f"{second['requests']:>4} requests {second['llm_calls']:>4} LLM calls {second['seconds']:6.2f} s"
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
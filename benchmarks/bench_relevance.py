@@ -0,0 +1,195 @@
+"""
+Field recall and cost of relevance.select_chunks on the HTML fixtures.
+
+Each site in fixtures/relevance_sites.json is built from its fixture pages with
+generated blog/legal filler pages mixed in, the way a crawl
+returns them. For each token budget the report gives the share of the site's
+known facts (per WebsiteSummary field) that survive the selection, the tokens
+and estimated LLM calls compared with the old map_reduce-everything path, and
+the time spent ranking. A German site with none of the (English) field terms
+checks that its text still reaches the LLM instead of being ranked out entirely.
+
+    python benchmarks/bench_relevance.py [--budgets 1000,2000,4000,8000]
+        [--filler-pages 40] [--min-recall 0.9] [--word-tokenizer]
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fakes  # noqa: E402
+import html_text  # noqa: E402
+import relevance  # noqa: E402
+import tokens  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+# The old scrape() path: map_reduce every 1500-token chunk above 14000 tokens.
+OLD_THRESHOLD = 14000
+
+
+def select(counter, budget):
+    chunk_ids = counter.chunk_ids(relevance.CHUNK_TOKENS, overlap=0)
+    return relevance.select_chunks(counter.decode(chunk_ids), budget, sizes=[len(ids) for ids in chunk_ids])
+
+
+def normalize(text):
+    return " ".join(text.lower().split())
+
+
+# Blog-post prose: mostly generic words, with the occasional field term at about the
+# rate real posts use them (fakes.WORDS is far denser in business vocabulary).
+FILLER_WORDS = (
+    "the a of and to in is that for it with as was on be at by this from or have an "
+    "they which one you were all we when there can more if no out so what up about "
+    "time into some could them other than then now only its over also after two how "
+    "our work first well way even new want because any these give day most us week "
+    "year data model season weather store shelf order ship warehouse truck spreadsheet "
+    "planner forecast trend holiday promotion spring summer winter fall chart graph "
+    "number error average simple question answer example story lesson mistake"
+).split()
+FIELD_WORDS = "team market customers product platform industry".split()
+FIELD_WORD_RATE = 0.005
+LEGAL_TEXT = (
+    "By using this site you agree to our terms and conditions and privacy policy. We use "
+    "cookies to improve your experience; manage your consent in the cookie settings. "
+    "Copyright all rights reserved. Subscribe to our newsletter or unsubscribe at any time. "
+)
+
+
+def filler_text(rng, words=500):
+    return " ".join(
+        rng.choice(FIELD_WORDS) if rng.random() < FIELD_WORD_RATE else rng.choice(FILLER_WORDS)
+        for _ in range(words)
+    ).capitalize() + "."
+
+
+def site_pages(pages, filler_pages, seed):
+    """
+    The fixture pages spread evenly through `filler_pages` filler pages: blog posts,
+    plus a legal/cookie page every tenth page.
+    """
+    rng = random.Random(seed)
+    filler = [
+        LEGAL_TEXT * 8 if i % 10 == 9 else filler_text(rng) for i in range(filler_pages)
+    ]
+    texts = [html_text.extract_text(open(os.path.join(FIXTURES, "html", page), "rb").read(), "all") for page in pages]
+    step = max(1, len(filler) // max(1, len(texts)))
+    combined = []
+    for i, text in enumerate(texts):
+        combined.append(text)
+        combined.extend(filler[i * step : (i + 1) * step])
+    combined.extend(filler[len(texts) * step :])
+    return combined
+
+
+GERMAN_WORDS = (
+    "wir entwickeln software für den mittelstand unsere kunden vertrauen auf "
+    "zuverlässige lösungen aus münchen seit vielen jahren mit erfahrung und qualität"
+).split()
+
+
+def unmatched_language_tokens(words, budget, seed):
+    """
+    Tokens sent on for a `words`-token German site: chunks the field terms do not
+    match must not all be dropped.
+    """
+    rng = random.Random(seed)
+    counter = tokens.TokenCounter()
+    counter.add(" ".join(rng.choice(GERMAN_WORDS) for _ in range(words)))
+    selection = select(counter, budget)
+    sent = selection.relevant_text if selection.needs_map_reduce else selection.text
+    return tokens.count_tokens(sent), selection.needs_map_reduce
+
+
+def llm_calls(total_tokens, chunk_count):
+    # Map calls plus the combine call plus the final report, or just the report.
+    return chunk_count + 2 if chunk_count > 1 else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sites", default=os.path.join(FIXTURES, "relevance_sites.json"))
+    parser.add_argument("--budgets", default="1000,2000,4000,8000")
+    parser.add_argument("--filler-pages", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-recall", type=float, default=0.9, help="fail below this mean recall")
+    parser.add_argument("--word-tokenizer", action="store_true")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    if args.word_tokenizer:
+        encoding = fakes.WordEncoding()
+        tokens.get_encoding = lambda encoding_name=tokens.DEFAULT_ENCODING: encoding
+    with open(args.sites, encoding="utf-8") as f:
+        sites = json.load(f)
+
+    report = []
+    for budget in (int(b) for b in args.budgets.split(",")):
+        print(f"token budget {budget}")
+        recalls = []
+        for name, site in sites.items():
+            counter, texts = tokens.TokenCounter(), []
+            for text in site_pages(site["pages"], args.filler_pages, args.seed):
+                counter.add(" " + text)
+                texts.append(" " + text)
+            full_text = normalize("".join(texts))
+            old_chunks = counter.chunks() if counter.total > OLD_THRESHOLD else [full_text]
+
+            start = time.perf_counter()
+            selection = select(counter, budget)
+            rank_ms = (time.perf_counter() - start) * 1000
+            if selection.needs_map_reduce:
+                sent = selection.relevant_text
+                new_calls = llm_calls(selection.tokens_in, math.ceil(tokens.count_tokens(sent) / tokens.CHUNK_TOKENS))
+            else:
+                sent = selection.text
+                new_calls = 1
+            sent = normalize(sent)
+
+            fields = {}
+            for field, facts in site["facts"].items():
+                present = [fact for fact in facts if normalize(fact) in full_text]
+                kept = [fact for fact in present if normalize(fact) in sent]
+                if present:
+                    fields[field] = len(kept) / len(present)
+            recall = sum(fields.values()) / len(fields)
+            recalls.append(recall)
+            row = {
+                "budget": budget,
+                "site": name,
+                "recall": round(recall, 3),
+                "field_recall": {k: round(v, 3) for k, v in fields.items()},
+                "tokens_in": selection.tokens_in,
+                "tokens_out": tokens.count_tokens(sent),
+                "map_reduce": selection.needs_map_reduce,
+                "llm_calls_before": llm_calls(counter.total, len(old_chunks)),
+                "llm_calls_after": new_calls,
+                "rank_ms": round(rank_ms, 2),
+            }
+            report.append(row)
+            missed = [k for k, v in fields.items() if v < 1]
+            print(
+                f"  {name:<12} recall {recall:5.2f}  tokens {row['tokens_in']:>6} -> {row['tokens_out']:>6}  "
+                f"LLM calls {row['llm_calls_before']:>3} -> {row['llm_calls_after']:>3}"
+                f"{'  (map_reduce)' if selection.needs_map_reduce else ''}  rank {rank_ms:6.1f} ms"
+                + (f"  missed: {', '.join(missed)}" if missed else "")
+            )
+        print(f"  mean recall {sum(recalls) / len(recalls):.3f}\n")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    sent, map_reduce = unmatched_language_tokens(12000, relevance.TOKEN_BUDGET, args.seed)
+    print(f"german site  tokens  12000 -> {sent:>6}{'  (map_reduce)' if map_reduce else ''}")
+    mean_recall = sum(row["recall"] for row in report) / len(report)
+    return 0 if mean_recall >= args.min_recall and sent > 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
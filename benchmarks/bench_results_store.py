@@ -0,0 +1,177 @@
+"""
+Columnar results store (results_store.py) against one JSON document per scrape.
+
+`--records` synthetic `batch.scrape_one` records, spread over `--domains` domains
+scraped several times each, are written by `--writers` concurrent threads to a
+JSONL file and to a `ResultsStore`. The report gives, for both: write time, size
+on disk, the time to read two columns of every record (what an analytics job
+does), and the mean time to fetch every scrape of one domain.
+
+    python benchmarks/bench_results_store.py [--records 50000] [--domains 10000]
+        [--writers 4] [--lookups 200] [--json out.json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import results_store  # noqa: E402
+
+WORDS = (
+    "platform customers data teams cloud secure fast analytics workflow automation "
+    "enterprise software small business retail payments logistics health insurance"
+).split()
+INDUSTRIES = ["Software", "Retail", "Logistics", "Healthcare", "Finance", None]
+POSITIONS = ["CEO", "CTO", "COO", "Head of Sales", "Engineer", "Designer"]
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_records(count, domains, seed):
+    rng = random.Random(seed)
+    start = 1_700_000_000
+    records = []
+    for index in range(count):
+        domain = f"company{rng.randrange(domains)}.com"
+        records.append(
+            {
+                "url": f"https://{domain}/",
+                "domain": domain,
+                "scraped_at": start + index * 60.0,
+                "summary": {
+                    "title": sentence(rng, 4),
+                    "summary": " ".join(sentence(rng, 12) for _ in range(6)),
+                    "company_name": domain.split(".")[0].title(),
+                    "industry": rng.choice(INDUSTRIES),
+                    "value_proposition": sentence(rng, 15),
+                    "employees": [
+                        {
+                            "name": f"Person {rng.randrange(10000)}",
+                            "title": rng.choice(POSITIONS),
+                            "position": rng.choice(POSITIONS),
+                            "location": rng.choice(["Berlin", "Austin", "Remote", None]),
+                        }
+                        for _ in range(rng.randrange(6))
+                    ],
+                    "competition": [f"Rival {rng.randrange(500)}" for _ in range(rng.randrange(4))],
+                },
+            }
+        )
+    return records
+
+
+def write_concurrently(records, writers, append_shard):
+    shards = [records[n::writers] for n in range(writers)]
+    threads = [threading.Thread(target=append_shard, args=(shard,)) for shard in shards]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def directory_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def bench_jsonl(path, records, writers, domains):
+    lock = threading.Lock()
+    with open(path, "a", encoding="utf-8") as output:
+
+        def append_shard(shard):
+            for record in shard:
+                line = json.dumps(record) + "\n"
+                with lock:
+                    output.write(line)
+
+        write_seconds = write_concurrently(records, writers, append_shard)
+
+    start = time.perf_counter()
+    with open(path, encoding="utf-8") as f:
+        columns = [(row["domain"], row["summary"]["industry"]) for row in map(json.loads, f)]
+    read_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for domain in domains:
+        with open(path, encoding="utf-8") as f:
+            [row for row in map(json.loads, f) if row["domain"] == domain]
+    lookup_seconds = (time.perf_counter() - start) / len(domains)
+    return write_seconds, read_seconds, lookup_seconds, len(columns)
+
+
+def bench_store(path, records, writers, domains):
+    store = results_store.ResultsStore(path)
+
+    def append_shard(shard):
+        with store.writer() as writer:
+            for record in shard:
+                writer.append(record)
+
+    write_seconds = write_concurrently(records, writers, append_shard)
+
+    start = time.perf_counter()
+    columns = store.read("summaries", ["domain", "industry"])
+    read_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for domain in domains:
+        store.lookup(domain)
+    lookup_seconds = (time.perf_counter() - start) / len(domains)
+    return write_seconds, read_seconds, lookup_seconds, len(columns["domain"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--domains", type=int, default=10000)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--lookups", type=int, default=200, help="domains looked up in the store")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    records = make_records(args.records, args.domains, args.seed)
+    rng = random.Random(args.seed)
+    domains = [rng.choice(records)["domain"] for _ in range(args.lookups)]
+    report = {}
+    with tempfile.TemporaryDirectory() as directory:
+        runs = {
+            # Scanning the JSONL file is slow enough that a few lookups give the mean.
+            "jsonl": (bench_jsonl, os.path.join(directory, "results.jsonl"), domains[:5]),
+            "columnar store": (bench_store, os.path.join(directory, "store"), domains),
+        }
+        for name, (bench, path, lookups) in runs.items():
+            write_seconds, read_seconds, lookup_seconds, rows = bench(path, records, args.writers, lookups)
+            report[name] = {
+                "rows": rows,
+                "write_seconds": round(write_seconds, 3),
+                "bytes": directory_size(path),
+                "read_two_columns_seconds": round(read_seconds, 3),
+                "lookup_ms": round(lookup_seconds * 1000, 3),
+            }
+            row = report[name]
+            print(
+                f"{name:<15} write {row['write_seconds']:6.2f} s  {row['bytes'] / 1e6:7.1f} MB  "
+                f"read 2 columns {row['read_two_columns_seconds']:6.3f} s  lookup {row['lookup_ms']:9.3f} ms"
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if all(row["rows"] == args.records for row in report.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+What structured.extract finds on the HTML fixtures, and what it saves on the final prompt.
+
+For each site in fixtures/relevance_sites.json the pages are merged in crawl
+order, as scrape() does. The report lists the WebsiteSummary fields and people
+found, the fields still left to the LLM, the extraction time, and the size of
+the final prompt's format instructions compared with asking for every field
+(0 when the LLM is skipped).
+
+    python benchmarks/bench_structured.py [--repeat 20] [--word-tokenizer] [--json out.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fakes  # noqa: E402
+import structured  # noqa: E402
+import summarizer  # noqa: E402
+import tokens  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def instruction_tokens(fields):
+    from langchain_core.output_parsers import JsonOutputParser
+
+    parser = JsonOutputParser(pydantic_object=summarizer.summary_schema(fields))
+    return tokens.count_tokens(parser.get_format_instructions())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sites", default=os.path.join(FIXTURES, "relevance_sites.json"))
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--word-tokenizer", action="store_true")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    if args.word_tokenizer:
+        encoding = fakes.WordEncoding()
+        tokens.get_encoding = lambda encoding_name=tokens.DEFAULT_ENCODING: encoding
+    with open(args.sites, encoding="utf-8") as f:
+        sites = json.load(f)
+
+    all_fields = instruction_tokens(structured.SUMMARY_FIELDS)
+    report = []
+    for name, site in sites.items():
+        pages = [open(os.path.join(FIXTURES, "html", page), "rb").read() for page in site["pages"]]
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            data = structured.StructuredData()
+            for content in pages:
+                data.update(structured.extract(content))
+        per_page_ms = (time.perf_counter() - start) * 1000 / args.repeat / len(pages)
+        missing = data.missing()
+        remaining = 0 if data.complete() else instruction_tokens(missing)
+        row = {
+            "site": name,
+            "found": sorted(data.prefill()),
+            "people": len(data.employees),
+            "missing": missing,
+            "llm_skipped": data.complete(),
+            "instruction_tokens": remaining,
+            "instruction_tokens_all_fields": all_fields,
+            "extract_ms_per_page": round(per_page_ms, 3),
+        }
+        report.append(row)
+        print(
+            f"{name:<12} found {', '.join(row['found']) or '-':<45} people {row['people']:>2}  "
+            f"format instructions {all_fields} -> {remaining} tokens  {per_page_ms:5.2f} ms/page"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
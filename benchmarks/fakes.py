@@ -0,0 +1,290 @@
+"""
+Offline stand-ins for the live web, Google Custom Search, OpenAI and tiktoken,
+used by the benchmarks.
+
+* `generate_corpus` builds a deterministic set of company sites (home, about, team,
+  products, contact, privacy, paginated blog and posts) sharing nav/footer
+  boilerplate, like real sites do.
+* `FakeWeb` serves a corpus from a local threaded HTTP server, with injected
+  per-request latency and a deterministic set of pages that fail with a 503 on
+  their first request(s).
+* `StubLLM` can replace `Summarize.llm` and `summarize_engine.SummarizeEngine`'s
+  LLM: it answers summarize prompts with the start of the prompt and the final
+  report prompt with WebsiteSummary JSON.
+* `FakeSearch` has the call signature and result shape of `google.google_search`.
+* `WordEncoding` is a whitespace tokenizer with tiktoken's encode/decode API, for
+  machines that cannot download tiktoken's BPE files.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.messages import AIMessage
+
+WORDS = (
+    "platform data customers growth secure cloud teams workflow analytics insight "
+    "partner service quality reliable fast scale global market product support "
+    "innovation strategy industry solution network value delivery design build "
+    "operations finance health retail logistics energy software hardware research"
+).split()
+FIRST_NAMES = ["Ana", "Ben", "Chloe", "David", "Elena", "Farid", "Grace", "Hiro", "Ines", "Jon"]
+LAST_NAMES = ["Alvarez", "Brooks", "Chen", "Dubois", "Eriksen", "Fischer", "Garcia", "Haddad"]
+TITLES = ["CEO", "CTO", "CFO", "COO", "VP Engineering", "Head of Sales", "Lead Designer"]
+
+
+def _stable_hash(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _paragraphs(rng, count, words=60):
+    return "".join(
+        "<p>" + " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + ".</p>\n"
+        for _ in range(count)
+    )
+
+
+def _page(site, title, body):
+    nav = "".join(
+        f'<a href="/{site}/{path}">{label}</a> '
+        for path, label in [
+            ("", "Home"),
+            ("about", "About us"),
+            ("team", "Our team"),
+            ("products", "Products"),
+            ("blog/page/1", "Blog"),
+            ("contact", "Contact"),
+        ]
+    )
+    footer = (
+        f'<footer><p>Copyright {site.title()} Inc. All rights reserved. Subscribe to our '
+        f'newsletter for product news and updates.</p><a href="/{site}/privacy">Privacy</a>'
+        f"</footer>"
+    )
+    return (
+        f"<!doctype html><html><head><title>{title}</title>"
+        f'<meta name="description" content="{site.title()} {title}">'
+        f"<style>body {{ margin: 0 }}</style><script>var analytics = 1;</script></head>"
+        f"<body><nav>{nav}</nav><main><h1>{title}</h1>\n{body}</main>{footer}</body></html>"
+    ).encode("utf-8")
+
+
+def generate_corpus(sites=5, paragraphs=8, blog_pages=3, posts_per_page=4, team_size=6, seed=0):
+    """
+    Return `{path: html_bytes}` for `sites` generated company sites under /site<N>/.
+    The same arguments always produce the same corpus.
+    """
+    corpus = {}
+    for index in range(sites):
+        rng = random.Random(f"{seed}-{index}")
+        site = f"site{index}"
+        corpus[f"/{site}/"] = _page(site, f"{site.title()} - Home", _paragraphs(rng, paragraphs))
+        corpus[f"/{site}/about"] = _page(site, "About us", _paragraphs(rng, paragraphs))
+        corpus[f"/{site}/products"] = _page(site, "Products", _paragraphs(rng, paragraphs))
+        corpus[f"/{site}/contact"] = _page(site, "Contact", _paragraphs(rng, 1, 20))
+        corpus[f"/{site}/privacy"] = _page(site, "Privacy policy", _paragraphs(rng, paragraphs))
+        members = "".join(
+            f'<div class="team-member"><h3>{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}</h3>'
+            f'<p class="title">{rng.choice(TITLES)}</p>{_paragraphs(rng, 1, 25)}</div>\n'
+            for _ in range(team_size)
+        )
+        corpus[f"/{site}/team"] = _page(site, "Our team", members)
+        for page in range(1, blog_pages + 1):
+            links = []
+            for post in range(posts_per_page):
+                slug = f"post-{page}-{post}"
+                links.append(f'<li><a href="/{site}/blog/{slug}">Post {page}.{post}</a></li>')
+                corpus[f"/{site}/blog/{slug}"] = _page(site, slug, _paragraphs(rng, paragraphs))
+            if page < blog_pages:
+                links.append(f'<li><a href="/{site}/blog/page/{page + 1}">Older posts</a></li>')
+            corpus[f"/{site}/blog/page/{page}"] = _page(site, f"Blog page {page}", "<ul>" + "".join(links) + "</ul>")
+    return corpus
+
+
+class FakeWeb:
+    """
+    Serve `corpus` on 127.0.0.1. Every response is delayed by `latency` plus up to
+    `jitter` seconds (fixed per path), and a fraction `error_rate` of the paths
+    (chosen by hash) answer 503 to their first `failures_per_path` requests.
+    """
+
+    def __init__(self, corpus, latency=0.0, jitter=0.0, error_rate=0.0, failures_per_path=1, port=0):
+        self.corpus = corpus
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.failures_per_path = failures_per_path
+        self.requests = 0
+        self.errors = 0
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def site_urls(self):
+        return sorted(f"{self.base_url}{path}" for path in self.corpus if path.count("/") == 2 and path.endswith("/"))
+
+    def reset(self):
+        """
+        Forget request counts, so injected failures happen again on the next run.
+        """
+        with self._lock:
+            self.requests = self.errors = 0
+            self._attempts.clear()
+
+    def _respond(self, path):
+        """
+        Return `(status, body)` for `path`, after the injected latency.
+        """
+        fraction = (_stable_hash(path) % 10_000) / 10_000
+        time.sleep(self.latency + self.jitter * fraction)
+        with self._lock:
+            self.requests += 1
+            attempt = self._attempts[path] = self._attempts.get(path, 0) + 1
+            if path in self.corpus and fraction < self.error_rate and attempt <= self.failures_per_path:
+                self.errors += 1
+                return 503, b"Service Unavailable"
+        if path not in self.corpus:
+            return 404, b"Not Found"
+        return 200, self.corpus[path]
+
+    def _handler(self):
+        web = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                status, body = web._respond(self.path.split("?", 1)[0])
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+    response = None
+
+
+class StubLLM:
+    """
+    Local stand-in for a chat model. Returns the first `summary_words` words of the
+    prompt's text after `latency` seconds (plus up to `jitter`), and can fail the
+    first `fail_first` calls with a 429 to exercise the retry path. It also works as
+    the last step of `prompt | llm | parser` chains: the final "report on this
+    company" prompt gets a WebsiteSummary JSON answer.
+    """
+
+    model_name = "stub-llm"
+    temperature = 0
+
+    def __init__(self, latency=0.0, summary_words=50, jitter=0.0, fail_first=0):
+        self.latency = latency
+        self.summary_words = summary_words
+        self.jitter = jitter
+        self.fail_first = fail_first
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+        if call <= self.fail_first:
+            raise FakeRateLimitError()
+        text = str(getattr(prompt, "to_string", lambda: prompt)())
+        summary = " ".join(text.split()[: self.summary_words])
+        if "Please report on this company" in text:
+            words = summary.split()
+            content = json.dumps(
+                {
+                    "title": " ".join(words[:5]),
+                    "summary": summary,
+                    "company_name": words[-1] if words else "",
+                    "employees": [],
+                    "competition": [],
+                }
+            )
+        else:
+            content = summary
+        return AIMessage(content=content)
+
+    __call__ = invoke
+
+
+class FakeSearch:
+    """
+    Drop-in for `google.google_search(query, num_results)`, returning the home pages
+    of the served corpus in an order fixed by the query.
+    """
+
+    def __init__(self, urls):
+        self.urls = list(urls)
+        self.calls = 0
+
+    def __call__(self, query, num_results=5):
+        self.calls += 1
+        if not self.urls:
+            return ["No results found"]
+        offset = _stable_hash(query) % len(self.urls)
+        ranked = self.urls[offset:] + self.urls[:offset]
+        return [
+            {"index": i, "title": f"Result {i} for {query}", "link": link, "snippet": query}
+            for i, link in enumerate(ranked[:num_results])
+        ]
+
+
+class WordEncoding:
+    """
+    Whitespace tokenizer with the `encode`/`decode` API `tokens` uses from tiktoken.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._words = []
+        self._lock = threading.Lock()
+
+    def encode(self, text, disallowed_special=()):
+        with self._lock:
+            ids = []
+            for word in text.split():
+                if word not in self._ids:
+                    self._ids[word] = len(self._words)
+                    self._words.append(word)
+                ids.append(self._ids[word])
+            return ids
+
+    def decode(self, ids):
+        return " ".join(self._words[i] for i in ids)
@@ -0,0 +1,364 @@
+"""
+Priority-frontier crawler for company websites.
+
+URLs are ranked by how likely they are to feed `WebsiteSummary`: team, leadership
+and about pages come first, product and contact pages next, and blog pagination,
+tag archives, legal pages and binary files last (or never). The crawler
+normalizes URLs, keeps a seen-set (a Bloom filter for large crawls), honours
+robots.txt (cached per host) and crawl delays, and stops at depth and page budgets.
+
+`Crawler.discover` returns the best URLs to scrape while fetching as few pages as
+possible; `Crawler.fetch_kwargs` hands the pages it fetched and its per-host timing
+on to `fetcher`, so they are not downloaded again and the crawl delay holds.
+"""
+import hashlib
+import heapq
+import itertools
+import logging
+import math
+import re
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from typing import List, Optional
+from urllib import robotparser
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from lxml import html as lxml_html
+
+import fetcher
+import http_client
+import page_cache
+
+logger = logging.getLogger(__name__)
+
+# (pattern, bonus) matched against the URL path and the link text.
+PRIORITY_PATTERNS = [
+    (re.compile(r"\b(team|our-team|people|leadership|management|founders?|executives?|board|staff)\b"), 12),
+    (re.compile(r"\b(about|about-us|company|who-we-are|our-story|mission)\b"), 10),
+    (re.compile(r"\b(products?|services?|solutions?|platform|pricing|customers|clients)\b"), 6),
+    (re.compile(r"\b(contact|contact-us)\b"), 4),
+    (re.compile(r"\b(careers|jobs)\b"), 2),
+]
+PENALTY_PATTERNS = [
+    (re.compile(r"/page/\d+|[?&](page|p|paged)=\d+"), 10),
+    (re.compile(r"\b(privacy|terms|legal|cookies?|gdpr|disclaimer|imprint)\b"), 10),
+    (re.compile(r"\b(login|log-in|signin|sign-in|signup|sign-up|register|cart|checkout|account)\b"), 10),
+    (re.compile(r"/(tag|tags|category|categories|author|archive|archives)/"), 8),
+    (re.compile(r"/(blog|news|posts?|articles?|press|events?)/."), 4),
+    (re.compile(r"/\d{4}/\d{2}/"), 4),
+]
+SKIP_EXTENSIONS = (
+    ".pdf", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".ico", ".css", ".js",
+    ".xml", ".json", ".zip", ".gz", ".mp3", ".mp4", ".mov", ".avi", ".doc", ".docx",
+    ".xls", ".xlsx", ".ppt", ".pptx", ".dmg", ".exe",
+)
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|gclid|fbclid|mc_cid|mc_eid|ref|_ga)$")
+
+
+def normalize_url(url):
+    """
+    `page_cache.normalize_url` plus dropping tracking parameters, so the same page
+    reached through different campaign links is only crawled once.
+    """
+    parts = urlsplit(page_cache.normalize_url(url))
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)]
+    query = urlencode([(k, v) for k, v in query if not TRACKING_PARAMS.match(k)])
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, query, ""))
+
+
+def site_of(url):
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def same_site(url, site):
+    host = site_of(url)
+    return host == site or host.endswith("." + site)
+
+
+def score_url(url, anchor_text="", depth=0):
+    """
+    Higher is better. Returns None for URLs that should never be fetched.
+    """
+    parts = urlsplit(url)
+    path = parts.path.lower()
+    if parts.scheme not in ("http", "https") or path.endswith(SKIP_EXTENSIONS):
+        return None
+    target = f"{path} {parts.query.lower()} {anchor_text.lower()}"
+    score = 0.0
+    for pattern, bonus in PRIORITY_PATTERNS:
+        if pattern.search(target):
+            score += bonus
+            break
+    for pattern, penalty in PENALTY_PATTERNS:
+        if pattern.search(target):
+            score -= penalty
+    # Prefer shallow pages, both in crawl depth and in path length.
+    score -= 2 * depth + 0.5 * path.strip("/").count("/")
+    return score
+
+
+class BloomFilter:
+    """
+    Fixed-size set membership with a bounded false-positive rate, for seen-sets
+    that would otherwise grow with every URL on a large site.
+    """
+
+    def __init__(self, capacity=1_000_000, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        a, b = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big")
+        return ((a + i * b) % self.size for i in range(self.hash_count))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+
+class RobotsCache:
+    """
+    Parsed robots.txt per scheme and host, refreshed after `ttl` seconds.
+    """
+
+    def __init__(self, ttl=24 * 3600, cache=None):
+        self.ttl = ttl
+        self.cache = cache
+        self._parsers = {}
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            entry = self._parsers.get(origin)
+        if entry and time.time() - entry[0] < self.ttl:
+            return entry[1]
+        parser = robotparser.RobotFileParser(origin + "/robots.txt")
+        try:
+            response = page_cache.fetch(origin + "/robots.txt", self.cache)
+            if response.status_code in (401, 403):
+                parser.disallow_all = True
+            elif response.status_code >= 400:
+                parser.allow_all = True
+            else:
+                parser.parse(response.text.splitlines())
+        except http_client.REQUEST_ERRORS:
+            parser.allow_all = True
+        with self._lock:
+            self._parsers[origin] = (time.time(), parser)
+        return parser
+
+    def allowed(self, url, user_agent="*"):
+        return self.get(url).can_fetch(user_agent, url)
+
+    def crawl_delay(self, url, user_agent="*"):
+        return self.get(url).crawl_delay(user_agent) or 0
+
+    def sitemaps(self, url):
+        """
+        Sitemap URLs listed in the host's robots.txt.
+        """
+        return self.get(url).site_maps() or []
+
+
+_default_robots = RobotsCache()
+_cache_robots = weakref.WeakKeyDictionary()
+_cache_robots_lock = threading.Lock()
+
+
+def get_robots(cache=None):
+    """
+    The `RobotsCache` backed by `cache` (one per page cache), or the shared in-memory one.
+    """
+    if not cache:
+        return _default_robots
+    with _cache_robots_lock:
+        if cache not in _cache_robots:
+            _cache_robots[cache] = RobotsCache(cache=cache)
+        return _cache_robots[cache]
+
+
+@dataclass
+class CrawledPage:
+    url: str
+    depth: int
+    score: float
+    status_code: Optional[int] = None
+    content: bytes = b""
+    text: str = ""
+
+
+def extract_links(base_url, content):
+    """
+    Return `(absolute_url, anchor_text)` for every link on the page.
+    """
+    if not content or not content.strip():
+        return []
+    try:
+        document = lxml_html.document_fromstring(content)
+    except (ValueError, lxml_html.etree.ParserError):
+        return []
+    links = []
+    for anchor in document.iter("a"):
+        href = anchor.get("href")
+        if not href or href.startswith(("mailto:", "tel:", "javascript:", "#")):
+            continue
+        try:
+            url = urljoin(base_url, href.strip())
+            # Raises for a port that is not a number, which normalize_url reads later.
+            urlsplit(url).port
+        except ValueError:
+            # e.g. "Invalid IPv6 URL" for a stray "[" in the host.
+            continue
+        links.append((url, anchor.text_content().strip()))
+    return links
+
+
+class Crawler:
+    def __init__(
+        self,
+        max_pages=5,
+        max_depth=2,
+        politeness_delay=1.0,
+        respect_robots=True,
+        bloom_capacity=None,
+        robots=None,
+        cache=None,
+        user_agent="*",
+    ):
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.politeness_delay = politeness_delay
+        self.respect_robots = respect_robots
+        self.robots = robots or get_robots(cache)
+        self.cache = cache
+        self.user_agent = user_agent
+        self.seen = BloomFilter(bloom_capacity) if bloom_capacity else set()
+        self.stats = {"fetched": 0, "skipped_robots": 0, "skipped_low_value": 0}
+        self._frontier = []
+        self._order = itertools.count()
+        self._last_request = {}
+        # Pages downloaded by `discover`, by URL.
+        self.fetched = {}
+
+    def _push(self, url, depth, anchor_text=""):
+        url = normalize_url(url)
+        if url in self.seen:
+            return
+        self.seen.add(url)
+        score = score_url(url, anchor_text, depth)
+        if score is None:
+            self.stats["skipped_low_value"] += 1
+            return
+        # heapq is a min-heap; ties keep discovery order, so results are deterministic.
+        heapq.heappush(self._frontier, (-score, next(self._order), url, depth))
+
+    def _allowed(self, url):
+        if not self.respect_robots or self.robots.allowed(url, self.user_agent):
+            return True
+        self.stats["skipped_robots"] += 1
+        return False
+
+    def _wait_politely(self, url):
+        host = urlsplit(url).netloc
+        delay = self.politeness_delay
+        if self.respect_robots:
+            delay = max(delay, self.robots.crawl_delay(url, self.user_agent))
+        last = self._last_request.get(host)
+        if last is not None:
+            wait = last + delay - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+        self._last_request[host] = time.monotonic()
+
+    def _fetch(self, url, depth, score):
+        self._wait_politely(url)
+        self.stats["fetched"] += 1
+        try:
+            response = page_cache.fetch(url, self.cache)
+        except http_client.REQUEST_ERRORS as e:
+            logger.warning("Error fetching %s: %s", url, e)
+            return CrawledPage(url=url, depth=depth, score=score)
+        return CrawledPage(
+            url=url,
+            depth=depth,
+            score=score,
+            status_code=response.status_code,
+            content=response.content,
+            text=response.text,
+        )
+
+    def _expand(self, page, site):
+        if page.depth >= self.max_depth or page.status_code != 200:
+            return
+        for link, anchor_text in extract_links(page.url, page.content):
+            if same_site(link, site):
+                self._push(link, page.depth + 1, anchor_text)
+
+    def _start(self, start_url):
+        start_url = normalize_url(start_url)
+        self.seen.add(start_url)
+        return start_url, site_of(start_url)
+
+    def discover(self, start_url, max_fetches=1) -> List[str]:
+        """
+        Return up to `max_pages` URLs to scrape, best first, fetching at most
+        `max_fetches` pages to find them (by default just `start_url`). Empty when
+        robots.txt disallows `start_url` or it cannot be fetched.
+        """
+        start_url, site = self._start(start_url)
+        if not self._allowed(start_url):
+            return []
+        urls = [start_url]
+        hub = CrawledPage(url=start_url, depth=0, score=math.inf)
+        for fetched in range(max_fetches):
+            if not self._allowed(hub.url):
+                break
+            fetched_hub = self._fetch(hub.url, hub.depth, hub.score)
+            if fetched_hub.status_code is None and hub.url == start_url:
+                return []
+            if fetched_hub.status_code is not None:
+                self.fetched[hub.url] = fetched_hub
+            self._expand(fetched_hub, site)
+            if fetched + 1 == max_fetches or not self._frontier:
+                break
+            neg_score, _, url, depth = self._frontier[0]
+            hub = CrawledPage(url=url, depth=depth, score=-neg_score)
+        while self._frontier and len(urls) < self.max_pages:
+            _, _, url, _ = heapq.heappop(self._frontier)
+            if self._allowed(url):
+                urls.append(url)
+        return urls
+
+    def fetch_kwargs(self):
+        """
+        Keyword arguments for `fetcher.fetch_iter` (or `pipeline.iter_pages`) that
+        carry on from `discover`: the pages it already downloaded, and each host's
+        robots.txt Crawl-delay counted from the crawler's last request to it.
+        """
+        prefetched = {
+            url: fetcher.FetchResult(
+                url=url,
+                status_code=page.status_code,
+                content=page.content,
+                text=page.text,
+                error=f"HTTP {page.status_code}" if page.status_code >= 400 else None,
+            )
+            for url, page in self.fetched.items()
+        }
+        crawl_delay, next_start = 0.0, {}
+        for url in self.fetched:
+            delay = self.robots.crawl_delay(url, self.user_agent) if self.respect_robots else 0
+            crawl_delay = max(crawl_delay, delay)
+            host = urlsplit(url).netloc
+            next_start[host] = self._last_request[host] + delay
+        return {"prefetched": prefetched, "crawl_delay": crawl_delay, "next_start": next_start}
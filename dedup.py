@@ -0,0 +1,114 @@
+"""
+Near-duplicate page and boilerplate removal before summarization.
+
+Pages from one site share navigation, footers and cookie banners, and the same
+content is sometimes served under several URLs. `SiteDeduplicator` processes a
+site's pages one at a time as they stream in:
+
+* a page whose SimHash (over word shingles) is within `max_distance` bits of an
+  earlier page is dropped as a near duplicate;
+* any run of `window` words that already appeared on an earlier page is removed,
+  so repeated nav/footer/banner text is kept once, on the first page.
+
+It keeps a report of the pages dropped and the tokens saved.
+"""
+import hashlib
+from typing import Optional
+
+import tokens
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def shingles(words, size):
+    if len(words) < size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i : i + size]) for i in range(len(words) - size + 1)]
+
+
+def simhash(text, shingle_size=3):
+    """
+    64-bit SimHash of `text` over lowercased word shingles.
+    """
+    weights = [0] * 64
+    for shingle in shingles(text.lower().split(), shingle_size):
+        value = _hash64(shingle)
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class SiteDeduplicator:
+    def __init__(self, max_distance=3, window=6, count_tokens=None):
+        self.max_distance = max_distance
+        self.window = window
+        self.count_tokens = count_tokens or tokens.count_tokens
+        self.fingerprints = []
+        self.seen_shingles = set()
+        self.report = {
+            "pages_in": 0,
+            "pages_out": 0,
+            "duplicates": [],
+            "tokens_saved": 0,
+        }
+
+    def add(self, url, text) -> Optional[str]:
+        """
+        Return `text` with text already seen on earlier pages removed, or None if the
+        whole page is a near duplicate of an earlier one.
+        """
+        self.report["pages_in"] += 1
+        fingerprint = simhash(text)
+        for url_seen, seen in self.fingerprints:
+            if hamming_distance(fingerprint, seen) <= self.max_distance:
+                self.report["duplicates"].append({"url": url, "duplicate_of": url_seen})
+                self.report["tokens_saved"] += self.count_tokens(text)
+                return None
+        self.fingerprints.append((url, fingerprint))
+        self.report["pages_out"] += 1
+        return self._strip_repeated(text)
+
+    def _strip_repeated(self, text):
+        lines = [line.split() for line in text.split("\n")]
+        words = [word for line in lines for word in line]
+        if len(words) < self.window:
+            return text
+        hashes = [_hash64(s.lower()) for s in shingles(words, self.window)]
+        repeated = [False] * len(words)
+        for i, value in enumerate(hashes):
+            if value in self.seen_shingles:
+                for j in range(i, i + self.window):
+                    repeated[j] = True
+        self.seen_shingles.update(hashes)
+        if not any(repeated):
+            return text
+
+        kept_lines, removed, index = [], [], 0
+        for line in lines:
+            kept = []
+            for word in line:
+                (removed if repeated[index] else kept).append(word)
+                index += 1
+            if kept:
+                kept_lines.append(" ".join(kept))
+        self.report["tokens_saved"] += self.count_tokens(" ".join(removed))
+        return "\n".join(kept_lines)
+
+
+def dedup_pages(pages, **kwargs):
+    """
+    Deduplicate a list of `(url, text)` pages. Returns the kept pages and the report.
+    """
+    deduplicator = SiteDeduplicator(**kwargs)
+    kept = []
+    for url, text in pages:
+        cleaned = deduplicator.add(url, text)
+        if cleaned is not None:
+            kept.append((url, cleaned))
+    return kept, deduplicator.report
@@ -0,0 +1,944 @@
+"""
+Multi-node work distribution for `summarizer.scrape`.
+
+Company URLs are put on a shared queue as jobs, and any number of `Worker`s on any
+number of machines lease them, scrape them and acknowledge the result:
+
+* Leases and heartbeats: a leased job belongs to its worker until `lease_seconds`
+  pass without a heartbeat. A worker that dies stops heartbeating, and its job is
+  delivered again to another worker; after `max_attempts` deliveries the job is
+  marked failed instead.
+* Domain sharding: every job carries its registrable domain (example.co.uk for
+  www.shop.example.co.uk). A domain is leased by at most one worker at a time, so
+  two nodes never crawl the same site at once and per-host politeness holds across
+  the cluster. Domains also hash to one of `SHARDS` shards; a worker started with
+  `shards=...` only takes those, which keeps each site's page cache and manifest
+  on the same node from one run to the next.
+
+Two backends implement `JobQueue`: `SQLiteQueue`, a file that several processes
+(or machines on a shared disk) can use, and `RedisQueue`, whose state changes
+are Lua scripts. It accepts a redis-py client, or `InMemoryRedis`, a thread-safe
+stand-in for tests and single-process runs that runs Python twins of the scripts.
+
+    python distributed.py enqueue jobs.sqlite companies.txt
+    python distributed.py work jobs.sqlite --output results.jsonl --workers 4
+    python distributed.py status jobs.sqlite
+"""
+import argparse
+import contextlib
+import functools
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+SHARDS = 64
+DEFAULT_LEASE_SECONDS = 300
+MAX_ATTEMPTS = 3
+# Domains a Redis lease script reads from the `domains` sorted set at a time.
+LEASE_SCAN = 100
+STATES = ("ready", "leased", "done", "failed")
+# Second-level labels under which names are registered, for the common country
+# domains; a stand-in for the Public Suffix List.
+MULTI_PART_SUFFIXES = frozenset(
+    """
+    co.uk org.uk ac.uk gov.uk ltd.uk plc.uk me.uk co.jp ne.jp or.jp com.au net.au org.au
+    co.nz com.br com.cn com.mx co.in co.za com.sg com.tr co.kr com.hk com.ar com.tw co.il
+    """.split()
+)
+
+
+def registrable_domain(url):
+    """
+    The registrable domain of a URL's host: the name under its public suffix
+    ("shop.example.co.uk" -> "example.co.uk"). IP addresses are returned unchanged.
+    """
+    host = (urlsplit(url if "://" in url else "https://" + url).hostname or "").lower().rstrip(".")
+    labels = host.split(".")
+    if ":" in host or host.replace(".", "").isdigit() or len(labels) <= 2:
+        return host
+    keep = 3 if ".".join(labels[-2:]) in MULTI_PART_SUFFIXES else 2
+    return ".".join(labels[-keep:])
+
+
+def shard_of(domain, shards=SHARDS):
+    return int.from_bytes(hashlib.blake2b(domain.encode("utf-8"), digest_size=8).digest(), "big") % shards
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+@dataclass
+class Job:
+    id: str
+    url: str
+    domain: str
+    shard: int
+    # Keyword arguments for the scrape function (chain_type, max_urls...).
+    payload: Dict = field(default_factory=dict)
+    # Deliveries so far, this one included.
+    attempts: int = 0
+
+
+def new_job(url, **payload):
+    domain = registrable_domain(url)
+    return Job(id=uuid.uuid4().hex, url=url, domain=domain, shard=shard_of(domain), payload=payload)
+
+
+class JobQueue:
+    """
+    The queue interface the workers use. Delivery is at least once: a job whose
+    lease runs out is delivered again, even if its first worker finishes it later.
+    """
+
+    lease_seconds = DEFAULT_LEASE_SECONDS
+    max_attempts = MAX_ATTEMPTS
+
+    def put(self, job: Job):
+        raise NotImplementedError
+
+    def lease(self, worker_id, shards=None) -> Optional[Job]:
+        """
+        Lease the oldest ready job whose domain no other worker holds, or return None.
+        """
+        raise NotImplementedError
+
+    def heartbeat(self, job_id, worker_id) -> bool:
+        """
+        Extend the lease; False if the job is no longer leased to `worker_id`.
+        """
+        raise NotImplementedError
+
+    def ack(self, job_id, worker_id, result=None) -> bool:
+        """
+        Mark the job done; False if the lease had already been lost.
+        """
+        raise NotImplementedError
+
+    def fail(self, job_id, worker_id, error) -> bool:
+        """
+        Give the job back for another attempt, or mark it failed after `max_attempts`.
+        """
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Number of jobs in each of `STATES`.
+        """
+        raise NotImplementedError
+
+    def put_many(self, jobs: Iterable[Job]):
+        for job in jobs:
+            self.put(job)
+
+    def unfinished(self):
+        stats = self.stats()
+        return stats["ready"] + stats["leased"]
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    shard INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created_at);
+CREATE INDEX IF NOT EXISTS jobs_domain ON jobs (domain, state);
+"""
+
+
+class SQLiteQueue(JobQueue):
+    """
+    Jobs in a SQLite file. Every state change runs in an IMMEDIATE transaction, so
+    workers in several processes can share the file.
+    """
+
+    def __init__(self, path, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def put(self, job):
+        self.put_many([job])
+
+    def put_many(self, jobs):
+        now = time.time()
+        rows = [
+            (job.id, job.url, job.domain, job.shard, json.dumps(job.payload), "ready", now, now)
+            for job in jobs
+        ]
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO jobs (id, url, domain, shard, payload, state, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def _reclaim(self, conn, now):
+        # Leases that ran out: the worker died or stalled.
+        conn.execute(
+            "UPDATE jobs SET state = 'failed', error = 'lease expired', worker = NULL, updated_at = ?"
+            " WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+            (now, now, self.max_attempts),
+        )
+        conn.execute(
+            "UPDATE jobs SET state = 'ready', worker = NULL, updated_at = ?"
+            " WHERE state = 'leased' AND lease_until < ?",
+            (now, now),
+        )
+
+    def lease(self, worker_id, shards=None):
+        now = time.time()
+        shard_filter, params = "", [worker_id]
+        if shards is not None:
+            shard_filter = f" AND shard IN ({','.join('?' * len(shards))})"
+            params += list(shards)
+        with self._transaction() as conn:
+            self._reclaim(conn, now)
+            row = conn.execute(
+                "SELECT id, url, domain, shard, payload, attempts FROM jobs"
+                " WHERE state = 'ready' AND domain NOT IN"
+                " (SELECT domain FROM jobs WHERE state = 'leased' AND worker != ?)"
+                + shard_filter
+                + " ORDER BY created_at, rowid LIMIT 1",
+                params,
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET state = 'leased', worker = ?, lease_until = ?,"
+                " attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (worker_id, now + self.lease_seconds, now, row[0]),
+            )
+        job_id, url, domain, shard, payload, attempts = row
+        return Job(job_id, url, domain, shard, json.loads(payload), attempts + 1)
+
+    def heartbeat(self, job_id, worker_id):
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ?"
+                " WHERE id = ? AND state = 'leased' AND worker = ?",
+                (now + self.lease_seconds, now, job_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def ack(self, job_id, worker_id, result=None):
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = 'done', result = ?, updated_at = ?"
+                " WHERE id = ? AND state = 'leased' AND worker = ?",
+                (json.dumps(result, default=str), time.time(), job_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id, worker_id, error):
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'ready' END,"
+                " worker = NULL, error = ?, updated_at = ?"
+                " WHERE id = ? AND state = 'leased' AND worker = ?",
+                (self.max_attempts, error, time.time(), job_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {**{state: 0 for state in STATES}, **dict(rows)}
+
+
+# Every RedisQueue state change is one of these scripts, so it runs atomically. On
+# Redis they are Lua (`_LUA_PRELUDE` plus the script); `InMemoryRedis` runs the
+# Python twin under its lock. Both take ARGV = [prefix, ...] and no KEYS: the keys
+# depend on the job's domain, which is only known inside the script.
+_LUA_PRELUDE = """
+local prefix = ARGV[1]
+local function key(...)
+    return prefix .. ':' .. table.concat({...}, ':')
+end
+local function move(old, new)
+    if old then
+        redis.call('HINCRBY', key('stats'), old, -1)
+    end
+    redis.call('HINCRBY', key('stats'), new, 1)
+end
+local function make_ready(job_id, domain, created_at)
+    redis.call('RPUSH', key('domain', domain), job_id)
+    redis.call('ZADD', key('domains'), 'NX', created_at, domain)
+end
+local function release(domain, job_id, worker)
+    if job_id then
+        redis.call('HDEL', key('held', domain), job_id)
+    end
+    for _, holder in ipairs(redis.call('HVALS', key('held', domain))) do
+        if holder == worker then
+            return
+        end
+    end
+    if redis.call('GET', key('owner', domain)) == worker then
+        redis.call('DEL', key('owner', domain))
+    end
+end
+"""
+
+_PUT_LUA = """
+local job_id = ARGV[2]
+for i = 4, #ARGV, 2 do
+    redis.call('HSET', key('job', job_id), ARGV[i], ARGV[i + 1])
+end
+move(false, 'ready')
+make_ready(job_id, redis.call('HGET', key('job', job_id), 'domain'), ARGV[3])
+return 1
+"""
+
+_LEASE_LUA = """
+local worker, now, scan = ARGV[2], tonumber(ARGV[3]), tonumber(ARGV[7])
+local shards = false
+if ARGV[6] ~= '*' then
+    shards = {}
+    for shard in string.gmatch(ARGV[6], '[^,]+') do
+        shards[shard] = true
+    end
+end
+local offset = 0
+while true do
+    local domains = redis.call('ZRANGE', key('domains'), offset, offset + scan - 1)
+    if #domains == 0 then
+        return false
+    end
+    local emptied = 0
+    for _, domain in ipairs(domains) do
+        local first = redis.call('LINDEX', key('domain', domain), 0)
+        if not first then
+            redis.call('ZREM', key('domains'), domain)
+            emptied = emptied + 1
+        elseif not shards or shards[redis.call('HGET', key('job', first), 'shard')] then
+            local owner = key('owner', domain)
+            if redis.call('SET', owner, worker, 'NX', 'PX', ARGV[5]) or redis.call('GET', owner) == worker then
+                local job_id = redis.call('LPOP', key('domain', domain))
+                redis.call('ZADD', key('leases'), now + tonumber(ARGV[4]), job_id)
+                redis.call('HINCRBY', key('job', job_id), 'attempts', 1)
+                redis.call('HSET', key('job', job_id), 'state', 'leased', 'worker', worker)
+                redis.call('HSET', key('held', domain), job_id, worker)
+                move('ready', 'leased')
+                return job_id
+            end
+        end
+    end
+    offset = offset + #domains - emptied
+end
+"""
+
+_RECLAIM_LUA = """
+local job_id = ARGV[2]
+local deadline = redis.call('ZSCORE', key('leases'), job_id)
+if not deadline or tonumber(deadline) > tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('ZREM', key('leases'), job_id)
+local job = key('job', job_id)
+local domain = redis.call('HGET', job, 'domain')
+release(domain, job_id, redis.call('HGET', job, 'worker'))
+if tonumber(redis.call('HGET', job, 'attempts')) >= tonumber(ARGV[4]) then
+    redis.call('HSET', job, 'state', 'failed', 'error', 'lease expired')
+    move('leased', 'failed')
+else
+    redis.call('HSET', job, 'state', 'ready')
+    move('leased', 'ready')
+    make_ready(job_id, domain, redis.call('HGET', job, 'created_at'))
+end
+return 1
+"""
+
+_HEARTBEAT_LUA = """
+local job_id, worker = ARGV[2], ARGV[3]
+local job = key('job', job_id)
+if not redis.call('ZSCORE', key('leases'), job_id) or redis.call('HGET', job, 'worker') ~= worker then
+    return 0
+end
+redis.call('ZADD', key('leases'), 'XX', tonumber(ARGV[4]) + tonumber(ARGV[5]), job_id)
+local owner = key('owner', redis.call('HGET', job, 'domain'))
+local holder = redis.call('GET', owner)
+if not holder or holder == worker then
+    redis.call('SET', owner, worker, 'PX', ARGV[6])
+end
+return 1
+"""
+
+_FINISH_LUA = """
+local job_id, worker = ARGV[2], ARGV[3]
+local job = key('job', job_id)
+if redis.call('HGET', job, 'worker') ~= worker or redis.call('ZREM', key('leases'), job_id) == 0 then
+    return 0
+end
+local domain = redis.call('HGET', job, 'domain')
+release(domain, job_id, worker)
+local state = ARGV[4]
+if ARGV[5] == '1' and tonumber(redis.call('HGET', job, 'attempts')) < tonumber(ARGV[6]) then
+    state = 'ready'
+end
+for i = 7, #ARGV, 2 do
+    redis.call('HSET', job, ARGV[i], ARGV[i + 1])
+end
+redis.call('HSET', job, 'state', state)
+move('leased', state)
+if state == 'ready' then
+    make_ready(job_id, domain, redis.call('HGET', job, 'created_at'))
+end
+return 1
+"""
+
+
+def _key(prefix, *parts):
+    return ":".join((prefix,) + parts)
+
+
+def _move(redis, prefix, old_state, new_state):
+    if old_state:
+        redis.hincrby(_key(prefix, "stats"), old_state, -1)
+    redis.hincrby(_key(prefix, "stats"), new_state, 1)
+
+
+def _make_ready(redis, prefix, job_id, domain, created_at):
+    redis.rpush(_key(prefix, "domain", domain), job_id)
+    redis.zadd(_key(prefix, "domains"), {domain: created_at}, nx=True)
+
+
+def _release(redis, prefix, domain, job_id, worker_id):
+    """
+    Drop `job_id` from the domain's leases, and the domain lock once `worker_id`
+    holds no other lease on the domain.
+    """
+    if job_id is not None:
+        redis.hdel(_key(prefix, "held", domain), job_id)
+    if worker_id in redis.hvals(_key(prefix, "held", domain)):
+        return
+    if redis.get(_key(prefix, "owner", domain)) == worker_id:
+        redis.delete(_key(prefix, "owner", domain))
+
+
+def _put(redis, args):
+    prefix, job_id, created_at, *fields = args
+    redis.hset(_key(prefix, "job", job_id), mapping=dict(zip(fields[::2], fields[1::2])))
+    _move(redis, prefix, None, "ready")
+    _make_ready(redis, prefix, job_id, redis.hget(_key(prefix, "job", job_id), "domain"), created_at)
+    return 1
+
+
+def _lease(redis, args):
+    prefix, worker_id, now, lease_seconds, lease_ms, shards, scan = args
+    shards = None if shards == "*" else set(shards.split(","))
+    offset = 0
+    while True:
+        domains = redis.zrange(_key(prefix, "domains"), offset, offset + int(scan) - 1)
+        if not domains:
+            return None
+        emptied = 0
+        for domain in domains:
+            first = redis.lindex(_key(prefix, "domain", domain), 0)
+            if first is None:
+                redis.zrem(_key(prefix, "domains"), domain)
+                emptied += 1
+                continue
+            if shards is not None and redis.hget(_key(prefix, "job", first), "shard") not in shards:
+                continue
+            owner = _key(prefix, "owner", domain)
+            if not redis.set(owner, worker_id, nx=True, px=int(lease_ms)) and redis.get(owner) != worker_id:
+                continue
+            job_id = redis.lpop(_key(prefix, "domain", domain))
+            redis.zadd(_key(prefix, "leases"), {job_id: float(now) + float(lease_seconds)})
+            redis.hincrby(_key(prefix, "job", job_id), "attempts", 1)
+            redis.hset(_key(prefix, "job", job_id), mapping={"state": "leased", "worker": worker_id})
+            redis.hset(_key(prefix, "held", domain), job_id, worker_id)
+            _move(redis, prefix, "ready", "leased")
+            return job_id
+        offset += len(domains) - emptied
+
+
+def _reclaim(redis, args):
+    prefix, job_id, now, max_attempts = args
+    deadline = redis.zscore(_key(prefix, "leases"), job_id)
+    if deadline is None or deadline > float(now):
+        return 0
+    redis.zrem(_key(prefix, "leases"), job_id)
+    job = redis.hgetall(_key(prefix, "job", job_id))
+    _release(redis, prefix, job["domain"], job_id, job.get("worker"))
+    if int(job["attempts"]) >= int(max_attempts):
+        redis.hset(_key(prefix, "job", job_id), mapping={"state": "failed", "error": "lease expired"})
+        _move(redis, prefix, "leased", "failed")
+    else:
+        redis.hset(_key(prefix, "job", job_id), mapping={"state": "ready"})
+        _move(redis, prefix, "leased", "ready")
+        _make_ready(redis, prefix, job_id, job["domain"], float(job["created_at"]))
+    return 1
+
+
+def _heartbeat(redis, args):
+    prefix, job_id, worker_id, now, lease_seconds, lease_ms = args
+    job = _key(prefix, "job", job_id)
+    if redis.zscore(_key(prefix, "leases"), job_id) is None or redis.hget(job, "worker") != worker_id:
+        return 0
+    redis.zadd(_key(prefix, "leases"), {job_id: float(now) + float(lease_seconds)}, xx=True)
+    owner = _key(prefix, "owner", redis.hget(job, "domain"))
+    if redis.get(owner) in (None, worker_id):
+        redis.set(owner, worker_id, px=int(lease_ms))
+    return 1
+
+
+def _finish(redis, args):
+    prefix, job_id, worker_id, state, retry, max_attempts, *fields = args
+    job = _key(prefix, "job", job_id)
+    if redis.hget(job, "worker") != worker_id or not redis.zrem(_key(prefix, "leases"), job_id):
+        return 0
+    domain = redis.hget(job, "domain")
+    _release(redis, prefix, domain, job_id, worker_id)
+    if retry == "1" and int(redis.hget(job, "attempts")) < int(max_attempts):
+        state = "ready"
+    redis.hset(job, mapping={**dict(zip(fields[::2], fields[1::2])), "state": state})
+    _move(redis, prefix, "leased", state)
+    if state == "ready":
+        _make_ready(redis, prefix, job_id, domain, float(redis.hget(job, "created_at")))
+    return 1
+
+
+_SCRIPTS = {
+    "put": (_PUT_LUA, _put),
+    "lease": (_LEASE_LUA, _lease),
+    "reclaim": (_RECLAIM_LUA, _reclaim),
+    "heartbeat": (_HEARTBEAT_LUA, _heartbeat),
+    "finish": (_FINISH_LUA, _finish),
+}
+
+
+class RedisQueue(JobQueue):
+    """
+    Jobs in Redis. Every state change is a single Lua script (`_SCRIPTS`), so
+    concurrent workers never see half a transition. A client must return str values
+    (redis-py with `decode_responses=True`) and support `register_script`, or be an
+    `InMemoryRedis`.
+
+    Keys, under `prefix`: `job:<id>` hashes, a `domain:<domain>` list of ready job
+    ids per domain, the `domains` sorted set of domains with ready jobs (oldest
+    first), the `leases` sorted set of leased job ids by deadline, `owner:<domain>`
+    locks (SET NX PX) with the `held:<domain>` hash of the domain's leased jobs and
+    their workers, and the `stats` hash of jobs per state. A domain lock is only
+    released once its worker holds no other lease on the domain. Removing a job id
+    from `leases` is how a worker or a reclaim claims it, so a job is never both
+    acked and redelivered by the same transition.
+    """
+
+    def __init__(self, client, prefix="scraper", lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.redis = client
+        self.prefix = prefix
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        if isinstance(client, InMemoryRedis):
+            self._scripts = {name: client.atomic(function) for name, (_, function) in _SCRIPTS.items()}
+        else:
+            self._scripts = {name: client.register_script(_LUA_PRELUDE + lua) for name, (lua, _) in _SCRIPTS.items()}
+
+    def _key(self, *parts):
+        return _key(self.prefix, *parts)
+
+    def _run(self, name, *args):
+        return self._scripts[name](keys=[], args=[self.prefix, *(str(arg) for arg in args)])
+
+    def put(self, job):
+        fields = {
+            "url": job.url,
+            "domain": job.domain,
+            "shard": job.shard,
+            "payload": json.dumps(job.payload),
+            "state": "ready",
+            "attempts": 0,
+            "created_at": repr(time.time()),
+        }
+        self._run("put", job.id, fields["created_at"], *(item for pair in fields.items() for item in pair))
+
+    def lease(self, worker_id, shards=None):
+        now = repr(time.time())
+        for job_id in self.redis.zrangebyscore(self._key("leases"), "-inf", now):
+            # Skipped inside the script if the lease was renewed or finished meanwhile.
+            self._run("reclaim", job_id, now, self.max_attempts)
+        lease_ms = int(self.lease_seconds * 1000)
+        # The oldest ready domain that is free (and in `shards`) is picked inside the
+        # script, in one round trip however many domains are waiting.
+        shards = "*" if shards is None else ",".join(str(shard) for shard in sorted(shards))
+        job_id = self._run("lease", worker_id, now, self.lease_seconds, lease_ms, shards, LEASE_SCAN)
+        if job_id is None:
+            return None
+        job = self.redis.hgetall(self._key("job", job_id))
+        return Job(
+            job_id,
+            job["url"],
+            job["domain"],
+            int(job["shard"]),
+            json.loads(job["payload"]),
+            int(job["attempts"]),
+        )
+
+    def heartbeat(self, job_id, worker_id):
+        lease_ms = int(self.lease_seconds * 1000)
+        return bool(self._run("heartbeat", job_id, worker_id, repr(time.time()), self.lease_seconds, lease_ms))
+
+    def _finish(self, job_id, worker_id, fields, retry):
+        state = fields.pop("state")
+        items = (item for pair in fields.items() for item in pair)
+        return bool(self._run("finish", job_id, worker_id, state, int(retry), self.max_attempts, *items))
+
+    def ack(self, job_id, worker_id, result=None):
+        fields = {"state": "done", "result": json.dumps(result, default=str)}
+        return self._finish(job_id, worker_id, fields, retry=False)
+
+    def fail(self, job_id, worker_id, error):
+        return self._finish(job_id, worker_id, {"state": "failed", "error": error}, retry=True)
+
+    def stats(self):
+        counts = self.redis.hgetall(self._key("stats"))
+        return {state: int(counts.get(state, 0)) for state in STATES}
+
+
+class InMemoryRedis:
+    """
+    The subset of the redis-py client API used by `RedisQueue`, kept in memory
+    (strings, hashes, lists, sorted sets and key expiry), safe across threads.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.RLock()
+
+    def atomic(self, function):
+        """
+        The stand-in for `register_script`: a callable running `function(self, args)`
+        (a `_SCRIPTS` twin of the Lua script) under the lock, so it is atomic too.
+        """
+
+        def run(keys=(), args=()):
+            with self._lock:
+                return function(self, list(args))
+
+        return run
+
+    def _get(self, key, default=None):
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return self._data.get(key, default)
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def set(self, key, value, nx=False, px=None):
+        with self._lock:
+            if nx and self._get(key) is not None:
+                return None
+            self._data[key] = str(value)
+            self._expires.pop(key, None)
+            if px is not None:
+                self._expires[key] = time.time() + px / 1000
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            removed = 0
+            for key in keys:
+                removed += self._get(key) is not None
+                self._data.pop(key, None)
+                self._expires.pop(key, None)
+            return removed
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        with self._lock:
+            hash_ = self._data.setdefault(key, {})
+            items = dict(mapping or {})
+            if field is not None:
+                items[field] = value
+            added = sum(1 for name in items if name not in hash_)
+            hash_.update({name: str(item) for name, item in items.items()})
+            return added
+
+    def hget(self, key, field):
+        with self._lock:
+            return self._get(key, {}).get(field)
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._get(key, {}))
+
+    def hdel(self, key, *fields):
+        with self._lock:
+            hash_ = self._get(key, {})
+            return sum(hash_.pop(name, None) is not None for name in fields)
+
+    def hvals(self, key):
+        with self._lock:
+            return list(self._get(key, {}).values())
+
+    def hincrby(self, key, field, amount=1):
+        with self._lock:
+            hash_ = self._data.setdefault(key, {})
+            hash_[field] = str(int(hash_.get(field, 0)) + amount)
+            return int(hash_[field])
+
+    def rpush(self, key, *values):
+        with self._lock:
+            items = self._data.setdefault(key, [])
+            items.extend(str(value) for value in values)
+            return len(items)
+
+    def lpop(self, key):
+        with self._lock:
+            items = self._get(key)
+            return items.pop(0) if items else None
+
+    def lindex(self, key, index):
+        with self._lock:
+            items = self._get(key, [])
+            return items[index] if -len(items) <= index < len(items) else None
+
+    def llen(self, key):
+        with self._lock:
+            return len(self._get(key, []))
+
+    def zadd(self, key, mapping, nx=False, xx=False):
+        with self._lock:
+            scores = self._data.setdefault(key, {})
+            added = 0
+            for member, score in mapping.items():
+                exists = member in scores
+                if (nx and exists) or (xx and not exists):
+                    continue
+                added += not exists
+                scores[member] = float(score)
+            return added
+
+    def zrem(self, key, *members):
+        with self._lock:
+            scores = self._get(key, {})
+            return sum(scores.pop(member, None) is not None for member in members)
+
+    def zscore(self, key, member):
+        with self._lock:
+            return self._get(key, {}).get(member)
+
+    def _ordered(self, key):
+        return sorted(self._get(key, {}).items(), key=lambda item: (item[1], item[0]))
+
+    def zrange(self, key, start, end):
+        with self._lock:
+            members = [member for member, _ in self._ordered(key)]
+            return members[start : None if end == -1 else end + 1]
+
+    def zrangebyscore(self, key, minimum, maximum):
+        low, high = float(minimum), float(maximum)
+        with self._lock:
+            return [member for member, score in self._ordered(key) if low <= score <= high]
+
+
+def open_queue(spec, **kwargs):
+    """
+    A `JobQueue` from a spec: "redis://host:port/db", "memory://" (an `InMemoryRedis`),
+    or a SQLite file path.
+    """
+    if spec.startswith(("redis://", "rediss://")):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("Redis queues need `pip install redis`")
+        return RedisQueue(redis.Redis.from_url(spec, decode_responses=True), **kwargs)
+    if spec == "memory://":
+        return RedisQueue(InMemoryRedis(), **kwargs)
+    return SQLiteQueue(spec, **kwargs)
+
+
+def _default_scrape(url, chain_type="auto", max_urls=5, extraction_pool=None):
+    import batch
+
+    return batch.scrape_one(url, chain_type=chain_type, max_urls=max_urls, extraction_pool=extraction_pool)
+
+
+class Worker:
+    """
+    Leases jobs from `queue` and runs `scrape(url, **job.payload)` on them, which must
+    return a record dict (with an "error" key on failure, like `batch.scrape_one`).
+    A background thread heartbeats the lease while the scrape runs. `on_result` gets
+    each job's final record: a success, or the error of its last attempt.
+    """
+
+    def __init__(self, queue, scrape=None, worker_id=None, shards=None, on_result=None):
+        self.queue = queue
+        self.scrape = scrape or _default_scrape
+        self.worker_id = worker_id or default_worker_id()
+        self.shards = set(shards) if shards is not None else None
+        self.on_result = on_result
+        self.stats = {"completed": 0, "errors": 0, "lost_leases": 0}
+
+    def _heartbeat(self, job, done):
+        interval = self.queue.lease_seconds / 3
+        while not done.wait(interval):
+            if not self.queue.heartbeat(job.id, self.worker_id):
+                logger.warning("Lost the lease on %s (%s)", job.url, job.id)
+                return
+
+    def run_one(self):
+        """
+        Lease and process one job. Returns False when none was available.
+        """
+        job = self.queue.lease(self.worker_id, self.shards)
+        if job is None:
+            return False
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, done), daemon=True)
+        heartbeat.start()
+        try:
+            record = self.scrape(job.url, **job.payload)
+        except Exception as e:
+            record = {"url": job.url, "error": f"{type(e).__name__}: {e}"}
+        finally:
+            done.set()
+            heartbeat.join()
+        if "error" in record:
+            finished = self.queue.fail(job.id, self.worker_id, record["error"])
+            # Failed attempts that will be retried are not results yet.
+            final = job.attempts >= self.queue.max_attempts
+            self.stats["errors"] += 1
+        else:
+            finished = self.queue.ack(job.id, self.worker_id, record)
+            final = True
+            self.stats["completed"] += 1
+        if not finished:
+            # The lease ran out and the job went to another worker; its result wins.
+            self.stats["lost_leases"] += 1
+        elif final and self.on_result is not None:
+            self.on_result(record)
+        return True
+
+    def run(self, poll_interval=1.0, stop=None):
+        """
+        Process jobs until the queue has none left ready or leased (or `stop` is set).
+        Jobs of domains held by other workers are waited for.
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            if not self.run_one():
+                if not self.queue.unfinished():
+                    break
+                stop.wait(poll_interval)
+        return self.stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distributed scraping over a shared job queue.")
+    parser.add_argument("command", choices=["enqueue", "work", "status"])
+    parser.add_argument("queue", help="SQLite file, redis://host:port/db or memory://")
+    parser.add_argument("input", nargs="?", help="enqueue: file with one URL per line, or - for stdin")
+    parser.add_argument("--chain-type", choices=["auto", "stuff", "refine", "map_reduce"], default="auto")
+    parser.add_argument("--max-urls", type=int, default=5)
+    parser.add_argument("--output", "-o", default="results.jsonl", help="work: where records are appended")
+    parser.add_argument("--store", help="work: also append records to this columnar results store directory")
+    parser.add_argument("--workers", "-w", type=int, default=1, help="work: worker threads on this node")
+    parser.add_argument("--shards", help="work: comma-separated shards (0-%d) to take jobs from" % (SHARDS - 1))
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS)
+    parser.add_argument(
+        "--extract-workers", type=int, default=0, help="work: parse pages in this many processes shared by the workers"
+    )
+    parser.add_argument("--verbose", "-v", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    queue = open_queue(args.queue, lease_seconds=args.lease_seconds)
+
+    if args.command == "enqueue":
+        import batch
+
+        payload = {"chain_type": args.chain_type, "max_urls": args.max_urls}
+        jobs = [new_job(url, **payload) for url in batch.read_urls(args.input or "-")]
+        queue.put_many(jobs)
+        print(json.dumps({"enqueued": len(jobs)}))
+    elif args.command == "work":
+        lock = threading.Lock()
+        shards = [int(shard) for shard in args.shards.split(",")] if args.shards else None
+        store = None
+        if args.store:
+            import results_store
+
+            store = results_store.ResultsStore(args.store)
+        scrape = None
+        extraction_pool = None
+        if args.extract_workers:
+            import extract_pool
+
+            extraction_pool = extract_pool.ExtractionPool(workers=args.extract_workers)
+            scrape = functools.partial(_default_scrape, extraction_pool=extraction_pool)
+        with open(args.output, "a", encoding="utf-8") as output:
+
+            def write(record):
+                with lock:
+                    output.write(json.dumps(record, default=str) + "\n")
+                    output.flush()
+                    if store is not None:
+                        store.append(record)
+
+            workers = [Worker(queue, scrape=scrape, shards=shards, on_result=write) for _ in range(args.workers)]
+            threads = [threading.Thread(target=worker.run) for worker in workers]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        if extraction_pool is not None:
+            extraction_pool.close()
+        if store is not None:
+            store.flush()
+        totals = {key: sum(worker.stats[key] for worker in workers) for key in workers[0].stats}
+        print(json.dumps(totals))
+    print(json.dumps(queue.stats()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,9 @@
+"""
+Domain keys shared by the batch runner and the results store.
+"""
+from urllib.parse import urlparse
+
+
+def domain_of(url):
+    netloc = urlparse(url if "://" in url else "https://" + url).netloc.lower()
+    return netloc[4:] if netloc.startswith("www.") else netloc
@@ -0,0 +1,113 @@
+"""
+Process-pool extraction stage.
+
+trafilatura and HTML parsing are CPU-bound, so running them on threads next to the
+async downloader serializes on the GIL. `ExtractionPool` runs them in worker
+processes instead. Raw page bytes are not pickled through the pool's pipe: each
+page is written to a spool file (on /dev/shm when available, so it stays in
+memory) and the worker memory-maps it. Only the file path goes over the pipe, and
+only the extracted text and metadata come back.
+
+The pool size is independent of the fetch concurrency; by default it uses every
+core (SCRAPER_EXTRACT_WORKERS overrides).
+"""
+import mmap
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+MODES = ("pipeline", "all")
+
+
+def default_workers():
+    return int(os.getenv("SCRAPER_EXTRACT_WORKERS", 0)) or os.cpu_count() or 1
+
+
+def default_spool_dir():
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+def _read_spool(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return mapped[:]
+
+
+def extract_bytes(raw, mode="pipeline"):
+    """
+    Extract one page. "pipeline" runs scraper's trafilatura -> beautifulsoup ->
+    text_from_html chain and returns its text, extractor and metadata; "all" is
+    the summarizer's get_text-style extraction.
+    """
+    if mode == "pipeline":
+        import scraper
+
+        return scraper.extract_html_bytes(raw)
+    if mode == "all":
+        import html_text
+
+        return {"text": html_text.extract_text(raw, "all"), "extractor": "all", "metadata": {}}
+    raise ValueError(f"Unknown extraction mode {mode!r}, expected one of {MODES}")
+
+
+def _extract_spooled(path, mode):
+    return extract_bytes(_read_spool(path), mode)
+
+
+class ExtractionPool:
+    def __init__(self, workers=None, mode="pipeline", spool_dir=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown extraction mode {mode!r}, expected one of {MODES}")
+        self.workers = workers or default_workers()
+        self.mode = mode
+        self.spool_dir = tempfile.mkdtemp(prefix="scraper-spool-", dir=spool_dir or default_spool_dir())
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def _spool(self, raw):
+        with self._lock:
+            self._counter += 1
+            path = os.path.join(self.spool_dir, f"{self._counter}.html")
+        with open(path, "wb") as f:
+            f.write(raw)
+        return path
+
+    def submit(self, raw, mode=None):
+        """
+        Queue the extraction of one page's bytes and return a Future of the result
+        dict. `mode` defaults to the pool's mode.
+        """
+        path = self._spool(raw)
+        future = self._executor.submit(_extract_spooled, path, mode or self.mode)
+        future.add_done_callback(lambda _: os.path.exists(path) and os.remove(path))
+        return future
+
+    def extract(self, raw, mode=None):
+        """
+        Extract one page, blocking the calling thread (not the GIL) until it is done.
+        """
+        return self.submit(raw, mode).result()
+
+    def extract_text(self, raw, mode=None):
+        return self.extract(raw, mode)["text"]
+
+    def map(self, raws, mode=None):
+        futures = [self.submit(raw, mode) for raw in raws]
+        for future in futures:
+            yield future.result()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for name in os.listdir(self.spool_dir):
+            os.remove(os.path.join(self.spool_dir, name))
+        os.rmdir(self.spool_dir)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+
+import http_client
+import page_cache
+
+logger = logging.getLogger(__name__)
+
+# Total number of requests in flight, and the number allowed against a single host.
+MAX_CONCURRENCY = 10
+MAX_PER_HOST = 2
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status_code: Optional[int] = None
+    content: bytes = b""
+    text: str = ""
+    error: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.error is None and self.status_code is not None and self.status_code < 400
+
+
+async def _wait_turn(host, crawl_delay, next_start):
+    """
+    Sleep until `host` may be requested again: requests to one host start at least
+    `crawl_delay` seconds apart. Each caller reserves its slot before sleeping.
+    """
+    loop = asyncio.get_running_loop()
+    start = max(loop.time(), next_start.get(host, 0.0))
+    next_start[host] = start + crawl_delay
+    await asyncio.sleep(start - loop.time())
+
+
+async def _fetch_one(
+    client, url, global_limit, host_limits, cache, crawl_delay=0.0, next_start=None, prefetched=None
+):
+    if prefetched and url in prefetched:
+        return prefetched[url]
+    try:
+        host = urlparse(url).netloc
+    except ValueError as e:
+        logger.warning("Error fetching %s: %s", url, e)
+        return FetchResult(url=url, error=str(e))
+    if crawl_delay:
+        await _wait_turn(host, crawl_delay, next_start)
+    async with global_limit, host_limits[host]:
+        try:
+            response = await page_cache.afetch(client, url, cache)
+        except http_client.REQUEST_ERRORS as e:
+            logger.warning("Error fetching %s: %s", url, e)
+            return FetchResult(url=url, error=str(e))
+    result = FetchResult(
+        url=url,
+        status_code=response.status_code,
+        content=response.content,
+        text=response.text,
+    )
+    if response.status_code >= 400:
+        result.error = f"HTTP {response.status_code}"
+    return result
+
+
+async def fetch_all(
+    urls: Iterable[str],
+    max_concurrency: int = MAX_CONCURRENCY,
+    max_per_host: int = MAX_PER_HOST,
+    cache: Optional[page_cache.PageCache] = None,
+    crawl_delay: float = 0.0,
+    next_start: Optional[Dict[str, float]] = None,
+    prefetched: Optional[Dict[str, FetchResult]] = None,
+) -> List[FetchResult]:
+    """
+    Fetch every URL concurrently and return the results in the same order as `urls`.
+    At most `max_concurrency` requests are in flight at once, and at most
+    `max_per_host` of those go to the same host; with a `crawl_delay` (a site's
+    robots.txt Crawl-delay) requests to one host also start that many seconds
+    apart, counted from `next_start` (the earliest `time.monotonic()` each host may
+    be requested again, e.g. `crawler.Crawler.fetch_kwargs`). Pages are served from
+    `prefetched` (results by URL, already downloaded) or `cache` (or the default
+    page cache) when possible.
+    """
+    urls = list(urls)
+    global_limit = asyncio.Semaphore(max_concurrency)
+    host_limits = defaultdict(lambda: asyncio.Semaphore(max_per_host))
+    next_start = dict(next_start or {})
+    async with http_client.async_client() as client:
+        return await asyncio.gather(
+            *(
+                _fetch_one(
+                    client, url, global_limit, host_limits, cache, crawl_delay, next_start, prefetched
+                )
+                for url in urls
+            )
+        )
+
+
+async def fetch_iter(
+    urls: Iterable[str],
+    ordered: bool = False,
+    max_concurrency: int = MAX_CONCURRENCY,
+    max_per_host: int = MAX_PER_HOST,
+    cache: Optional[page_cache.PageCache] = None,
+    crawl_delay: float = 0.0,
+    next_start: Optional[Dict[str, float]] = None,
+    prefetched: Optional[Dict[str, FetchResult]] = None,
+) -> AsyncIterator[FetchResult]:
+    """
+    Fetch every URL concurrently like `fetch_all`, yielding each result as soon as it
+    is available: in completion order, or with `ordered=True` in the order of `urls`
+    (each page is still yielded as soon as it and all the pages before it are done).
+    """
+    global_limit = asyncio.Semaphore(max_concurrency)
+    host_limits = defaultdict(lambda: asyncio.Semaphore(max_per_host))
+    next_start = dict(next_start or {})
+    async with http_client.async_client() as client:
+        tasks = [
+            asyncio.ensure_future(
+                _fetch_one(
+                    client, url, global_limit, host_limits, cache, crawl_delay, next_start, prefetched
+                )
+            )
+            for url in urls
+        ]
+        try:
+            for task in tasks if ordered else asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def run_sync(coro):
+    """
+    Run a coroutine to completion from synchronous code. When the calling thread
+    already has a running event loop (e.g. inside a notebook), the coroutine is run
+    on a separate thread so we don't try to nest loops.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    outcome = {}
+
+    def runner():
+        try:
+            outcome["result"] = asyncio.run(coro)
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=runner)
+    thread.start()
+    thread.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+
+def fetch_many(urls: Iterable[str], **kwargs) -> List[FetchResult]:
+    """
+    Synchronous wrapper around `fetch_all` for existing callers.
+    """
+    return run_sync(fetch_all(urls, **kwargs))
@@ -1,68 +1,295 @@
-import os.path
+"""
+Google Custom Search client.
+
+`GoogleSearch` reads its credentials once and can be imported without side
+effects. It fans many queries out concurrently over one async HTTP client,
+pages through the API's 10-results-per-request limit (up to its 100-result cap),
+counts requests against a per-day quota and keeps results in a TTL cache keyed
+by (query, num). `search_and_extract` sends the result links straight into the
+concurrent fetch -> extract pipeline.
+
+`google_search(query, num_results)` keeps its old signature and return shape,
+using a shared default client.
+"""
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
 from dotenv import load_dotenv
-import requests
-from scraper import extract_text_from_single_web_page
+
+import fetcher
+import http_client
+
 load_dotenv()
 
+SEARCH_URL = "https://www.googleapis.com/customsearch/v1"
+# The API returns at most 10 results per request and 100 per query.
+PAGE_SIZE = 10
+MAX_RESULTS = 100
+# Free tier; the quota resets at midnight Pacific time.
+DEFAULT_DAILY_QUOTA = 100
+QUOTA_TIMEZONE = "America/Los_Angeles"
+DEFAULT_CACHE_TTL = 24 * 3600
+MAX_CONCURRENCY = 10
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+@functools.lru_cache(maxsize=None)
+def quota_timezone():
+    """
+    Pacific time, or a fixed UTC-8 where no time zone database is installed
+    (Windows without the tzdata package).
+    """
+    try:
+        return ZoneInfo(QUOTA_TIMEZONE)
+    except ZoneInfoNotFoundError:
+        return timezone(timedelta(hours=-8))
+
+
+class QuotaTracker:
+    """
+    Counts API requests per (Pacific) day. With `path` the count is kept in a JSON
+    file so separate runs share the same budget.
+    """
+
+    def __init__(self, daily_limit=DEFAULT_DAILY_QUOTA, path=None):
+        self.daily_limit = daily_limit
+        self.path = path
+        self._lock = threading.Lock()
+        self._day, self._used = self._load()
+
+    @staticmethod
+    def today():
+        return datetime.now(quota_timezone()).date().isoformat()
+
+    def _load(self):
+        if self.path and os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+            return state["day"], state["used"]
+        return self.today(), 0
+
+    def _save(self):
+        if self.path:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump({"day": self._day, "used": self._used}, f)
+
+    def _roll_over(self):
+        today = self.today()
+        if today != self._day:
+            self._day, self._used = today, 0
+
+    @property
+    def remaining(self):
+        with self._lock:
+            self._roll_over()
+            return max(0, self.daily_limit - self._used)
+
+    def consume(self, requests=1):
+        """
+        Reserve `requests` API calls, or raise QuotaExceeded if that would go over today's limit.
+        """
+        with self._lock:
+            self._roll_over()
+            if self._used + requests > self.daily_limit:
+                raise QuotaExceeded(
+                    f"Daily search quota of {self.daily_limit} requests used up ({self._used} used)"
+                )
+            self._used += requests
+            self._save()
+
+
+class ResultCache:
+    """
+    In-memory search results keyed by (query, num), expiring after `ttl` seconds.
+    """
+
+    def __init__(self, ttl=DEFAULT_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, query, num):
+        with self._lock:
+            entry = self._entries.get((query, num))
+            if entry is None or entry[0] < time.time():
+                self._entries.pop((query, num), None)
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def put(self, query, num, results):
+        with self._lock:
+            self._entries[(query, num)] = (time.time() + self.ttl, results)
+
+
+def _page_starts(num_results):
+    """
+    `(start, num)` request parameters covering the first `num_results` results. The
+    API rejects requests with start + num > 100, so at most 99 results are reachable.
+    """
+    num_results = min(num_results, MAX_RESULTS)
+    pages = []
+    for start in range(1, num_results + 1, PAGE_SIZE):
+        num = min(PAGE_SIZE, num_results - start + 1, MAX_RESULTS - start)
+        if num > 0:
+            pages.append((start, num))
+    return pages
+
+
+class GoogleSearch:
+    def __init__(
+        self,
+        api_key=None,
+        engine_id=None,
+        cache_ttl=DEFAULT_CACHE_TTL,
+        daily_quota=None,
+        quota_path=None,
+        max_concurrency=MAX_CONCURRENCY,
+    ):
+        self.api_key = api_key or os.getenv("GOOGLE_SEARCH_API_KEY")
+        self.engine_id = engine_id or os.getenv("GOOGLE_SEARCH_ENGINE_ID")
+        self.cache = ResultCache(cache_ttl) if cache_ttl else None
+        self.quota = QuotaTracker(
+            daily_quota or int(os.getenv("GOOGLE_SEARCH_DAILY_QUOTA", DEFAULT_DAILY_QUOTA)),
+            quota_path or os.getenv("GOOGLE_SEARCH_QUOTA_PATH"),
+        )
+        self.max_concurrency = max_concurrency
+
+    async def _fetch_page(self, client, limit, query, start, num):
+        params = {"key": self.api_key, "cx": self.engine_id, "q": query, "num": num, "start": start}
+        async with limit:
+            self.quota.consume()
+            response = await http_client.aget(client, SEARCH_URL, params=params)
+        return response.json()
+
+    async def _search(self, client, limit, query, num_results):
+        if self.cache is not None:
+            cached = self.cache.get(query, num_results)
+            if cached is not None:
+                return cached
+        # Pages are requested one after the other: once a page comes back short the
+        # engine has no more results, and asking for the rest would only spend quota.
+        items, error = [], None
+        for start, num in _page_starts(num_results):
+            try:
+                page = await self._fetch_page(client, limit, query, start, num)
+            except QuotaExceeded as e:
+                # Only this query is cut short; the rest of a batch still gets its results.
+                error = str(e)
+                break
+            if "error" in page:
+                error = page["error"]["message"]
+                break
+            page_items = page.get("items", [])
+            items.extend(page_items)
+            if len(page_items) < num:
+                break
+        if error is not None and not items:
+            return ["No results found due to error: " + error]
+        if not items:
+            return ["No results found"]
+        results = [
+            {
+                "index": i,
+                "title": item.get("title", ""),
+                "link": item.get("link", ""),
+                "snippet": item.get("snippet", ""),
+            }
+            for i, item in enumerate(items[:num_results])
+        ]
+        # The pages fetched before an error are returned, but not cached as complete.
+        if self.cache is not None and error is None:
+            self.cache.put(query, num_results, results)
+        return results
+
+    async def asearch_many(self, queries, num_results=5):
+        """
+        Run every query concurrently and return `{query: results}`. Each results list
+        has the shape of `google_search`'s.
+        """
+        queries = list(dict.fromkeys(queries))
+        limit = asyncio.Semaphore(self.max_concurrency)
+        async with http_client.async_client() as client:
+            results = await asyncio.gather(
+                *(self._search(client, limit, query, num_results) for query in queries)
+            )
+        return dict(zip(queries, results))
+
+    async def asearch(self, query, num_results=5):
+        return (await self.asearch_many([query], num_results))[query]
+
+    def search_many(self, queries, num_results=5):
+        return fetcher.run_sync(self.asearch_many(queries, num_results))
+
+    def search(self, query, num_results=5):
+        return fetcher.run_sync(self.asearch(query, num_results))
+
+    def search_and_extract(self, queries, num_results=5, cache=None):
+        """
+        Search every query, then download and extract the text of all result links
+        concurrently (each link once, like `extract_text_from_single_web_page`).
+        Returns `{query: results}` with a "text" key added to each result.
+        """
+        import pipeline
+        import scraper
+
+        by_query = self.search_many(queries, num_results)
+        links = list(
+            dict.fromkeys(
+                result["link"]
+                for results in by_query.values()
+                for result in results
+                if isinstance(result, dict) and result["link"]
+            )
+        )
+
+        def extract(page):
+            return scraper.extract_downloaded_page(
+                page.url, page.content, page.status_code, cache=cache
+            ).text
+
+        texts = dict(pipeline.iter_pages(links, extract, cache=cache))
+        return {
+            query: [
+                {**result, "text": texts.get(result["link"], "")} if isinstance(result, dict) else result
+                for result in results
+            ]
+            for query, results in by_query.items()
+        }
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = GoogleSearch()
+        return _default_client
 
 
 def google_search(query, num_results=5):
+    return get_default_client().search(query, num_results)
+
 
-    search_engine_id = os.getenv("GOOGLE_SEARCH_ENGINE_ID")
-    api_key = os.getenv("GOOGLE_SEARCH_API_KEY")
-    print(search_engine_id)
-    url = "https://www.googleapis.com/customsearch/v1"
-    params = {"key": api_key, "cx": search_engine_id, "q": query, "num": num_results}
-
-    response = requests.get(url, params=params).json()
-    # print(query, response)
-    if "error" in response:
-        return ["No results found due to error: " + response["error"]["message"]]
-    if "items" not in response:
-        return ["No results found"]
-    returning_dict = [{} for i in response["items"]]
-    for i, item in enumerate(response["items"]):
-        returning_dict[i]["index"] = i
-        returning_dict[i]["title"] = item.get("title", "")
-        returning_dict[i]["link"] = item.get("link", "")
-        returning_dict[i]["snippet"] = item.get("snippet", "")
-        # returning_dict[i]["htmlFormattedUrl"] = item["htmlFormattedUrl"]
-
-    return returning_dict
-
-
-results = google_search("machine learning engineer job posting")
-
-for result in results: 
-    print(result["title"])
-    print(result["link"])
-    print(result["snippet"])
-    print("----")
-    title = result["title"]
-    link = result["link"]
-
-
-    # ##########################
-    # UNCOMMENT ONE OF THE FOLLOWING SECTIONS TO GET THE HTML OR TEXT:
-    # ##########################
-
-    # ##########################
-    # # SECTION 1: 
-    # # TO GRAB JUST THE HTML:
-    # # Using bs4, extract HTML from the link
-    # import requests
-    # from bs4 import BeautifulSoup
-    # response = requests.get(link)
-    # html = response.text
-    # soup = BeautifulSoup(html, "html.parser")
-    # # grab all emails from the page
-            
-    # print(soup)
-
-    # ##########################
-    # # SECTION 2:
-    # # TO GRAB JUST THE TEXT:
-    # raw_text = extract_text_from_single_web_page(link)
-   
-    # print(raw_text.strip())
+if __name__ == "__main__":
+    results = google_search("machine learning engineer job posting")
 
+    for result in results:
+        print(result["title"])
+        print(result["link"])
+        print(result["snippet"])
+        print("----")
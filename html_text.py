@@ -0,0 +1,192 @@
+"""
+Visible-text extraction from HTML with pluggable parser backends.
+
+Three extraction modes reproduce the BeautifulSoup code paths used elsewhere:
+
+* "fallback" - `scraper.beautifulsoup_extract_text_fallback`: every string whose
+  parent tag is not in `FALLBACK_BLACKLIST`.
+* "visible"  - `scraper.text_from_html`: every non-comment string whose parent tag
+  is not in `INVISIBLE_TAGS`.
+* "all"      - `soup.get_text(separator=" ", strip=True)` as used by the summarizer.
+
+The "lxml" and "selectolax" backends walk the tree once with C parsers instead of
+BeautifulSoup's pure-Python "html.parser", and build the output with a single
+join. "bs4" keeps the original behaviour. The default backend is lxml (a
+trafilatura dependency) when installed, or SCRAPER_HTML_BACKEND if set.
+selectolax is opt-in: it follows the HTML5 parsing rules, so its output differs
+from html.parser on some malformed pages. benchmarks/bench_html_text.py checks the
+backends against the BeautifulSoup output on saved fixtures. `parse` parses a
+page once for `extract_text` in several modes.
+"""
+import os
+
+from bs4 import BeautifulSoup, UnicodeDammit
+from bs4.element import CData, Comment, NavigableString
+
+FALLBACK_BLACKLIST = frozenset(
+    ["[document]", "noscript", "header", "html", "meta", "head", "input", "script", "style"]
+)
+INVISIBLE_TAGS = frozenset(["style", "script", "head", "title", "meta", "[document]"])
+# Strings inside these tags are not "text" for get_text() (bs4 string containers).
+NON_TEXT_CONTAINERS = frozenset(["script", "style", "template", "rt", "rp"])
+
+MODES = ("fallback", "visible", "all")
+
+try:
+    from lxml import etree as _etree
+    from lxml import html as _lxml_html
+except ImportError:  # pragma: no cover - lxml is a trafilatura dependency
+    _lxml_html = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as _SelectolaxParser
+except ImportError:
+    _SelectolaxParser = None
+
+
+def available_backends():
+    backends = []
+    if _lxml_html is not None:
+        backends.append("lxml")
+    if _SelectolaxParser is not None:
+        backends.append("selectolax")
+    backends.append("bs4")
+    return backends
+
+
+def default_backend():
+    return os.getenv("SCRAPER_HTML_BACKEND") or ("lxml" if _lxml_html is not None else "bs4")
+
+
+def _to_unicode(markup):
+    # Decode bytes the same way BeautifulSoup does, so every backend sees the same text.
+    if isinstance(markup, bytes):
+        return UnicodeDammit(markup, is_html=True).unicode_markup or ""
+    return markup or ""
+
+
+def _join(parts, mode):
+    if mode == "fallback":
+        return (" ".join(parts) + " ").replace("\t", "").strip()
+    if mode == "visible":
+        return " ".join(part.strip() for part in parts)
+    return " ".join(stripped for stripped in (part.strip() for part in parts) if stripped)
+
+
+def _keep(mode, parent, is_comment, in_container):
+    if mode == "fallback":
+        return parent not in FALLBACK_BLACKLIST
+    if mode == "visible":
+        return not is_comment and parent not in INVISIBLE_TAGS
+    return not is_comment and not in_container
+
+
+def _bs4_strings(soup, mode):
+    for string in soup.find_all(string=True):
+        parent = string.parent.name
+        if mode == "all":
+            if type(string) not in (NavigableString, CData):
+                continue
+            yield string
+        elif _keep(mode, parent, isinstance(string, Comment), False):
+            yield string
+
+
+def _lxml_parse(markup):
+    data = _to_unicode(markup).encode("utf-8")
+    if not data.strip():
+        return None
+    parser = _lxml_html.HTMLParser(encoding="utf-8")
+    return _lxml_html.document_fromstring(data, parser=parser)
+
+
+def _lxml_strings(root, mode):
+    if root is None:
+        return
+    containers = 0
+    events = ("start", "end", "comment", "pi")
+    for event, node in _etree.iterwalk(root, events=events):
+        parent = node.getparent()
+        parent_name = parent.tag if parent is not None else "[document]"
+        if event == "start":
+            if node.tag in NON_TEXT_CONTAINERS:
+                containers += 1
+            if node.text and _keep(mode, node.tag, False, containers > 0):
+                yield node.text
+            continue
+        if event == "end" and node.tag in NON_TEXT_CONTAINERS:
+            containers -= 1
+        elif event == "comment" and node.text and _keep(mode, parent_name, True, containers > 0):
+            yield node.text
+        if node.tail and _keep(mode, parent_name, False, containers > 0):
+            yield node.tail
+
+
+def _selectolax_parse(markup):
+    if _SelectolaxParser is None:
+        raise ImportError("The selectolax backend needs `pip install selectolax`")
+    return _SelectolaxParser(_to_unicode(markup))
+
+
+def _selectolax_strings(tree, mode):
+    if tree.root is None:
+        return
+    for node in tree.root.traverse(include_text=True):
+        if node.tag not in ("-text", "-comment"):
+            continue
+        is_comment = node.tag == "-comment"
+        parent = node.parent.tag if node.parent is not None else "-document"
+        parent = "[document]" if parent == "-document" else parent
+        in_container = False
+        if mode == "all":
+            ancestor = node.parent
+            while ancestor is not None and not in_container:
+                in_container = ancestor.tag in NON_TEXT_CONTAINERS
+                ancestor = ancestor.parent
+        if _keep(mode, parent, is_comment, in_container):
+            text = node.comment_content if is_comment else node.text_content
+            if text:
+                yield text
+
+
+_BACKENDS = {
+    "bs4": (lambda markup: BeautifulSoup(markup, "html.parser"), _bs4_strings),
+    "lxml": (_lxml_parse, _lxml_strings),
+    "selectolax": (_selectolax_parse, _selectolax_strings),
+}
+
+
+class ParsedHTML:
+    """
+    A document parsed once by `parse`, for `extract_text` in several modes.
+    """
+
+    def __init__(self, backend, tree):
+        self.backend = backend
+        self.tree = tree
+
+
+def parse(markup, backend=None):
+    """
+    Parse HTML (str or bytes, or an existing BeautifulSoup object) with a backend.
+    """
+    if isinstance(markup, ParsedHTML):
+        return markup
+    if isinstance(markup, BeautifulSoup):
+        return ParsedHTML("bs4", markup)
+    backend = backend or default_backend()
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown HTML backend {backend!r}, expected one of {available_backends()}")
+    return ParsedHTML(backend, _BACKENDS[backend][0](markup))
+
+
+def extract_text(markup, mode="visible", backend=None):
+    """
+    Extract text from HTML (str or bytes) using one of `MODES` and a parser backend.
+    `markup` may also be an existing BeautifulSoup object, or a `ParsedHTML` from
+    `parse` to extract several modes from one parse.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}, expected one of {MODES}")
+    document = parse(markup, backend)
+    return _join(list(_BACKENDS[document.backend][1](document.tree, mode)), mode)
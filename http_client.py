@@ -0,0 +1,230 @@
+"""
+Shared HTTP client used by every fetch path in the project.
+
+A single pooled `httpx.Client` is reused for synchronous calls so TCP/TLS
+connections are kept alive between requests. Every request has a timeout and is
+retried with jittered exponential backoff on transport errors and on
+429/5xx responses, honouring any Retry-After header the server sends.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from urllib.parse import urlparse
+
+import httpx
+
+import instrumentation
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/56.0.2924.76 Safari/537.36",
+    "Upgrade-Insecure-Requests": "1",
+    "DNT": "1",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+    "Accept-Encoding": "gzip, deflate",
+}
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Transport errors worth retrying; e.g. an unsupported URL scheme will never succeed.
+RETRY_EXCEPTIONS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+# Everything a fetch of an arbitrary URL can raise: transport and HTTP errors, and
+# malformed URLs (httpx.InvalidURL, or ValueError from urllib's parsing, e.g. "Invalid IPv6 URL").
+REQUEST_ERRORS = (httpx.HTTPError, httpx.InvalidURL, ValueError)
+
+
+@dataclass
+class HttpConfig:
+    connect_timeout: float = float(os.getenv("SCRAPER_HTTP_CONNECT_TIMEOUT", 10))
+    read_timeout: float = float(os.getenv("SCRAPER_HTTP_READ_TIMEOUT", 20))
+    retries: int = int(os.getenv("SCRAPER_HTTP_RETRIES", 3))
+    backoff_base: float = 0.5
+    backoff_max: float = 30.0
+    # Never sleep longer than this for a single Retry-After, whatever the server asks for.
+    retry_after_max: float = 120.0
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    headers: dict = field(default_factory=lambda: dict(DEFAULT_HEADERS))
+
+    @property
+    def timeout(self):
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+    @property
+    def limits(self):
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+        )
+
+
+config = HttpConfig()
+
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+
+# Per-host "do not send before" timestamps, set when a host asks us to back off.
+_host_backoff = {}
+_host_backoff_lock = threading.Lock()
+
+
+def configure(**kwargs):
+    """
+    Update the shared client settings, e.g. `configure(retries=5, read_timeout=60)`.
+    The pooled client is rebuilt on its next use.
+    """
+    for key, value in kwargs.items():
+        if not hasattr(config, key):
+            raise TypeError(f"Unknown HTTP setting: {key}")
+        setattr(config, key, value)
+    close()
+
+
+def get_client() -> httpx.Client:
+    """
+    Return the process-wide pooled client, creating it on first use.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(
+                    headers=config.headers,
+                    timeout=config.timeout,
+                    limits=config.limits,
+                    follow_redirects=True,
+                )
+    return _client
+
+
+def async_client() -> httpx.AsyncClient:
+    """
+    Create a pooled async client with the shared settings. Async clients are tied to
+    the event loop that uses them, so callers own this one and should close it
+    (`async with http_client.async_client() as client: ...`).
+    """
+    return httpx.AsyncClient(
+        headers=config.headers,
+        timeout=config.timeout,
+        limits=config.limits,
+        follow_redirects=True,
+    )
+
+
+def close():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def parse_retry_after(value):
+    """
+    Return the number of seconds asked for by a Retry-After header, or None.
+    The header is either a number of seconds or an HTTP date.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, response=None):
+    """
+    Seconds to wait before retry number `attempt` (starting at 0). A Retry-After
+    header wins; otherwise use exponential backoff with full jitter.
+    """
+    if response is not None:
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is not None:
+            return min(retry_after, config.retry_after_max)
+    return random.uniform(0, min(config.backoff_max, config.backoff_base * 2**attempt))
+
+
+def _host(url):
+    return urlparse(str(url)).netloc
+
+
+def _host_wait(url):
+    with _host_backoff_lock:
+        until = _host_backoff.get(_host(url), 0)
+    return max(0.0, until - time.monotonic())
+
+
+def _set_host_backoff(url, delay):
+    host = _host(url)
+    with _host_backoff_lock:
+        _host_backoff[host] = max(_host_backoff.get(host, 0), time.monotonic() + delay)
+
+
+def _should_retry(response):
+    return response.status_code in RETRY_STATUS_CODES
+
+
+def get(url, retries=None, **kwargs) -> httpx.Response:
+    """
+    GET `url` through the shared client. Transport errors are re-raised once the
+    retries are used up; for HTTP error statuses the last response is returned, so
+    callers decide whether to `raise_for_status()`.
+    """
+    retries = config.retries if retries is None else retries
+    client = get_client()
+    for attempt in range(retries + 1):
+        wait = _host_wait(url)
+        if wait:
+            time.sleep(wait)
+        try:
+            response = client.get(url, **kwargs)
+        except RETRY_EXCEPTIONS:
+            if attempt == retries:
+                raise
+            instrumentation.count("http_retries")
+            time.sleep(backoff_delay(attempt))
+            continue
+        instrumentation.count("bytes_fetched", len(response.content))
+        if not _should_retry(response) or attempt == retries:
+            return response
+        instrumentation.count("http_retries")
+        delay = backoff_delay(attempt, response)
+        _set_host_backoff(url, delay)
+        time.sleep(delay)
+    return response
+
+
+async def aget(client: httpx.AsyncClient, url, retries=None, **kwargs) -> httpx.Response:
+    """
+    Async counterpart of `get`, using a client from `async_client()`.
+    """
+    retries = config.retries if retries is None else retries
+    for attempt in range(retries + 1):
+        wait = _host_wait(url)
+        if wait:
+            await asyncio.sleep(wait)
+        try:
+            response = await client.get(url, **kwargs)
+        except RETRY_EXCEPTIONS:
+            if attempt == retries:
+                raise
+            instrumentation.count("http_retries")
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+        instrumentation.count("bytes_fetched", len(response.content))
+        if not _should_retry(response) or attempt == retries:
+            return response
+        instrumentation.count("http_retries")
+        delay = backoff_delay(attempt, response)
+        _set_host_backoff(url, delay)
+        await asyncio.sleep(delay)
+    return response
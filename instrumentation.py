@@ -0,0 +1,256 @@
+"""
+Timers, counters and tracing hooks for the scraping and summarizing pipeline.
+
+The hot paths call the module-level `span`, `count` and `dump` functions. By
+default they go to a no-op `Instrumentation` whose `span` returns one shared,
+do-nothing context manager, so instrumented code costs a function call when
+metrics are off. `enable()` installs a recording `Metrics` instead:
+
+    metrics = instrumentation.enable()
+    summarizer.scrape("https://example.com")
+    print(metrics.to_prometheus())  # or metrics.to_json()
+
+Spans used by the pipeline: "fetch", "extract" (page text),
+"extract_structured" (`structured.extract`), "tokenize" and "summarize"
+(labelled step="map", "reduce", "stuff", "refine" or "report"). Counters:
+"bytes_fetched", "http_retries", "page_cache_hits", "page_cache_revalidated",
+"extract_cache_hits", "tokens", "llm_prompt_tokens", "llm_cache_hits",
+"llm_cache_misses" and "llm_retries". `Metrics(on_span=...)` also passes every
+finished span to a callback, e.g. to forward it to a tracer.
+
+`dump` prints page text and summaries only when verbose output is on
+(SCRAPER_VERBOSE=1 or `set_verbose(True)`).
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+PREFIX = "scraper"
+# Latency samples kept per span for the quantiles; sums and counts stay exact.
+MAX_SAMPLES = 10000
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Instrumentation:
+    """
+    The default: records nothing.
+    """
+
+    def span(self, name, **labels):
+        return _NULL_SPAN
+
+    def count(self, name, value=1, **labels):
+        pass
+
+
+class Span:
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.start = None
+        self.duration = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        self.duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.labels = {**self.labels, "error": exc_type.__name__}
+        self.metrics._finish(self)
+        return False
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _quantile(ordered, fraction):
+    return ordered[max(0, min(len(ordered) - 1, int(round(fraction * len(ordered))) - 1))]
+
+
+class Metrics(Instrumentation):
+    """
+    Records span durations and counters, keyed by name and labels.
+    """
+
+    def __init__(self, on_span=None):
+        self.on_span = on_span
+        self.counters = {}
+        self.spans = {}
+        self._lock = threading.Lock()
+
+    def span(self, name, **labels):
+        return Span(self, name, labels)
+
+    def count(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def _finish(self, span):
+        key = _key(span.name, span.labels)
+        with self._lock:
+            stats = self.spans.get(key)
+            if stats is None:
+                stats = self.spans[key] = {"count": 0, "sum": 0.0, "samples": deque(maxlen=MAX_SAMPLES)}
+            stats["count"] += 1
+            stats["sum"] += span.duration
+            stats["samples"].append(span.duration)
+        if self.on_span is not None:
+            self.on_span(span)
+
+    def samples(self, name):
+        """
+        All recorded durations of the spans called `name`, whatever their labels.
+        """
+        with self._lock:
+            return [s for (span_name, _), stats in self.spans.items() if span_name == name for s in stats["samples"]]
+
+    def counter(self, name):
+        """
+        Total of the counter `name` over all its labels.
+        """
+        with self._lock:
+            return sum(value for (counter_name, _), value in self.counters.items() if counter_name == name)
+
+    def to_json(self):
+        with self._lock:
+            spans = []
+            for (name, labels), stats in sorted(self.spans.items()):
+                ordered = sorted(stats["samples"])
+                spans.append(
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": stats["count"],
+                        "sum_seconds": stats["sum"],
+                        "p50_seconds": _quantile(ordered, 0.5),
+                        "p95_seconds": _quantile(ordered, 0.95),
+                        "max_seconds": ordered[-1],
+                    }
+                )
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+        return {"spans": spans, "counters": counters}
+
+    def to_prometheus(self):
+        """
+        Metrics in the Prometheus text exposition format: counters as `_total`
+        counters, spans as `_seconds` summaries.
+        """
+
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        lines = []
+        data = self.to_json()
+        typed = set()
+        for counter in data["counters"]:
+            metric = f"{PREFIX}_{counter['name']}_total"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{label_text(counter['labels'].items())} {counter['value']}")
+        for span in data["spans"]:
+            metric = f"{PREFIX}_{span['name']}_seconds"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} summary")
+            labels = span["labels"].items()
+            for quantile in ("0.5", "0.95"):
+                value = span["p50_seconds"] if quantile == "0.5" else span["p95_seconds"]
+                lines.append(f"{metric}{label_text(labels, [('quantile', quantile)])} {value:.6f}")
+            lines.append(f"{metric}_sum{label_text(labels)} {span['sum_seconds']:.6f}")
+            lines.append(f"{metric}_count{label_text(labels)} {span['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """
+        Write the metrics to `path`: Prometheus text for .prom/.txt files, JSON otherwise.
+        """
+        with open(path, "w") as f:
+            if path.endswith((".prom", ".txt")):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_json(), f, indent=2)
+
+
+_current = Instrumentation()
+_verbose = os.getenv("SCRAPER_VERBOSE", "").lower() in ("1", "true", "yes")
+
+
+def get():
+    return _current
+
+
+def set_instrumentation(instrumentation):
+    """
+    Install `instrumentation` for the whole process (None restores the no-op default).
+    Returns the previous one.
+    """
+    global _current
+    previous = _current
+    _current = instrumentation or Instrumentation()
+    return previous
+
+
+def enable(on_span=None):
+    """
+    Start recording into a new `Metrics` and return it.
+    """
+    metrics = Metrics(on_span=on_span)
+    set_instrumentation(metrics)
+    return metrics
+
+
+def disable():
+    set_instrumentation(None)
+
+
+def span(name, **labels):
+    return _current.span(name, **labels)
+
+
+def count(name, value=1, **labels):
+    _current.count(name, value, **labels)
+
+
+def set_verbose(verbose=True):
+    global _verbose
+    _verbose = verbose
+
+
+def is_verbose():
+    return _verbose
+
+
+def dump(label, content=""):
+    """
+    Print `content` (page text, summaries...) only when verbose output is on.
+    """
+    if _verbose:
+        print(label, content)
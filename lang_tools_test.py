@@ -1,33 +1,43 @@
-from langchain_community.tools import WikipediaQueryRun
-from langchain_community.utilities import WikipediaAPIWrapper
-from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_community.tools import DuckDuckGoSearchRun
-from langchain_core.pydantic_v1 import BaseModel, Field, validator
-from langchain.chains.summarize import load_summarize_chain
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from functools import lru_cache
 from typing import List, Literal
-import tiktoken
 from dotenv import load_dotenv
 
+import summarize_engine
+import tokens
+
 load_dotenv()
 import os
 
 openai_api_key = os.environ.get("OPENAI_API_KEY")
 
 
-# completion llm
-llm = ChatOpenAI(
-    openai_api_key=openai_api_key,
-    model_name="gpt-3.5-turbo",
-    temperature=0.1,
-    max_tokens=500,
-)
+# completion llm, built on first use (importing this module needs no API key)
+@lru_cache(maxsize=None)
+def get_llm():
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        openai_api_key=openai_api_key,
+        model_name="gpt-3.5-turbo",
+        temperature=0.1,
+        max_tokens=500,
+    )
+
+
+def __getattr__(name):
+    # Keeps `lang_tools_test.llm` working for existing callers.
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def summarize_text(
     text: str, chain_type: Literal["stuff", "refine", "map_reduce"]
 ) -> str:
+    from langchain.chains.summarize import load_summarize_chain
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from langchain_core.prompts import PromptTemplate
+
     if text == "" or len(text) < 30:
         return "No text to summarize"
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=5000, chunk_overlap=50)
@@ -59,17 +69,19 @@ def summarize_text(
 
     print("MAP PROMPT TEMPLATE", map_prompt_template)
     if chain_type == "map_reduce":
-        summary_chain = load_summarize_chain(
-            llm=llm,
-            chain_type=chain_type,
-            verbose=True,
-            map_prompt=map_prompt_template,
-            combine_prompt=combine_prompt_template,
+        # Parallel map with rate limiting and a tree-shaped reduce
+        engine = summarize_engine.SummarizeEngine(get_llm())
+        summary = engine.map_reduce(
+            [chunk.page_content for chunk in chunks],
+            map_prompt_template,
+            combine_prompt_template,
         )
+        print(summary)
+        return summary
     else:
         # STUFF OR REFINE METHOD
         summary_chain = load_summarize_chain(
-            llm=llm, chain_type=chain_type, verbose=True
+            llm=get_llm(), chain_type=chain_type, verbose=True
         )
 
     print(f"summary_chain using {chain_type}")
@@ -80,6 +92,9 @@ def summarize_text(
 
 # # WIKIPEDIA API WRAPPER
 def wikipedia_lookup(query, top_k_result=1, doc_content_chars_max=1000):
+    from langchain_community.tools import WikipediaQueryRun
+    from langchain_community.utilities import WikipediaAPIWrapper
+
     api_wrapper = WikipediaAPIWrapper(
         top_k_result=top_k_result, doc_content_chars_max=doc_content_chars_max
     )
@@ -96,6 +111,8 @@ def wikipedia_lookup(query, top_k_result=1, doc_content_chars_max=1000):
 
 # # DUCKDUCKGO API WRAPPER
 def duckduckgo_lookup(query):
+    from langchain_community.tools import DuckDuckGoSearchRun
+
     search = DuckDuckGoSearchRun()
     output = search.invoke(query)
     print(output)
@@ -103,6 +120,4 @@ def duckduckgo_lookup(query):
 
 
 def num_tokens_from_string(string: str, encoding_name: str = "cl100k_base") -> int:
-    encoding = tiktoken.get_encoding(encoding_name)
-    num_tokens = len(encoding.encode(string))
-    return num_tokens
+    return tokens.count_tokens(string, encoding_name)
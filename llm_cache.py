@@ -0,0 +1,163 @@
+"""
+Persistent memo cache for LLM calls.
+
+Results are stored in SQLite under a hash of the input text, the prompt template,
+the model name and the temperature, so a chunk that was already summarized with
+the same settings is never paid for twice. Entries are evicted least-recently-used
+first once the cache grows past `max_bytes`.
+
+Pass an `LLMCache` to `summarizer.Summarize`, or set SCRAPER_LLM_CACHE_PATH to
+give it a default one.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import instrumentation
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at);
+CREATE INDEX IF NOT EXISTS results_lru ON results (accessed_at, size);
+CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO totals SELECT 'bytes', COALESCE(SUM(size), 0) FROM results;
+CREATE TRIGGER IF NOT EXISTS results_bytes_insert AFTER INSERT ON results BEGIN
+    UPDATE totals SET value = value + NEW.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS results_bytes_update AFTER UPDATE OF size ON results BEGIN
+    UPDATE totals SET value = value + NEW.size - OLD.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS results_bytes_delete AFTER DELETE ON results BEGIN
+    UPDATE totals SET value = value - OLD.size WHERE name = 'bytes';
+END;
+"""
+
+
+def cache_key(text, template, model_name, temperature):
+    payload = json.dumps([text, template, model_name, temperature])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def llm_settings(llm):
+    """
+    Return the `(model_name, temperature)` pair of a chat model, for use in cache keys.
+    """
+    model_name = getattr(llm, "model_name", None) or getattr(llm, "model", None)
+    return str(model_name), getattr(llm, "temperature", None)
+
+
+class LLMCache:
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE results SET accessed_at = ? WHERE key = ?", (time.time(), key)
+                )
+                self._conn.commit()
+        self.stats["hits" if row else "misses"] += 1
+        instrumentation.count("llm_cache_hits" if row else "llm_cache_misses")
+        return row[0] if row else None
+
+    def put(self, key, value):
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO results VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET"
+                " value = excluded.value, accessed_at = excluded.accessed_at,"
+                " size = excluded.size",
+                (key, value, time.time(), size),
+            )
+            self._conn.commit()
+        if self.total_bytes() > self.max_bytes:
+            self._evict()
+
+    def memoize(self, text, template, model_name, temperature, compute):
+        """
+        Return the cached string result for these inputs, calling `compute()` and
+        storing its result on a miss.
+        """
+        key = cache_key(text, template, model_name, temperature)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def memoize_json(self, text, template, model_name, temperature, compute):
+        """
+        Like `memoize`, for results that are JSON-serializable objects.
+        """
+        value = self.memoize(
+            text, template, model_name, temperature, lambda: json.dumps(compute())
+        )
+        return json.loads(value)
+
+    def total_bytes(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT value FROM totals WHERE name = 'bytes'"
+            ).fetchone()[0]
+
+    def _evict(self):
+        with self._lock:
+            total = self._conn.execute(
+                "SELECT value FROM totals WHERE name = 'bytes'"
+            ).fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT rowid, size FROM results INDEXED BY results_lru ORDER BY accessed_at ASC"
+            )
+            doomed = []
+            for rowid, size in rows:
+                if total <= self.max_bytes:
+                    break
+                doomed.append((rowid,))
+                total -= size
+            rows.close()
+            self._conn.executemany("DELETE FROM results WHERE rowid = ?", doomed)
+            self.stats["evictions"] += len(doomed)
+            self._conn.commit()
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """
+    Return the cache configured through SCRAPER_LLM_CACHE_PATH, or None when caching is off.
+    """
+    global _default_cache
+    path = os.getenv("SCRAPER_LLM_CACHE_PATH")
+    if not path:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache(
+                path,
+                max_bytes=int(os.getenv("SCRAPER_LLM_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+            )
+    return _default_cache
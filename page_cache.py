@@ -0,0 +1,346 @@
+"""
+Persistent on-disk cache for downloaded pages and the text extracted from them.
+
+Pages are stored in SQLite keyed by normalized URL together with their ETag and
+Last-Modified headers. Within the TTL a cached page is served without touching the
+network; after that it is revalidated with If-None-Match/If-Modified-Since and a
+304 refreshes the entry. Extracted text is stored by content hash and extractor
+name, so a page whose bytes did not change is never parsed twice. The cache is
+trimmed least-recently-used first once it grows past `max_bytes`.
+
+Caching is opt-in: pass a `PageCache` to the fetch functions, or set
+SCRAPER_CACHE_PATH to give them a default one.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+
+import http_client
+import instrumentation
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    content BLOB NOT NULL,
+    content_hash TEXT NOT NULL,
+    content_type TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at);
+CREATE INDEX IF NOT EXISTS pages_lru ON pages (accessed_at, size);
+CREATE INDEX IF NOT EXISTS pages_content_hash ON pages (content_hash);
+CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO totals SELECT 'bytes', COALESCE(SUM(size), 0) FROM pages;
+CREATE TRIGGER IF NOT EXISTS pages_bytes_insert AFTER INSERT ON pages BEGIN
+    UPDATE totals SET value = value + NEW.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS pages_bytes_update AFTER UPDATE OF size ON pages BEGIN
+    UPDATE totals SET value = value + NEW.size - OLD.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS pages_bytes_delete AFTER DELETE ON pages BEGIN
+    UPDATE totals SET value = value - OLD.size WHERE name = 'bytes';
+END;
+CREATE TABLE IF NOT EXISTS texts (
+    content_hash TEXT NOT NULL,
+    extractor TEXT NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (content_hash, extractor)
+);
+"""
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url):
+    """
+    Normalize a URL for use as a cache key: lowercase scheme and host, drop the
+    default port and the fragment, sort the query string and use "/" for an empty path.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+class PageCache:
+    def __init__(self, path, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "revalidated": 0,
+            "text_hits": 0,
+            "text_misses": 0,
+            "evictions": 0,
+        }
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def lookup(self, url):
+        """
+        Return the cached entry for `url` as a dict, or None.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT url, status_code, content, content_hash, content_type, etag,"
+                " last_modified, fetched_at FROM pages WHERE key = ?",
+                (normalize_url(url),),
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        keys = ("url", "status_code", "content", "content_hash", "content_type")
+        keys += ("etag", "last_modified", "fetched_at")
+        return dict(zip(keys, row))
+
+    def is_fresh(self, entry):
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url, response):
+        """
+        Cache a successful response. Anything other than a 200 is ignored.
+        """
+        if response.status_code != 200:
+            return
+        content = response.content
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                # An upsert rather than INSERT OR REPLACE, so the update trigger keeps
+                # the byte total right when a page is overwritten.
+                "INSERT INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET url = excluded.url,"
+                " status_code = excluded.status_code, content = excluded.content,"
+                " content_hash = excluded.content_hash, content_type = excluded.content_type,"
+                " etag = excluded.etag, last_modified = excluded.last_modified,"
+                " fetched_at = excluded.fetched_at, accessed_at = excluded.accessed_at,"
+                " size = excluded.size",
+                (
+                    normalize_url(url),
+                    str(response.url),
+                    response.status_code,
+                    content,
+                    content_hash(content),
+                    response.headers.get("Content-Type"),
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    now,
+                    now,
+                    len(content),
+                ),
+            )
+            self._conn.commit()
+        if self.total_bytes() > self.max_bytes:
+            self._evict()
+
+    def touch(self, url, revalidated=False):
+        now = time.time()
+        with self._lock:
+            if revalidated:
+                self._conn.execute(
+                    "UPDATE pages SET accessed_at = ?, fetched_at = ? WHERE key = ?",
+                    (now, now, normalize_url(url)),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE pages SET accessed_at = ? WHERE key = ?",
+                    (now, normalize_url(url)),
+                )
+            self._conn.commit()
+
+    def get_text(self, digest, extractor):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM texts WHERE content_hash = ? AND extractor = ?",
+                (digest, extractor),
+            ).fetchone()
+        self.stats["text_hits" if row else "text_misses"] += 1
+        return row[0] if row else None
+
+    def put_text(self, digest, extractor, text):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO texts VALUES (?, ?, ?)", (digest, extractor, text)
+            )
+            self._conn.commit()
+
+    def total_bytes(self):
+        """
+        Return the summed size of all cached pages. The total is kept up to date by
+        triggers, so this never has to scan the page blobs.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT value FROM totals WHERE name = 'bytes'"
+            ).fetchone()[0]
+
+    def _evict(self):
+        with self._lock:
+            total = self._conn.execute(
+                "SELECT value FROM totals WHERE name = 'bytes'"
+            ).fetchone()[0]
+            # Served from the (accessed_at, size) index, without reading any content.
+            rows = self._conn.execute(
+                "SELECT rowid, size FROM pages INDEXED BY pages_lru ORDER BY accessed_at ASC"
+            )
+            doomed = []
+            for rowid, size in rows:
+                if total <= self.max_bytes:
+                    break
+                doomed.append((rowid,))
+                total -= size
+            rows.close()
+            self._conn.executemany("DELETE FROM pages WHERE rowid = ?", doomed)
+            self.stats["evictions"] += len(doomed)
+            self._conn.execute(
+                "DELETE FROM texts WHERE content_hash NOT IN (SELECT content_hash FROM pages)"
+            )
+            self._conn.commit()
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """
+    Return the cache configured through SCRAPER_CACHE_PATH, or None when caching is off.
+    """
+    global _default_cache
+    path = os.getenv("SCRAPER_CACHE_PATH")
+    if not path:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PageCache(
+                path,
+                ttl=float(os.getenv("SCRAPER_CACHE_TTL", DEFAULT_TTL)),
+                max_bytes=int(os.getenv("SCRAPER_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+            )
+    return _default_cache
+
+
+def _response_from_entry(entry):
+    headers = {}
+    if entry["content_type"]:
+        headers["Content-Type"] = entry["content_type"]
+    return httpx.Response(
+        entry["status_code"],
+        content=entry["content"],
+        headers=headers,
+        request=httpx.Request("GET", entry["url"]),
+    )
+
+
+def _before_fetch(cache, url):
+    """
+    Return `(cached_response, entry, request_headers)`. A cached response means the
+    entry is fresh and no request is needed.
+    """
+    entry = cache.lookup(url)
+    if entry is None:
+        cache.stats["misses"] += 1
+        return None, None, {}
+    if cache.is_fresh(entry):
+        cache.stats["hits"] += 1
+        instrumentation.count("page_cache_hits")
+        cache.touch(url)
+        return _response_from_entry(entry), entry, {}
+    return None, entry, cache.conditional_headers(entry)
+
+
+def _after_fetch(cache, url, entry, response):
+    if response.status_code == 304 and entry is not None:
+        cache.stats["revalidated"] += 1
+        instrumentation.count("page_cache_revalidated")
+        cache.touch(url, revalidated=True)
+        return _response_from_entry(entry)
+    if entry is not None:
+        # The stored copy was stale and has changed.
+        cache.stats["misses"] += 1
+    cache.store(url, response)
+    return response
+
+
+def fetch(url, cache=None, **kwargs) -> httpx.Response:
+    """
+    GET `url` through `http_client`, serving and revalidating from `cache` when given.
+    """
+    cache = cache or get_default_cache()
+    with instrumentation.span("fetch"):
+        if cache is None:
+            return http_client.get(url, **kwargs)
+        cached, entry, headers = _before_fetch(cache, url)
+        if cached is not None:
+            return cached
+        response = http_client.get(url, headers=headers, **kwargs)
+        return _after_fetch(cache, url, entry, response)
+
+
+async def afetch(client, url, cache=None, **kwargs) -> httpx.Response:
+    """
+    Async counterpart of `fetch`, using a client from `http_client.async_client()`.
+    """
+    cache = cache or get_default_cache()
+    with instrumentation.span("fetch"):
+        if cache is None:
+            return await http_client.aget(client, url, **kwargs)
+        cached, entry, headers = _before_fetch(cache, url)
+        if cached is not None:
+            return cached
+        response = await http_client.aget(client, url, headers=headers, **kwargs)
+        return _after_fetch(cache, url, entry, response)
+
+
+def cached_extract(content, extractor, extract, cache=None, span="extract"):
+    """
+    Return `extract(content)`, reusing text previously extracted from identical bytes
+    by the extractor named `extractor`. Timed as the instrumentation span `span`.
+    """
+    cache = cache or get_default_cache()
+    with instrumentation.span(span, extractor=extractor):
+        if cache is None or not content:
+            return extract(content)
+        digest = content_hash(content)
+        text = cache.get_text(digest, extractor)
+        if text is None:
+            text = extract(content)
+            cache.put_text(digest, extractor, text)
+        else:
+            instrumentation.count("extract_cache_hits")
+        return text
@@ -0,0 +1,121 @@
+"""
+Streaming crawl -> extract pipeline.
+
+Instead of downloading every page and building one big string before any further
+work starts, pages are yielded as `(url, text)` as soon as each one has been
+downloaded and extracted, while the remaining downloads carry on in the
+background. `aiter_pages` is the async iterator; `iter_pages` wraps it in a plain
+generator for synchronous callers.
+"""
+import asyncio
+import collections
+import queue
+import threading
+from typing import AsyncIterator, Callable, Iterable, Iterator, Tuple
+
+import fetcher
+
+# Pages being extracted at once by `aiter_pages` while more are downloaded.
+MAX_IN_FLIGHT = 8
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+async def aiter_pages(
+    urls: Iterable[str],
+    extract: Callable[[fetcher.FetchResult], str],
+    ordered: bool = False,
+    max_in_flight: int = MAX_IN_FLIGHT,
+    **fetch_kwargs,
+) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Yield `(url, text)` for every URL as it finishes. `extract` turns a
+    `fetcher.FetchResult` into text and runs on a worker thread, so extraction of one
+    page overlaps with the download of the others. Up to `max_in_flight` pages are
+    extracted at once, which is what keeps an `extract_pool.ExtractionPool` busy.
+    """
+    loop = asyncio.get_running_loop()
+    # (url, future) in the order the downloads finished.
+    pending = collections.deque()
+
+    async def finished(block):
+        if block:
+            waiting = [pending[0][1]] if ordered else [future for _, future in pending]
+            await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+        if ordered:
+            done = []
+            while pending and pending[0][1].done():
+                done.append(pending.popleft())
+            return done
+        done = [item for item in pending if item[1].done()]
+        for item in done:
+            pending.remove(item)
+        return done
+
+    try:
+        async for page in fetcher.fetch_iter(urls, ordered=ordered, **fetch_kwargs):
+            pending.append((page.url, loop.run_in_executor(None, extract, page)))
+            for url, future in await finished(block=len(pending) >= max_in_flight):
+                yield url, future.result()
+        while pending:
+            for url, future in await finished(block=True):
+                yield url, future.result()
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+def iter_pages(
+    urls: Iterable[str],
+    extract: Callable[[fetcher.FetchResult], str],
+    ordered: bool = False,
+    buffer: int = 8,
+    **fetch_kwargs,
+) -> Iterator[Tuple[str, str]]:
+    """
+    Synchronous generator over `aiter_pages`. The event loop runs on a background
+    thread and at most `buffer` extracted pages wait for the consumer; closing the
+    generator early stops the remaining downloads.
+    """
+    items = queue.Queue(maxsize=buffer)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    async def produce():
+        loop = asyncio.get_running_loop()
+        try:
+            async for item in aiter_pages(urls, extract, ordered=ordered, **fetch_kwargs):
+                if not await loop.run_in_executor(None, put, item):
+                    return
+        except Exception as e:
+            await loop.run_in_executor(None, put, _Failure(e))
+            return
+        await loop.run_in_executor(None, put, _DONE)
+
+    thread = threading.Thread(target=lambda: asyncio.run(produce()), daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
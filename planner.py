@@ -0,0 +1,269 @@
+"""
+Choose how to summarize a site from its size and the models' prices and speeds.
+
+A site's text can reach the final `WebsiteSummary` prompt in four ways:
+
+* "direct": the raw text goes into the final prompt, one call;
+* "stuff": one summarization call over all the text, then the final prompt;
+* "map_reduce": the chunks are summarized in parallel and the summaries combined
+  as a tree (`summarize_engine.SummarizeEngine`), then the final prompt;
+* "refine": the chunks are summarized one after the other, each call refining the
+  summary so far, then the final prompt.
+
+`plan` predicts the calls, tokens, latency and cost of each strategy whose prompts
+fit the models' context windows (and `MAX_PROMPT_TOKENS`), and picks the cheapest
+one predicted to finish within `max_seconds`, or the fastest if none is.
+Summarization steps can use a cheaper model than the final prompt
+(SCRAPER_MAP_MODEL). `Plan.record` logs the prediction next to what was measured.
+
+Prices and speeds in `MODELS` are rough list prices and typical throughput;
+adjust them for your account.
+"""
+import logging
+import math
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional
+
+import instrumentation
+import tokens
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ("direct", "stuff", "map_reduce", "refine")
+
+# Largest prompt sent in one call, even to models with a larger context window:
+# summaries of very long prompts lose detail from the middle of the text.
+MAX_PROMPT_TOKENS = 32000
+# Predicted seconds a site may take before faster, dearer strategies are preferred.
+MAX_SECONDS = 60.0
+
+# Prompt template overheads and typical output sizes, in tokens.
+SUMMARY_PROMPT_TOKENS = 50
+REPORT_PROMPT_TOKENS = 300
+MAP_OUTPUT_TOKENS = 250
+SUMMARY_OUTPUT_TOKENS = 500
+REPORT_OUTPUT_TOKENS = 600
+
+
+@dataclass
+class ModelProfile:
+    name: str
+    context_tokens: int = 128000
+    # Dollars per million prompt and output tokens.
+    input_cost: float = 2.50
+    output_cost: float = 10.00
+    # Fixed overhead per call, and prompt and output throughput.
+    call_seconds: float = 0.5
+    input_tokens_per_second: float = 5000.0
+    output_tokens_per_second: float = 80.0
+
+    def seconds(self, prompt_tokens, output_tokens):
+        return (
+            self.call_seconds
+            + prompt_tokens / self.input_tokens_per_second
+            + output_tokens / self.output_tokens_per_second
+        )
+
+    def cost(self, prompt_tokens, output_tokens):
+        return (prompt_tokens * self.input_cost + output_tokens * self.output_cost) / 1e6
+
+    def max_prompt_tokens(self, output_tokens):
+        return min(self.context_tokens - output_tokens, MAX_PROMPT_TOKENS)
+
+
+MODELS = {
+    "gpt-4o": ModelProfile("gpt-4o"),
+    "gpt-4o-mini": ModelProfile(
+        "gpt-4o-mini", input_cost=0.15, output_cost=0.60, call_seconds=0.4, output_tokens_per_second=110.0
+    ),
+    "gpt-4-turbo": ModelProfile(
+        "gpt-4-turbo", input_cost=10.00, output_cost=30.00, output_tokens_per_second=35.0
+    ),
+    "gpt-3.5-turbo": ModelProfile(
+        "gpt-3.5-turbo", context_tokens=16385, input_cost=0.50, output_cost=1.50, output_tokens_per_second=100.0
+    ),
+}
+
+
+def profile(model_name):
+    """
+    The `ModelProfile` of a model; unknown models are assumed to be like gpt-4o.
+    """
+    return MODELS.get(model_name) or replace(MODELS["gpt-4o"], name=model_name)
+
+
+def chunk_sizes(input_tokens, chunk_tokens=tokens.CHUNK_TOKENS, overlap=tokens.CHUNK_OVERLAP_TOKENS):
+    """
+    Token counts of the chunks `tokens.split_by_tokens` would cut `input_tokens` into.
+    """
+    return [len(chunk) for chunk in tokens.chunk_token_ids(range(input_tokens), chunk_tokens, overlap)]
+
+
+@dataclass
+class Estimate:
+    calls: int = 0
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    seconds: float = 0.0
+    cost: float = 0.0
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "seconds": round(self.seconds, 2),
+            "cost": round(self.cost, 5),
+        }
+
+
+def estimate(rounds, max_workers):
+    """
+    Predict a strategy from its rounds of calls: a round is a list of
+    `(model, prompt_tokens, output_tokens)` run in parallel, `max_workers` at a time,
+    and each round waits for the one before.
+    """
+    total = Estimate()
+    for calls in rounds:
+        waves = math.ceil(len(calls) / max_workers)
+        total.seconds += waves * max(model.seconds(p, o) for model, p, o in calls)
+        for model, prompt_tokens, output_tokens in calls:
+            total.calls += 1
+            total.prompt_tokens += prompt_tokens
+            total.output_tokens += output_tokens
+            total.cost += model.cost(prompt_tokens, output_tokens)
+    return total
+
+
+def _reduce_rounds(summaries, map_model, reduce_token_max):
+    """
+    The collapse rounds and the final combine call of `SummarizeEngine.reduce`.
+    """
+    rounds = []
+    per_group = max(1, reduce_token_max // MAP_OUTPUT_TOKENS)
+    while summaries > per_group:
+        groups = math.ceil(summaries / per_group)
+        rounds.append([(map_model, per_group * MAP_OUTPUT_TOKENS + SUMMARY_PROMPT_TOKENS, MAP_OUTPUT_TOKENS)] * groups)
+        summaries = groups
+    rounds.append([(map_model, summaries * MAP_OUTPUT_TOKENS + SUMMARY_PROMPT_TOKENS, SUMMARY_OUTPUT_TOKENS)])
+    return rounds
+
+
+def strategy_rounds(strategy, input_tokens, chunk_tokens, map_model, final_model, reduce_token_max=3000):
+    """
+    The rounds of calls of `strategy` (see `estimate`), or None when one of its
+    prompts would not fit.
+    """
+    report = [(final_model, SUMMARY_OUTPUT_TOKENS + REPORT_PROMPT_TOKENS, REPORT_OUTPUT_TOKENS)]
+    if strategy == "direct":
+        prompt_tokens = input_tokens + REPORT_PROMPT_TOKENS
+        if prompt_tokens > final_model.max_prompt_tokens(REPORT_OUTPUT_TOKENS):
+            return None
+        return [[(final_model, prompt_tokens, REPORT_OUTPUT_TOKENS)]]
+    if strategy == "stuff":
+        prompt_tokens = input_tokens + SUMMARY_PROMPT_TOKENS
+        if prompt_tokens > map_model.max_prompt_tokens(SUMMARY_OUTPUT_TOKENS):
+            return None
+        return [[(map_model, prompt_tokens, SUMMARY_OUTPUT_TOKENS)], report]
+    if not chunk_tokens:
+        return None
+    largest = max(chunk_tokens) + SUMMARY_PROMPT_TOKENS + SUMMARY_OUTPUT_TOKENS
+    if largest > map_model.max_prompt_tokens(SUMMARY_OUTPUT_TOKENS):
+        return None
+    if strategy == "map_reduce":
+        mapped = [[(map_model, size + SUMMARY_PROMPT_TOKENS, MAP_OUTPUT_TOKENS) for size in chunk_tokens]]
+        return mapped + _reduce_rounds(len(chunk_tokens), map_model, reduce_token_max) + [report]
+    if strategy == "refine":
+        # The first call summarizes a chunk; each later one also reads the summary so far.
+        rounds = [[(map_model, chunk_tokens[0] + SUMMARY_PROMPT_TOKENS, SUMMARY_OUTPUT_TOKENS)]]
+        for size in chunk_tokens[1:]:
+            prompt_tokens = size + SUMMARY_OUTPUT_TOKENS + SUMMARY_PROMPT_TOKENS
+            rounds.append([(map_model, prompt_tokens, SUMMARY_OUTPUT_TOKENS)])
+        return rounds + [report]
+    raise ValueError(f"Unknown summarization strategy {strategy!r}")
+
+
+@dataclass
+class Plan:
+    strategy: str
+    map_model: str
+    final_model: str
+    predicted: Estimate
+    # Predictions of every strategy that fits, for the log.
+    alternatives: Dict[str, Estimate] = field(default_factory=dict)
+
+    # What was measured, once `record` has been called.
+    actual: Optional[Estimate] = None
+
+    def record(self, seconds, map_usage, report_usage):
+        """
+        Log the prediction next to what was measured: `seconds`, and the calls,
+        prompt tokens and output tokens spent on the summarization steps and on the
+        final prompt (calls answered from the LLM cache are not counted).
+        """
+        actual = Estimate(seconds=seconds)
+        for model_name, usage in ((self.map_model, map_usage), (self.final_model, report_usage)):
+            actual.calls += usage["calls"]
+            actual.prompt_tokens += usage["prompt_tokens"]
+            actual.output_tokens += usage["output_tokens"]
+            actual.cost += profile(model_name).cost(usage["prompt_tokens"], usage["output_tokens"])
+        self.actual = actual
+        logger.info(
+            "Plan %s (%s for summaries, %s for the report): predicted %s, actual %s",
+            self.strategy,
+            self.map_model,
+            self.final_model,
+            self.predicted.as_dict(),
+            actual.as_dict(),
+        )
+        instrumentation.count("plan", strategy=self.strategy)
+        instrumentation.count("plan_predicted_tokens", self.predicted.prompt_tokens + self.predicted.output_tokens)
+        instrumentation.count("plan_actual_tokens", actual.prompt_tokens + actual.output_tokens)
+        instrumentation.count("plan_predicted_seconds", self.predicted.seconds)
+        instrumentation.count("plan_actual_seconds", seconds)
+        return actual
+
+def plan(
+    input_tokens,
+    chunk_tokens: Optional[List[int]] = None,
+    map_model="gpt-4o",
+    final_model="gpt-4o",
+    strategies=STRATEGIES,
+    direct_max_tokens: Optional[int] = None,
+    max_seconds: Optional[float] = MAX_SECONDS,
+    max_workers=8,
+    reduce_token_max=3000,
+) -> Plan:
+    """
+    Choose among `strategies` for `input_tokens` of text split into chunks of
+    `chunk_tokens` tokens (by default `chunk_sizes(input_tokens)`). "direct" is
+    only considered up to `direct_max_tokens` when given. When nothing fits,
+    "map_reduce" is returned anyway.
+    """
+    if chunk_tokens is None:
+        chunk_tokens = chunk_sizes(input_tokens)
+    map_profile, final_profile = profile(map_model), profile(final_model)
+    alternatives = {}
+    for strategy in strategies:
+        if strategy == "direct" and direct_max_tokens is not None and input_tokens > direct_max_tokens:
+            continue
+        rounds = strategy_rounds(
+            strategy, input_tokens, chunk_tokens, map_profile, final_profile, reduce_token_max
+        )
+        if rounds is not None:
+            alternatives[strategy] = estimate(rounds, max_workers)
+    if not alternatives:
+        rounds = strategy_rounds(
+            "map_reduce", input_tokens, chunk_tokens or [input_tokens], map_profile, final_profile, reduce_token_max
+        )
+        predicted = estimate(rounds, max_workers) if rounds is not None else Estimate()
+        logger.warning("No summarization strategy fits %d tokens, using map_reduce", input_tokens)
+        return Plan("map_reduce", map_model, final_model, predicted)
+    in_time = [
+        name for name, predicted in alternatives.items() if max_seconds is None or predicted.seconds <= max_seconds
+    ]
+    if in_time:
+        strategy = min(in_time, key=lambda name: alternatives[name].cost)
+    else:
+        strategy = min(alternatives, key=lambda name: alternatives[name].seconds)
+    return Plan(strategy, map_model, final_model, alternatives[strategy], alternatives)
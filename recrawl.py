@@ -0,0 +1,366 @@
+"""
+Incremental rescrapes of sites that are summarized again and again.
+
+A `Manifest` keeps, per domain, the URLs scraped last time with their sitemap
+`lastmod`, a hash of their extracted text, the text itself (compressed) and their
+structured data, plus the last `WebsiteSummary` and the fingerprint of the text it
+was made from. Like the page and LLM caches it is a SQLite file.
+
+`Refresh` plans one rescrape of a domain. The URLs come from the site's sitemaps
+(listed in robots.txt, else /sitemap.xml), ranked like the crawler's frontier,
+with `crawler.Crawler.discover` as the fallback for sites without one. A page
+whose sitemap `lastmod` matches the manifest is reused without a request; the
+others are fetched (and revalidated through the page cache when one is
+configured). When the fingerprint of the resulting texts equals the stored one,
+`Refresh.stored_summary` returns the last summary and the LLM is not called, so
+refreshing an unchanged domain costs its robots.txt and sitemap requests.
+
+Pass a `Manifest` to `summarizer.scrape`, or set SCRAPER_MANIFEST_PATH to give it
+a default one.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from lxml import etree
+
+import crawler
+import http_client
+import instrumentation
+import page_cache
+import pipeline
+import structured
+
+logger = logging.getLogger(__name__)
+
+# Sitemap files read per domain (sitemap indexes count as one each).
+MAX_SITEMAPS = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    domain TEXT NOT NULL,
+    url TEXT NOT NULL,
+    lastmod TEXT,
+    text_hash TEXT NOT NULL,
+    text BLOB NOT NULL,
+    data TEXT,
+    checked_at REAL NOT NULL,
+    PRIMARY KEY (domain, url)
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    domain TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def domain_key(url):
+    """
+    The manifest key of a site: its host (without "www.") and any non-default port.
+    """
+    netloc = urlsplit(page_cache.normalize_url(url)).netloc
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def fingerprint(text_hashes):
+    """
+    Fingerprint of a site's content, from `{url: text_hash}`.
+    """
+    payload = "\n".join(f"{url} {digest}" for url, digest in sorted(text_hashes.items()))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class SitemapEntry:
+    url: str
+    lastmod: Optional[str] = None
+
+
+def parse_sitemap(content):
+    """
+    Return `(entries, sitemaps)`: the `SitemapEntry` of every <url> in a urlset, and
+    the URLs of the child sitemaps of a sitemap index. Gzipped sitemaps are accepted.
+    """
+    if content[:2] == b"\x1f\x8b":
+        try:
+            content = gzip.decompress(content)
+        except (OSError, EOFError):
+            return [], []
+    parser = etree.XMLParser(recover=True, resolve_entities=False, no_network=True)
+    try:
+        root = etree.fromstring(content, parser=parser)
+    except etree.XMLSyntaxError:
+        return [], []
+    if root is None:
+        return [], []
+    entries, sitemaps = [], []
+    for element in root.iter("{*}url", "{*}sitemap"):
+        loc = (element.findtext("{*}loc") or "").strip()
+        if not loc:
+            continue
+        if etree.QName(element).localname == "sitemap":
+            sitemaps.append(loc)
+        else:
+            lastmod = (element.findtext("{*}lastmod") or "").strip()
+            entries.append(SitemapEntry(loc, lastmod or None))
+    return entries, sitemaps
+
+
+def fetch_sitemap_entries(start_url, cache=None, robots=None, max_sitemaps=MAX_SITEMAPS):
+    """
+    All page entries of the site's sitemaps, following sitemap indexes. Empty when
+    the site has no sitemap.
+    """
+    robots = robots or crawler.get_robots(cache)
+    parts = urlsplit(start_url)
+    queue = list(robots.sitemaps(start_url)) or [f"{parts.scheme}://{parts.netloc}/sitemap.xml"]
+    seen = set()
+    entries = []
+    while queue and len(seen) < max_sitemaps:
+        url = queue.pop(0)
+        if url in seen:
+            continue
+        seen.add(url)
+        try:
+            response = page_cache.fetch(url, cache)
+        except http_client.REQUEST_ERRORS as e:
+            logger.warning("Error fetching sitemap %s: %s", url, e)
+            continue
+        if response.status_code != 200:
+            continue
+        page_entries, sitemaps = parse_sitemap(response.content)
+        entries.extend(page_entries)
+        queue.extend(sitemaps)
+    return entries
+
+
+def select_urls(start_url, entries, max_urls=5, robots=None):
+    """
+    `start_url` followed by the best sitemap URLs of the same site, `max_urls` in
+    total, and `{url: lastmod}` for them. URLs robots.txt disallows are left out,
+    `start_url` included.
+    """
+    start_url = crawler.normalize_url(start_url)
+    site = crawler.site_of(start_url)
+    lastmods = {}
+    candidates = []
+    for order, entry in enumerate(entries):
+        url = crawler.normalize_url(entry.url)
+        if url in lastmods or not crawler.same_site(url, site):
+            continue
+        lastmods[url] = entry.lastmod
+        score = crawler.score_url(url)
+        if url != start_url and score is not None:
+            candidates.append((-score, order, url))
+    urls = [start_url] if robots is None or robots.allowed(start_url) else []
+    for _, _, url in sorted(candidates):
+        if len(urls) >= max_urls:
+            break
+        if robots is None or robots.allowed(url):
+            urls.append(url)
+    return urls, {url: lastmods.get(url) for url in urls}
+
+
+@dataclass
+class PageRecord:
+    url: str
+    lastmod: Optional[str]
+    text_hash: str
+    text: str
+    # structured.StructuredData as JSON, or None.
+    data: Optional[str] = None
+
+
+class Manifest:
+    def __init__(self, path):
+        self.path = path
+        self.stats = {"pages_reused": 0, "pages_fetched": 0, "summaries_reused": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def pages(self, domain) -> Dict[str, PageRecord]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, lastmod, text_hash, text, data FROM pages WHERE domain = ?",
+                (domain,),
+            ).fetchall()
+        return {
+            url: PageRecord(url, lastmod, digest, zlib.decompress(text).decode("utf-8"), data)
+            for url, lastmod, digest, text, data in rows
+        }
+
+    def replace_pages(self, domain, records: List[PageRecord]):
+        """
+        Make `records` the domain's pages; pages no longer scraped are forgotten.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM pages WHERE domain = ?", (domain,))
+            self._conn.executemany(
+                "INSERT INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        domain,
+                        record.url,
+                        record.lastmod,
+                        record.text_hash,
+                        zlib.compress(record.text.encode("utf-8")),
+                        record.data,
+                        now,
+                    )
+                    for record in records
+                ],
+            )
+            self._conn.commit()
+
+    def summary(self, domain):
+        """
+        Return `(fingerprint, summary)` stored for the domain, or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, summary FROM summaries WHERE domain = ?", (domain,)
+            ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def put_summary(self, domain, fingerprint, summary):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?)",
+                (domain, fingerprint, json.dumps(summary, default=str), time.time()),
+            )
+            self._conn.commit()
+
+
+class Refresh:
+    """
+    One incremental rescrape of the site at `start_url`: the URLs to scrape, which of
+    them can be reused from `manifest` and which have to be fetched.
+    """
+
+    def __init__(self, manifest, start_url, max_urls=5, cache=None, robots=None):
+        self.manifest = manifest
+        self.domain = domain_key(start_url)
+        self.cache = cache
+        robots = robots or crawler.get_robots(cache)
+        # Passed on to the fetcher: the robots.txt Crawl-delay, and when the crawler
+        # is used, the pages it already downloaded and when it last hit the host.
+        self.fetch_kwargs = {"crawl_delay": robots.crawl_delay(start_url)}
+        entries = fetch_sitemap_entries(start_url, cache=cache, robots=robots)
+        if entries:
+            self.urls, self.lastmods = select_urls(start_url, entries, max_urls, robots)
+        else:
+            site_crawler = crawler.Crawler(max_pages=max_urls, cache=cache, robots=robots)
+            self.urls, self.lastmods = site_crawler.discover(start_url), {}
+            self.fetch_kwargs = site_crawler.fetch_kwargs()
+        known = manifest.pages(self.domain)
+        self.reused = {
+            url: known[url]
+            for url in self.urls
+            if url in known and self.lastmods.get(url) and known[url].lastmod == self.lastmods[url]
+        }
+        self.to_fetch = [url for url in self.urls if url not in self.reused]
+        self._records = {}
+        logger.info(
+            "Refreshing %s: %d pages unchanged, %d to fetch",
+            self.domain,
+            len(self.reused),
+            len(self.to_fetch),
+        )
+
+    def iter_pages(self, extract):
+        """
+        Yield `(url, (text, structured_data))` for every URL in order: unchanged pages
+        from the manifest, the others fetched and passed to `extract`
+        (`summarizer.extract_fetched_page_data`).
+        """
+        fetched = pipeline.iter_pages(
+            self.to_fetch, extract, ordered=True, cache=self.cache, **self.fetch_kwargs
+        )
+        try:
+            for url in self.urls:
+                record = self.reused.get(url)
+                if record is not None:
+                    self.manifest.stats["pages_reused"] += 1
+                    instrumentation.count("manifest_pages_reused")
+                    data = structured.StructuredData.from_json(record.data) if record.data else None
+                else:
+                    _, (text, data) = next(fetched)
+                    self.manifest.stats["pages_fetched"] += 1
+                    # Pages that failed or came back empty are fetched again next time.
+                    record = PageRecord(
+                        url,
+                        self.lastmods.get(url) if text else None,
+                        text_hash(text),
+                        text,
+                        data.to_json() if data is not None else None,
+                    )
+                self._records[url] = record
+                yield url, (record.text, data)
+        finally:
+            fetched.close()
+
+    @property
+    def fingerprint(self):
+        return fingerprint({url: record.text_hash for url, record in self._records.items()})
+
+    def stored_summary(self):
+        """
+        The stored summary if the pages read by `iter_pages` are the ones it was
+        made from, else None.
+        """
+        stored = self.manifest.summary(self.domain)
+        if stored is None or stored[0] != self.fingerprint:
+            return None
+        self.manifest.stats["summaries_reused"] += 1
+        instrumentation.count("manifest_summaries_reused")
+        return stored[1]
+
+    def save(self, summary):
+        """
+        Record the pages read by `iter_pages` and the summary made from them. Nothing
+        is recorded when no page had any text, so a site that is down keeps its manifest.
+        """
+        if not any(record.text for record in self._records.values()):
+            return
+        self.manifest.replace_pages(self.domain, list(self._records.values()))
+        self.manifest.put_summary(self.domain, self.fingerprint, summary)
+
+
+_default_manifest = None
+_default_manifest_lock = threading.Lock()
+
+
+def get_default_manifest():
+    """
+    Return the manifest configured through SCRAPER_MANIFEST_PATH, or None when
+    incremental rescrapes are off.
+    """
+    global _default_manifest
+    path = os.getenv("SCRAPER_MANIFEST_PATH")
+    if not path:
+        return None
+    with _default_manifest_lock:
+        if _default_manifest is None:
+            _default_manifest = Manifest(path)
+    return _default_manifest
@@ -0,0 +1,217 @@
+"""
+Token-budgeted relevance ranking of a site's text before it goes to the LLM.
+
+The text is cut into small chunks and each chunk is scored with BM25 against a
+term list per `WebsiteSummary` field (company, employees, industry, value
+proposition, competition), minus a score for legal/cookie/newsletter
+boilerplate. The BM25 weights of the query terms in all chunks are computed at
+once as a NumPy matrix, so ranking a site costs a few array operations.
+
+`select_chunks` keeps the best chunk for each field first and then the highest
+scoring ones, until `token_budget` is used. When the kept chunks hold too small a
+share of the site's relevant text to summarize directly, `Selection.needs_map_reduce`
+is set and the caller map-reduces the relevant chunks instead (irrelevant chunks
+are still dropped). benchmarks/bench_relevance.py measures field recall on the
+HTML fixtures.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import numpy as np
+
+import tokens
+
+# Default budget for the text sent to the final summary prompt, in tokens.
+TOKEN_BUDGET = 8000
+# Size of the ranked chunks; small enough that one relevant paragraph does not
+# drag a page of filler along with it.
+CHUNK_TOKENS = 500
+# Map-reduce instead when the kept chunks hold less than this share of the relevance.
+MIN_RELEVANT_SHARE = 0.5
+
+FIELD_TERMS = {
+    "company": (
+        "company inc ltd llc gmbh corporation corp founded headquartered mission "
+        "since owned"
+    ),
+    "employees": (
+        "ceo cto cfo coo cmo founder cofounder chief executive officer president "
+        "director vp vice manager team leadership board advisor advisors partner"
+    ),
+    "industry": (
+        "industry sector market platform software services solutions products "
+        "manufacturing healthcare health retail finance analytics"
+    ),
+    "value_proposition": (
+        "helps customers clients value save saves reduce reduces increase faster "
+        "trusted leading benefits accuracy"
+    ),
+    "competition": (
+        "competitors competition competing competitor alternative alternatives versus vs "
+        "unlike compared comparison share pricing leader"
+    ),
+}
+NOISE_TERMS = (
+    "cookie cookies privacy policy terms conditions consent copyright rights reserved "
+    "gdpr subscribe newsletter login javascript unsubscribe"
+)
+NOISE_WEIGHT = 0.5
+# Chunks scoring below this fraction of the best chunk count as irrelevant: a stray
+# "market" or "team" in a blog post should not make the post worth keeping.
+RELEVANCE_FLOOR = 0.25
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def terms(text):
+    return _WORD.findall(text.lower())
+
+
+def query_vocabulary(queries):
+    """
+    The term -> column mapping of every term in `queries`.
+    """
+    vocabulary = {}
+    for query in queries:
+        for term in terms(query):
+            vocabulary.setdefault(term, len(vocabulary))
+    return vocabulary
+
+
+def bm25_weights(documents, vocabulary, k1=1.5, b=0.75):
+    """
+    Return the BM25 weight of every `vocabulary` term (term -> column) in every
+    document as a `(documents, terms)` array. Other terms only count towards the
+    document lengths, so the array stays as small as the query.
+    """
+    rows, columns, lengths = [], [], []
+    for row, document in enumerate(documents):
+        document_terms = terms(document)
+        lengths.append(len(document_terms))
+        for term in document_terms:
+            column = vocabulary.get(term)
+            if column is not None:
+                columns.append(column)
+                rows.append(row)
+    shape = (len(documents), max(1, len(vocabulary)))
+    tf = np.zeros(shape, dtype=np.float32)
+    np.add.at(tf, (np.asarray(rows, dtype=np.int64), np.asarray(columns, dtype=np.int64)), 1.0)
+    lengths = np.asarray(lengths, dtype=np.float32).reshape(-1, 1)
+    average_length = max(float(lengths.mean()) if len(documents) else 0.0, 1.0)
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log1p((len(documents) - df + 0.5) / (df + 0.5)).astype(np.float32)
+    return idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths / average_length))
+
+
+def _query_matrix(vocabulary, queries):
+    matrix = np.zeros((max(1, len(vocabulary)), len(queries)), dtype=np.float32)
+    for column, query in enumerate(queries):
+        for term in set(terms(query)):
+            matrix[vocabulary[term], column] = 1.0
+    return matrix
+
+
+def score_chunks(chunks):
+    """
+    Return `(relevance, field_scores)`: one relevance score per chunk (0 for
+    irrelevant chunks), and the `(chunks, fields)` array of per-field scores, each
+    field normalized to [0, 1].
+    """
+    vocabulary = query_vocabulary([*FIELD_TERMS.values(), NOISE_TERMS])
+    weights = bm25_weights(chunks, vocabulary)
+    fields = weights @ _query_matrix(vocabulary, list(FIELD_TERMS.values()))
+    fields /= np.maximum(fields.max(axis=0, keepdims=True), 1e-9)
+    noise = weights @ _query_matrix(vocabulary, [NOISE_TERMS])[:, 0]
+    noise /= max(float(noise.max()), 1e-9)
+    relevance = np.maximum(fields.sum(axis=1) - NOISE_WEIGHT * noise, 0.0)
+    relevance[relevance < RELEVANCE_FLOOR * relevance.max(initial=0.0)] = 0.0
+    return relevance, fields
+
+
+@dataclass
+class Selection:
+    chunks: List[str]
+    # Indices of the kept chunks, in the original order.
+    kept: List[int]
+    relevance: np.ndarray
+    tokens_in: int
+    tokens_out: int
+    relevant_share: float
+    needs_map_reduce: bool
+    field_coverage: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def text(self):
+        return "\n".join(self.chunks[i] for i in self.kept)
+
+    @property
+    def relevant_text(self):
+        """
+        Every chunk with any relevance, in the original order (for map-reduce).
+        """
+        return "\n".join(c for c, score in zip(self.chunks, self.relevance) if score > 0)
+
+    @property
+    def report(self):
+        return {
+            "chunks_in": len(self.chunks),
+            "chunks_kept": len(self.kept),
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "relevant_share": round(self.relevant_share, 3),
+            "needs_map_reduce": self.needs_map_reduce,
+            "field_coverage": self.field_coverage,
+        }
+
+
+def select_chunks(
+    chunks,
+    token_budget=TOKEN_BUDGET,
+    count_tokens=None,
+    min_relevant_share=MIN_RELEVANT_SHARE,
+    sizes=None,
+):
+    """
+    Keep the most relevant chunks that fit in `token_budget` tokens: first the best
+    chunk for each field, then by overall relevance. Chunks with no relevance are
+    never kept, unless no chunk has any: then every chunk counts as relevant.
+    `sizes` are the chunks' token counts when already known (e.g. from
+    `tokens.TokenCounter.chunk_ids`); otherwise each chunk is counted.
+    """
+    if sizes is None:
+        count_tokens = count_tokens or tokens.count_tokens
+        sizes = [count_tokens(chunk) for chunk in chunks]
+    sizes = np.array(sizes, dtype=np.int64)
+    relevance, fields = score_chunks(chunks) if chunks else (np.zeros(0), np.zeros((0, 0)))
+    if len(chunks) and not relevance.any():
+        # No chunk has any field term (e.g. a site not in English): nothing can be
+        # ranked out, so keep the text in order and map-reduce it when it is too long.
+        relevance = np.ones(len(chunks))
+
+    candidates = [int(i) for i in np.argmax(fields, axis=0)] if len(chunks) else []
+    candidates += [int(i) for i in np.argsort(-relevance, kind="stable")]
+    kept, used = set(), 0
+    for index in candidates:
+        if index in kept or relevance[index] <= 0 or used + sizes[index] > token_budget:
+            continue
+        kept.add(index)
+        used += int(sizes[index])
+
+    kept = sorted(kept)
+    total_relevance = float(relevance.sum())
+    share = float(relevance[kept].sum()) / total_relevance if total_relevance else 1.0
+    coverage = {
+        name: round(float(fields[kept, column].max()), 3) if kept else 0.0
+        for column, name in enumerate(FIELD_TERMS)
+    }
+    return Selection(
+        chunks=list(chunks),
+        kept=kept,
+        relevance=relevance,
+        tokens_in=int(sizes.sum()),
+        tokens_out=used,
+        relevant_share=share,
+        needs_map_reduce=share < min_relevant_share,
+        field_coverage=coverage,
+    )
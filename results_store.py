@@ -0,0 +1,468 @@
+"""
+Append-only columnar store for scrape results.
+
+`ResultsStore` keeps `WebsiteSummary` records as three tables:
+
+* "summaries": one row per scrape (domain, url, scraped_at, title, summary,
+  company_name, industry, value_proposition, employee and competitor counts, error);
+* "employees": one row per person (domain, scraped_at, name, title, position, location);
+* "competition": one row per competitor (domain, scraped_at, competitor).
+
+Rows are written in immutable segments, one directory per segment and one file per
+column: numbers as .npy arrays, strings as an int64 offsets array plus the UTF-8
+bytes and a null mask, the layout Arrow uses. Reading a column memory-maps just
+its files, so an analytics job that needs `industry` never touches `summary`. Each
+segment also has an index sorted by (domain hash, scraped_at) for fast lookups of
+a domain's results.
+
+Every `SegmentWriter` buffers rows and publishes a segment with an atomic rename,
+so writers in many threads or processes can append to one store without locks.
+`compact` merges small segments, one compaction at a time per store (a SQLite
+lock on compact.lock); the merged segment lists the segments it replaces, so
+readers never see their rows twice. It also clears out directories left by writers
+and compactions that crashed. With pyarrow installed, `to_arrow` and
+`write_parquet` export the tables for other tools.
+
+    store = ResultsStore("results")
+    with store.writer() as writer:
+        writer.append(record)  # a batch.scrape_one record
+    store.read("summaries", ["domain", "industry"])
+    store.lookup("example.com")
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import domains
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+SEGMENT_ROWS = 5000
+# A tmp-* staging directory untouched for this long belongs to a writer that crashed.
+STALE_STAGING_SECONDS = 3600
+
+TABLES = {
+    "summaries": {
+        "domain": "str",
+        "url": "str",
+        "scraped_at": "f8",
+        "title": "str",
+        "summary": "str",
+        "company_name": "str",
+        "industry": "str",
+        "value_proposition": "str",
+        "employee_count": "i4",
+        "competitor_count": "i4",
+        "error": "str",
+    },
+    "employees": {
+        "domain": "str",
+        "scraped_at": "f8",
+        "name": "str",
+        "title": "str",
+        "position": "str",
+        "location": "str",
+    },
+    "competition": {
+        "domain": "str",
+        "scraped_at": "f8",
+        "competitor": "str",
+    },
+}
+
+
+def domain_hash(domain):
+    return int.from_bytes(hashlib.blake2b(domain.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _timestamp(value):
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(value).timestamp()
+
+
+def flatten(record):
+    """
+    Split a `batch.scrape_one` record into `{table: [row, ...]}`.
+    """
+    summary = record.get("summary") or {}
+    domain = record.get("domain") or domains.domain_of(record.get("url") or "")
+    scraped_at = _timestamp(record.get("scraped_at"))
+    employees = summary.get("employees") or []
+    competition = summary.get("competition") or []
+    return {
+        "summaries": [
+            {
+                "domain": domain,
+                "url": record.get("url"),
+                "scraped_at": scraped_at,
+                "title": summary.get("title"),
+                "summary": summary.get("summary"),
+                "company_name": summary.get("company_name"),
+                "industry": summary.get("industry"),
+                "value_proposition": summary.get("value_proposition"),
+                "employee_count": len(employees),
+                "competitor_count": len(competition),
+                "error": record.get("error"),
+            }
+        ],
+        "employees": [
+            {
+                "domain": domain,
+                "scraped_at": scraped_at,
+                "name": employee.get("name"),
+                "title": employee.get("title"),
+                "position": employee.get("position"),
+                "location": employee.get("location"),
+            }
+            for employee in employees
+            if isinstance(employee, dict)
+        ],
+        "competition": [
+            {"domain": domain, "scraped_at": scraped_at, "competitor": str(competitor)}
+            for competitor in competition
+        ],
+    }
+
+
+class StringColumn:
+    """
+    A memory-mapped column of strings (None for nulls).
+    """
+
+    def __init__(self, offsets, data, nulls):
+        self.offsets = offsets
+        self.data = data
+        self.nulls = nulls
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if self.nulls[index]:
+            return None
+        return bytes(self.data[self.offsets[index] : self.offsets[index + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def to_list(self):
+        data = bytes(self.data)
+        offsets = self.offsets.tolist()
+        return [
+            None if null else data[offsets[i] : offsets[i + 1]].decode("utf-8")
+            for i, null in enumerate(self.nulls.tolist())
+        ]
+
+
+def _write_column(directory, name, kind, values):
+    base = os.path.join(directory, name)
+    if kind != "str":
+        np.save(base + ".npy", np.asarray(values, dtype=kind))
+        return
+    encoded = [value.encode("utf-8") if value is not None else b"" for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    np.save(base + ".offsets.npy", offsets)
+    np.save(base + ".nulls.npy", np.array([value is None for value in values], dtype=bool))
+    with open(base + ".data", "wb") as f:
+        f.write(b"".join(encoded))
+
+
+def _read_column(directory, name, kind):
+    base = os.path.join(directory, name)
+    if kind != "str":
+        return np.load(base + ".npy", mmap_mode="r")
+    offsets = np.load(base + ".offsets.npy", mmap_mode="r")
+    nulls = np.load(base + ".nulls.npy", mmap_mode="r")
+    # np.memmap cannot map an empty file.
+    size = os.path.getsize(base + ".data")
+    data = np.memmap(base + ".data", dtype=np.uint8, mode="r") if size else np.zeros(0, np.uint8)
+    return StringColumn(offsets, data, nulls)
+
+
+class Segment:
+    """
+    One immutable segment. Its columns are memory-mapped on first use and kept open.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self._columns = {}
+
+    def rows(self, table):
+        return self.meta["rows"][table]
+
+    def column(self, table, name):
+        key = (table, name)
+        if key not in self._columns:
+            self._columns[key] = _read_column(os.path.join(self.path, table), name, TABLES[table][name])
+        return self._columns[key]
+
+    def _index(self, name):
+        if name not in self._columns:
+            self._columns[name] = np.load(os.path.join(self.path, f"index.{name}.npy"), mmap_mode="r")
+        return self._columns[name]
+
+    def lookup(self, domain, since=None, until=None):
+        """
+        Rows of the "summaries" table for `domain`, oldest first.
+        """
+        if since is not None and self.meta["max_scraped_at"] < since:
+            return []
+        if until is not None and self.meta["min_scraped_at"] > until:
+            return []
+        hashes = self._index("hash")
+        target = np.uint64(domain_hash(domain))
+        start, end = np.searchsorted(hashes, target, "left"), np.searchsorted(hashes, target, "right")
+        if start == end:
+            return []
+        rows = self._index("row")[start:end]
+        domains = self.column("summaries", "domain")
+        times = self.column("summaries", "scraped_at")
+        return [
+            int(row)
+            for row in rows
+            if domains[row] == domain
+            and (since is None or times[row] >= since)
+            and (until is None or times[row] <= until)
+        ]
+
+
+def _write_segment(root, tables, replaces=()):
+    """
+    Write `{table: [row, ...]}` as a new segment under `root` and return its path.
+    `replaces` names segments whose rows it contains; readers skip those from then on.
+    """
+    name = f"{time.time_ns():x}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    staging = os.path.join(root, "tmp-" + name)
+    for table, columns in TABLES.items():
+        directory = os.path.join(staging, table)
+        os.makedirs(directory)
+        rows = tables.get(table, [])
+        for column, kind in columns.items():
+            _write_column(directory, column, kind, [row[column] for row in rows])
+    summaries = tables.get("summaries", [])
+    hashes = np.array([domain_hash(row["domain"]) for row in summaries], dtype=np.uint64)
+    times = np.array([row["scraped_at"] for row in summaries], dtype=np.float64)
+    order = np.lexsort((times, hashes))
+    np.save(os.path.join(staging, "index.hash.npy"), hashes[order])
+    np.save(os.path.join(staging, "index.row.npy"), order.astype(np.int64))
+    meta = {
+        "rows": {table: len(tables.get(table, [])) for table in TABLES},
+        "min_scraped_at": float(times.min()) if len(times) else None,
+        "max_scraped_at": float(times.max()) if len(times) else None,
+        "replaces": list(replaces),
+    }
+    with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    path = os.path.join(root, "seg-" + name)
+    # Readers only list seg-* directories, so a segment appears complete or not at all.
+    os.rename(staging, path)
+    return path
+
+
+class SegmentWriter:
+    """
+    Buffers appended records and writes them out as a segment every `segment_rows`
+    summaries and on `flush`/`close`. One writer per thread or process.
+    """
+
+    def __init__(self, root, segment_rows=SEGMENT_ROWS):
+        self.root = root
+        self.segment_rows = segment_rows
+        self._buffer = {table: [] for table in TABLES}
+
+    def append(self, record):
+        for table, rows in flatten(record).items():
+            self._buffer[table].extend(rows)
+        if len(self._buffer["summaries"]) >= self.segment_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer["summaries"]:
+            return None
+        path = _write_segment(self.root, self._buffer)
+        self._buffer = {table: [] for table in TABLES}
+        return path
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ResultsStore:
+    def __init__(self, path, segment_rows=SEGMENT_ROWS):
+        self.path = path
+        self.segment_rows = segment_rows
+        os.makedirs(path, exist_ok=True)
+        self._writer = None
+        self._segments = {}
+        self._lock = threading.Lock()
+
+    def writer(self):
+        return SegmentWriter(self.path, self.segment_rows)
+
+    def append(self, record):
+        """
+        Append through a shared writer (thread-safe); call `flush` to publish.
+        """
+        with self._lock:
+            if self._writer is None:
+                self._writer = self.writer()
+            self._writer.append(record)
+
+    def flush(self):
+        with self._lock:
+            if self._writer is not None:
+                self._writer.flush()
+
+    def segments(self) -> List[Segment]:
+        names = sorted(name for name in os.listdir(self.path) if name.startswith("seg-"))
+        segments = {}
+        for name in names:
+            try:
+                segments[name] = self._segments.get(name) or Segment(os.path.join(self.path, name))
+            except FileNotFoundError:
+                continue  # removed by a compaction since the listing
+        replaced = {old for segment in segments.values() for old in segment.meta.get("replaces", ())}
+        self._segments = {name: segment for name, segment in segments.items() if name not in replaced}
+        return list(self._segments.values())
+
+    def read(self, table="summaries", columns=None) -> Dict[str, object]:
+        """
+        `{column: values}` for `columns` (all by default) of `table` across all
+        segments: numpy arrays for numbers, lists for strings.
+        """
+        columns = list(columns or TABLES[table])
+        segments = self.segments()
+        result = {}
+        for column in columns:
+            parts = [segment.column(table, column) for segment in segments if segment.rows(table)]
+            if TABLES[table][column] == "str":
+                result[column] = [value for part in parts for value in part.to_list()]
+            else:
+                result[column] = np.concatenate(parts) if parts else np.zeros(0, TABLES[table][column])
+        return result
+
+    def lookup(self, domain, since=None, until=None):
+        """
+        All stored summaries of `domain`, optionally within [since, until] (epoch
+        seconds), oldest first, as flat "summaries" rows.
+        """
+        found = []
+        for segment in self.segments():
+            rows = segment.lookup(domain, since, until)
+            if not rows:
+                continue
+            columns = {name: segment.column("summaries", name) for name in TABLES["summaries"]}
+            for row in rows:
+                found.append({name: _value(column[row]) for name, column in columns.items()})
+        return sorted(found, key=lambda row: row["scraped_at"])
+
+    def latest(self, domain) -> Optional[dict]:
+        rows = self.lookup(domain)
+        return rows[-1] if rows else None
+
+    def compact(self, min_rows=None, timeout=60):
+        """
+        Merge segments with fewer than `min_rows` summaries (default: `segment_rows`)
+        into one. Compactions of the same store, from any thread or process, wait
+        up to `timeout` seconds for each other instead of merging the same segments.
+        """
+        lock = sqlite3.connect(os.path.join(self.path, "compact.lock"), timeout=timeout, isolation_level=None)
+        try:
+            lock.execute("BEGIN EXCLUSIVE")
+            return self._compact(min_rows or self.segment_rows)
+        finally:
+            lock.close()
+
+    def _remove(self, name):
+        trash = os.path.join(self.path, "old-" + name)
+        try:
+            os.rename(os.path.join(self.path, name), trash)
+        except FileNotFoundError:
+            return
+        shutil.rmtree(trash)
+
+    def _remove_leftovers(self):
+        """
+        Remove what crashed writers and compactions left behind: segments removed
+        halfway (old-*), and staging directories (tmp-*) older than
+        `STALE_STAGING_SECONDS`, which no live writer is still filling.
+        """
+        now = time.time()
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            try:
+                stale = name.startswith("old-") or (
+                    name.startswith("tmp-") and now - os.path.getmtime(path) > STALE_STAGING_SECONDS
+                )
+                if stale:
+                    shutil.rmtree(path)
+            except FileNotFoundError:
+                continue  # removed by its writer or another cleanup meanwhile
+
+    def _compact(self, min_rows):
+        self._remove_leftovers()
+        segments = self.segments()
+        # Segments a compaction that stopped halfway published a replacement for.
+        for name in {old for segment in segments for old in segment.meta.get("replaces", ())}:
+            self._remove(name)
+        small = [segment for segment in segments if segment.rows("summaries") < min_rows]
+        if len(small) < 2:
+            return None
+        tables = {table: [] for table in TABLES}
+        for segment in small:
+            for table, columns in TABLES.items():
+                values = {}
+                for name, kind in columns.items():
+                    column = segment.column(table, name)
+                    values[name] = column.to_list() if kind == "str" else column.tolist()
+                for row in range(segment.rows(table)):
+                    tables[table].append({name: values[name][row] for name in columns})
+        # Publishing the merged segment hides the old ones, which are then removed.
+        path = _write_segment(self.path, tables, replaces=[segment.name for segment in small])
+        for segment in small:
+            self._remove(segment.name)
+        return path
+
+    def to_arrow(self, table="summaries", columns=None):
+        if pyarrow is None:
+            raise ImportError("Arrow export needs `pip install pyarrow`")
+        return pyarrow.table(self.read(table, columns))
+
+    def write_parquet(self, directory):
+        """
+        Write each table to `<directory>/<table>.parquet`.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for table in TABLES:
+            pyarrow.parquet.write_table(self.to_arrow(table), os.path.join(directory, table + ".parquet"))
+
+
+def _value(value):
+    return value.item() if isinstance(value, np.generic) else value
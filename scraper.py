@@ -1,13 +1,19 @@
-from bs4 import BeautifulSoup
-import requests
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
 import json
-import numpy as np
-import requests
-from requests.models import MissingSchema
-import trafilatura
-from trafilatura.spider import focused_crawler
+import logging
 from bs4.element import Comment
 
+import crawler
+import html_text
+import http_client
+import instrumentation
+import page_cache
+import pipeline
+
+logger = logging.getLogger(__name__)
 
 
 def beautifulsoup_extract_text_fallback(response_content):
@@ -17,54 +23,65 @@ def beautifulsoup_extract_text_fallback(response_content):
     single URL.
     """
 
-    # Create the beautifulsoup object:
-    soup = BeautifulSoup(response_content, "html.parser")
-
-    # Finding the text:
-    text = soup.find_all(text=True)
-
-    # Remove unwanted tag elements:
-    cleaned_text = ""
-    blacklist = [
-        "[document]",
-        "noscript",
-        "header",
-        "html",
-        "meta",
-        "head",
-        "input",
-        "script",
-        "style",
-    ]
-
-    # Then we will loop over every item in the extract text and make sure that the beautifulsoup4 tag
-    # is NOT in the blacklist
-    for item in text:
-        if item.parent.name not in blacklist:
-            cleaned_text += "{} ".format(item)
-
-    # Remove any tab separation and strip the text:
-    cleaned_text = cleaned_text.replace("\t", "")
-    return cleaned_text.strip()
-
-
-def crawl_web_page(url, max_urls=10):
-    print("Crawling web page...", url)
-    to_visit, known_urls = focused_crawler(
-        url, max_seen_urls=max_urls, max_known_urls=100
+    # Only strings whose parent tag is not blacklisted (html_text.FALLBACK_BLACKLIST);
+    # parsed with the fastest installed html_text backend.
+    return html_text.extract_text(response_content, "fallback")
+
+
+def iter_web_page_texts(url, max_urls=10, cache=None, ordered=False, extraction_pool=None):
+    """
+    Crawl `url` and yield `(url, text)` for each page as soon as it has been
+    downloaded and extracted, while the other pages are still downloading.
+    Extraction runs on `extraction_pool` (an `extract_pool.ExtractionPool`) if given.
+    """
+    logger.info("Crawling web page %s", url)
+    site_crawler = crawler.Crawler(max_pages=max_urls, cache=cache)
+    to_visit = site_crawler.discover(url)
+    logger.info("Crawling complete, extracting text from %d pages", len(to_visit))
+
+    def extract(page):
+        return extract_downloaded_page(
+            page.url,
+            page.content,
+            page.status_code,
+            cache=cache,
+            extraction_pool=extraction_pool,
+        ).text
+
+    # The start page was downloaded by discover(); the pipeline reuses it.
+    return pipeline.iter_pages(
+        to_visit, extract, ordered=ordered, cache=cache, **site_crawler.fetch_kwargs()
     )
-    print("Crawling complete. Extracting text from web pages...")
+
+
+def crawl_web_page(url, max_urls=10, cache=None, extraction_pool=None):
     all_text = []
-    for url in to_visit:
-        text = extract_text_from_single_web_page(url)
-        print(text)
+    for _, text in iter_web_page_texts(
+        url, max_urls=max_urls, cache=cache, ordered=True, extraction_pool=extraction_pool
+    ):
+        instrumentation.dump("PAGE TEXT:", text)
         all_text.append(text)
     return all_text
 
 
-def extract_text_from_single_web_page(url):
+@dataclass
+class ExtractedPage:
+    url: str
+    text: str = ""
+    # Which extractor produced `text`: "trafilatura", "beautifulsoup", "text_from_html" or None.
+    extractor: Optional[str] = None
+    status_code: Optional[int] = None
+    raw: bytes = b""
+
+
+def trafilatura_extract(downloaded_url):
+    """
+    Run trafilatura over downloaded HTML and return its JSON output (text and
+    metadata) as a dict, or None.
+    """
+    # trafilatura takes about half a second to import; only pay for it when extracting.
+    import trafilatura
 
-    downloaded_url = trafilatura.fetch_url(url)
     try:
         a = trafilatura.extract(
             downloaded_url,
@@ -81,38 +98,111 @@ def extract_text_from_single_web_page(url):
             date_extraction_params={"extensive_search": True, "original_date": True},
         )
     if a:
-        json_output = json.loads(a)
-        return json_output["text"]
-    else:
+        return json.loads(a)
+    return None
+
+
+def trafilatura_extract_text(downloaded_url):
+    """
+    Run trafilatura over downloaded HTML and return the extracted text, or None.
+    """
+    json_output = trafilatura_extract(downloaded_url)
+    return json_output["text"] if json_output else None
+
+
+def extract_html_bytes(raw):
+    """
+    Run the extractors in order over one downloaded buffer: trafilatura, then the
+    beautifulsoup4 fallback, then `text_from_html`. Returns a dict with the text,
+    the name of the first extractor that produced text (or None) and trafilatura's
+    metadata (title, date, sitename, ...) when it found any.
+    """
+    result = {"text": "", "extractor": None, "metadata": {}}
+    if not raw:
+        return result
+    json_output = trafilatura_extract(raw)
+    if json_output:
+        result["metadata"] = {
+            key: value
+            for key, value in json_output.items()
+            if key not in ("text", "raw_text", "comments") and value
+        }
+        if json_output.get("text"):
+            result.update(text=json_output["text"], extractor="trafilatura")
+            return result
+    # Both fallbacks walk the same parsed tree.
+    document = html_text.parse(raw)
+    for extractor, extract in (
+        ("beautifulsoup", beautifulsoup_extract_text_fallback),
+        ("text_from_html", text_from_html),
+    ):
+        text = extract(document)
+        if text:
+            result.update(text=text, extractor=extractor)
+            return result
+    return result
+
+
+def extract_text_from_html_bytes(raw):
+    """
+    Like `extract_html_bytes`, returning just `(text, extractor)`; `("", None)` when
+    no extractor found any text.
+    """
+    result = extract_html_bytes(raw)
+    return result["text"], result["extractor"]
+
+
+def extract_downloaded_page(url, raw, status_code=None, cache=None, extraction_pool=None):
+    """
+    Extract text from a page that has already been downloaded, in a worker process
+    when `extraction_pool` is given. The result is kept in the page cache, so
+    identical bytes are only extracted once.
+    """
+
+    def extract(raw):
+        if extraction_pool is not None:
+            result = extraction_pool.extract(raw, mode="pipeline")
+            return json.dumps([result["text"], result["extractor"]])
+        return json.dumps(extract_text_from_html_bytes(raw))
+
+    cached = page_cache.cached_extract(raw, "scraper", extract, cache)
+    text, extractor = json.loads(cached) if raw else ("", None)
+    return ExtractedPage(
+        url=url, text=text, extractor=extractor, status_code=status_code, raw=raw
+    )
+
+
+def extract_web_page(url, cache=None):
+    """
+    Download `url` once and extract its text, keeping the raw bytes and recording
+    which extractor succeeded.
+    """
+    try:
+        resp = page_cache.fetch(url, cache)
+    except httpx.UnsupportedProtocol:
+        # Handling for any URLs that don't have the correct protocol
+        logger.info("URL is missing a schema, retrying with https://")
+        url = "https://" + url
         try:
-            resp = requests.get(url)
-            # We will only extract the text from successful requests:
-            if resp.status_code == 200:
-                return beautifulsoup_extract_text_fallback(resp.content)
-                # Handling for any URLs that don't have the correct protocol
-            else:
-                raw_text = requests.get(url).text
-                print(
-                    "Something broke with the trafilatura response, using beautifulsoup4 to extract text"
-                )
-                return text_from_html(raw_text)
-
-        except MissingSchema:
-            # Try grabbing what we can from the URL's text:
-            raw_text = requests.get(url).text
-            print("URL is missing a schema, using beautifulsoup4 to extract text")
-            return text_from_html(raw_text)
+            resp = page_cache.fetch(url, cache)
+        except http_client.REQUEST_ERRORS as e:
+            logger.warning("Error fetching %s: %s", url, e)
+            return ExtractedPage(url=url)
+    except http_client.REQUEST_ERRORS as e:
+        logger.warning("Error fetching %s: %s", url, e)
+        return ExtractedPage(url=url)
+    page = extract_downloaded_page(url, resp.content, resp.status_code, cache=cache)
+    if page.extractor not in ("trafilatura", None):
+        logger.info("Trafilatura found no text on %s, used %s instead", url, page.extractor)
+    return page
+
+
+def extract_text_from_single_web_page(url, cache=None):
+    return extract_web_page(url, cache=cache).text
 
 
 def tag_visible(element):
-    if element.parent.name in [
-        "style",
-        "script",
-        "head",
-        "title",
-        "meta",
-        "[document]",
-    ]:
+    if element.parent.name in html_text.INVISIBLE_TAGS:
         return False
     if isinstance(element, Comment):
         return False
@@ -120,8 +210,4 @@ def tag_visible(element):
 
 
 def text_from_html(body):
-    soup = BeautifulSoup(body, "html.parser")
-    texts = soup.findAll(text=True)
-    visible_texts = filter(tag_visible, texts)
-    return " ".join(t.strip() for t in visible_texts)
-
+    return html_text.extract_text(body, "visible")
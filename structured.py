@@ -0,0 +1,324 @@
+"""
+Rule-based extraction of the company and team data that sites publish as markup.
+
+Many sites already state what `summarizer.scrape` asks the LLM for:
+
+* schema.org JSON-LD: an Organization (name, description, slogan, industry) with
+  its employees/founders/members, and Person objects;
+* OpenGraph and <meta> tags: site name, page title and description;
+* team pages: cards whose class marks a team member/person/profile and that
+  have a name child, with title and location children, and schema.org Person
+  microdata.
+
+`extract` reads one page and `StructuredData.update` merges the pages of a site,
+earlier pages (the start page first) winning. scrape() prefills `WebsiteSummary`
+from the result, asks the LLM only for the fields still missing, and skips the LLM
+when every field in `REQUIRED_FIELDS` is filled. Card classes also mark widgets and
+whole sections, so people found only that way never count as the known team: the
+LLM is still asked for employees and its answer is merged with the cards.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from lxml import html as lxml_html
+
+import page_cache
+
+# WebsiteSummary fields that can come from markup, and the ones that have to be
+# filled to skip the LLM. Competitors are never published as data, so they are left
+# empty on the fast path rather than paying a full LLM call for them alone.
+SUMMARY_FIELDS = (
+    "title",
+    "summary",
+    "company_name",
+    "industry",
+    "employees",
+    "value_proposition",
+    "competition",
+)
+REQUIRED_FIELDS = ("title", "summary", "company_name", "industry", "employees", "value_proposition")
+
+ORGANIZATION_TYPES = frozenset(
+    [
+        "Organization",
+        "Corporation",
+        "LocalBusiness",
+        "OnlineBusiness",
+        "ProfessionalService",
+        "NGO",
+        "EducationalOrganization",
+        "MedicalOrganization",
+        "NewsMediaOrganization",
+    ]
+)
+# JSON-LD keys of an Organization that hold its people.
+PEOPLE_KEYS = ("founder", "founders", "employee", "employees", "member", "members")
+# Class names of a team-member card and of the name/title/location inside one. A
+# card without a name child is not read: the same classes mark containers and widgets.
+CARD_CLASSES = frozenset(
+    ["team-member", "member", "person", "profile", "staff", "employee", "team-card", "leader"]
+)
+NAME_CLASSES = frozenset(["name", "member-name", "person-name", "full-name"])
+TITLE_CLASSES = frozenset(["title", "job-title", "jobtitle", "role"])
+POSITION_CLASSES = frozenset(["position"])
+LOCATION_CLASSES = frozenset(["location", "city"])
+
+_SPACE = re.compile(r"\s+")
+
+
+def _clean(value):
+    if not isinstance(value, str):
+        return None
+    value = _SPACE.sub(" ", value).strip()
+    return value or None
+
+
+def _name_key(name):
+    return _clean(name).casefold()
+
+
+def _is_name(name):
+    return name is not None and 2 <= len(name) <= 60 and len(name.split()) <= 6
+
+
+@dataclass
+class StructuredData:
+    # WebsiteSummary string fields found on the page(s).
+    fields: Dict[str, str] = field(default_factory=dict)
+    # Employee dicts (name, title, position, location), one per person.
+    employees: List[Dict[str, str]] = field(default_factory=list)
+    # True when some of the employees come from schema.org data (JSON-LD or
+    # microdata), not only from team card classes.
+    employees_declared: bool = False
+
+    def set(self, name, value):
+        value = _clean(value)
+        if value is not None:
+            self.fields.setdefault(name, value)
+
+    def add_employee(self, name, **details):
+        """
+        Add a person, or fill in details of one already known. False when `name`
+        does not look like a name.
+        """
+        name = _clean(name)
+        if not _is_name(name):
+            return False
+        details = {k: _clean(v) for k, v in details.items() if _clean(v) is not None}
+        for employee in self.employees:
+            if _name_key(employee["name"]) == _name_key(name):
+                for key, value in details.items():
+                    employee.setdefault(key, value)
+                return True
+        self.employees.append({"name": name, **details})
+        return True
+
+    def update(self, other):
+        """
+        Merge another page's data into this one; values already present are kept.
+        """
+        for name, value in other.fields.items():
+            self.set(name, value)
+        for employee in other.employees:
+            self.add_employee(**employee)
+        self.employees_declared = self.employees_declared or other.employees_declared
+
+    def prefill(self):
+        """
+        The known WebsiteSummary fields, as keyword arguments.
+        """
+        values = dict(self.fields)
+        if self.employees:
+            values["employees"] = [dict(employee) for employee in self.employees]
+        return values
+
+    def missing(self, fields=SUMMARY_FIELDS):
+        """
+        The fields the LLM still has to be asked for. Employees found only in team
+        cards are not trusted to be the whole team.
+        """
+        known = self.prefill()
+        if not self.employees_declared:
+            known.pop("employees", None)
+        return [name for name in fields if name not in known]
+
+    def merge(self, answer):
+        """
+        Fill the LLM's `answer` (WebsiteSummary fields) in with the known fields. When
+        the LLM was asked for employees too, its people come first and the ones from
+        markup are added.
+        """
+        merged = {**answer, **self.prefill()}
+        if "employees" in self.missing():
+            people = StructuredData()
+            for employee in list(answer.get("employees") or []) + self.employees:
+                if isinstance(employee, dict):
+                    people.add_employee(
+                        employee.get("name"),
+                        **{key: employee.get(key) for key in ("title", "position", "location")},
+                    )
+            merged["employees"] = people.employees
+        return merged
+
+    def complete(self, required=REQUIRED_FIELDS):
+        return not self.missing(required)
+
+    def to_json(self):
+        return json.dumps(
+            {"fields": self.fields, "employees": self.employees, "employees_declared": self.employees_declared}
+        )
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        return cls(
+            fields=data["fields"],
+            employees=data["employees"],
+            employees_declared=data.get("employees_declared", False),
+        )
+
+
+def _types(item):
+    types = item.get("@type", [])
+    return set(types if isinstance(types, list) else [types])
+
+
+def _iter_json_ld(value):
+    # Top-level objects, lists of objects and @graph containers.
+    if isinstance(value, list):
+        for item in value:
+            yield from _iter_json_ld(item)
+    elif isinstance(value, dict):
+        if "@graph" in value:
+            yield from _iter_json_ld(value["@graph"])
+        else:
+            yield value
+
+
+def _location(person):
+    place = person.get("workLocation") or person.get("homeLocation") or person.get("address")
+    if isinstance(place, list):
+        place = place[0] if place else None
+    if isinstance(place, dict):
+        address = place.get("address", place)
+        if isinstance(address, dict):
+            parts = [address.get(key) for key in ("addressLocality", "addressRegion", "addressCountry")]
+            return ", ".join(part for part in parts if isinstance(part, str)) or place.get("name")
+        return address if isinstance(address, str) else place.get("name")
+    return place
+
+
+def _add_person(data, person):
+    if isinstance(person, str):
+        added = data.add_employee(person)
+    elif isinstance(person, dict) and (not _types(person) or "Person" in _types(person)):
+        added = data.add_employee(person.get("name"), title=person.get("jobTitle"), location=_location(person))
+    else:
+        added = False
+    if added:
+        data.employees_declared = True
+
+
+def _read_json_ld(document, data):
+    for script in document.iter("script"):
+        if (script.get("type") or "").strip().lower() != "application/ld+json" or not script.text:
+            continue
+        try:
+            value = json.loads(script.text)
+        except ValueError:
+            continue
+        for item in _iter_json_ld(value):
+            types = _types(item)
+            if types & ORGANIZATION_TYPES:
+                data.set("company_name", item.get("name") or item.get("legalName"))
+                data.set("summary", item.get("description"))
+                data.set("value_proposition", item.get("slogan"))
+                data.set("industry", item.get("industry"))
+                for key in PEOPLE_KEYS:
+                    people = item.get(key)
+                    for person in people if isinstance(people, list) else [people]:
+                        _add_person(data, person)
+            elif "Person" in types:
+                _add_person(data, item)
+            elif types & {"WebSite", "WebPage"}:
+                data.set("title", item.get("name"))
+
+
+def _read_meta(document, data):
+    meta = {}
+    for tag in document.iter("meta"):
+        key = (tag.get("property") or tag.get("name") or "").strip().lower()
+        if key and tag.get("content"):
+            meta.setdefault(key, tag.get("content"))
+    data.set("company_name", meta.get("og:site_name") or meta.get("application-name"))
+    data.set("title", meta.get("og:title"))
+    title = document.find(".//title")
+    if title is not None:
+        data.set("title", title.text_content())
+    data.set("summary", meta.get("og:description") or meta.get("description"))
+
+
+def _classes(element):
+    return set((element.get("class") or "").lower().split())
+
+
+def _child_text(card, classes):
+    for element in card.iterdescendants():
+        if not isinstance(element.tag, str):
+            continue
+        if _classes(element) & classes:
+            return _clean(element.text_content())
+    return None
+
+
+def _read_team_markup(document, data):
+    for element in document.iter():
+        if not isinstance(element.tag, str):
+            continue
+        itemtype = element.get("itemtype") or ""
+        if itemtype.rstrip("/").endswith("schema.org/Person"):
+            props = {
+                prop.get("itemprop"): prop.get("content") or prop.text_content()
+                for prop in element.iterdescendants()
+                if isinstance(prop.tag, str) and prop.get("itemprop")
+            }
+            if data.add_employee(props.get("name"), title=props.get("jobTitle"), location=props.get("workLocation")):
+                data.employees_declared = True
+        elif _classes(element) & CARD_CLASSES:
+            name = _child_text(element, NAME_CLASSES)
+            if name is None:
+                continue
+            data.add_employee(
+                name,
+                title=_child_text(element, TITLE_CLASSES),
+                position=_child_text(element, POSITION_CLASSES),
+                location=_child_text(element, LOCATION_CLASSES),
+            )
+
+
+def extract(content):
+    """
+    Return the `StructuredData` of one HTML page (str or bytes).
+    """
+    data = StructuredData()
+    try:
+        document = lxml_html.document_fromstring(content)
+    except (ValueError, lxml_html.etree.ParserError):
+        return data
+    _read_json_ld(document, data)
+    _read_meta(document, data)
+    _read_team_markup(document, data)
+    return data
+
+
+def cached_extract(content, cache=None):
+    """
+    `extract(content)`, reusing the result for identical bytes through the page cache.
+    """
+    return StructuredData.from_json(
+        page_cache.cached_extract(
+            content, "structured-v2", lambda c: extract(c).to_json(), cache, span="extract_structured"
+        )
+    )
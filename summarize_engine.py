@@ -0,0 +1,230 @@
+"""
+Parallel map/reduce summarization with rate-limit-aware scheduling.
+
+Map prompts run concurrently on a thread pool, throttled by a requests-per-minute
+and tokens-per-minute budget, and calls rejected with HTTP 429 are retried with
+backoff. Summaries are then reduced as a tree: they are grouped so each combine
+call fits in `reduce_token_max`, groups are collapsed in parallel and the process
+repeats until one final combine call is left, so large sites reduce in log depth.
+`stuff` and `refine` run the other two summarization strategies through the same
+calls, so every strategy is rate limited, cached and counted in `stats`.
+
+Any object with an `invoke(prompt)` method returning a message with `.content`
+works as the LLM. The RPM/TPM budgets are per API key and model, so engines built
+for the same pair should share one `shared_rate_limiter`.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import http_client
+import instrumentation
+import tokens
+
+
+class RateLimiter:
+    """
+    Sliding one-minute window over requests and tokens. `acquire` blocks until a
+    call of the given size fits in both budgets. A budget of None is unlimited.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, clock=time.monotonic):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._clock = clock
+        self._calls = deque()
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    def _wait_time(self, tokens, now):
+        while self._calls and now - self._calls[0][0] >= 60:
+            _, used = self._calls.popleft()
+            self._tokens -= used
+        if not self._calls:
+            return 0.0
+        wait = 0.0
+        if self.requests_per_minute and len(self._calls) >= self.requests_per_minute:
+            wait = max(wait, 60 - (now - self._calls[0][0]))
+        if self.tokens_per_minute and self._tokens + tokens > self.tokens_per_minute:
+            # Wait for enough of the oldest calls to leave the window.
+            freed = 0
+            for started, used in self._calls:
+                freed += used
+                if self._tokens - freed + tokens <= self.tokens_per_minute:
+                    wait = max(wait, 60 - (now - started))
+                    break
+            else:
+                wait = max(wait, 60 - (now - self._calls[-1][0]))
+        return wait
+
+    def acquire(self, tokens=0):
+        while True:
+            with self._lock:
+                now = self._clock()
+                wait = self._wait_time(tokens, now)
+                if wait <= 0:
+                    self._calls.append((now, tokens))
+                    self._tokens += tokens
+                    return
+            time.sleep(wait)
+
+
+_shared_limiters = {}
+_shared_limiters_lock = threading.Lock()
+
+
+def shared_rate_limiter(key, requests_per_minute=500, tokens_per_minute=300000):
+    """
+    The process-wide `RateLimiter` for `key` (e.g. an `(api_key, model_name)` pair),
+    created with the given budgets on first use.
+    """
+    with _shared_limiters_lock:
+        if key not in _shared_limiters:
+            _shared_limiters[key] = RateLimiter(requests_per_minute, tokens_per_minute)
+        return _shared_limiters[key]
+
+
+def is_rate_limit_error(error):
+    """
+    True for errors that mean "429 Too Many Requests", e.g. `openai.RateLimitError`.
+    """
+    if getattr(error, "status_code", None) == 429:
+        return True
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) == 429
+
+
+class SummarizeEngine:
+    def __init__(
+        self,
+        llm,
+        max_workers=8,
+        requests_per_minute=500,
+        tokens_per_minute=300000,
+        max_retries=5,
+        reduce_token_max=3000,
+        memoize=None,
+        count_tokens=None,
+        rate_limiter=None,
+    ):
+        self.llm = llm
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.reduce_token_max = reduce_token_max
+        self.rate_limiter = rate_limiter or RateLimiter(requests_per_minute, tokens_per_minute)
+        # memoize(text, template, compute) -> str, e.g. Summarize.memoize.
+        self.memoize = memoize or (lambda text, template, compute: compute())
+        self.count_tokens = count_tokens or tokens.count_tokens
+        self.stats = {
+            "calls": 0,
+            "retries": 0,
+            "reduce_levels": 0,
+            "prompt_tokens": 0,
+            "output_tokens": 0,
+        }
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def call(self, prompt_template, text, step="map", **variables):
+        """
+        Run one prompt over `text` (and any other template `variables`), through the
+        memo cache and the rate limiter. `step` ("map", "reduce", "stuff" or
+        "refine") labels the call's metrics.
+        """
+        prompt = prompt_template.format(text=text, **variables)
+        # The other variables (e.g. refine's summary so far) are part of the cache key.
+        key = "\n\n".join([text] + [f"{name}: {variables[name]}" for name in sorted(variables)])
+        return self.memoize(key, prompt_template.template, lambda: self.invoke(prompt, step))
+
+    def invoke(self, prompt, step="map"):
+        """
+        Send one prompt to the LLM through the rate limiter, retrying 429s with
+        backoff, and return the response text. Not cached; see `call`.
+        """
+        prompt_tokens = self.count_tokens(prompt)
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(prompt_tokens)
+            self._count("calls")
+            instrumentation.count("llm_prompt_tokens", prompt_tokens, step=step)
+            try:
+                with instrumentation.span("summarize", step=step):
+                    content = self.llm.invoke(prompt).content
+                self._count("prompt_tokens", prompt_tokens)
+                self._count("output_tokens", self.count_tokens(content))
+                return content
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                self._count("retries")
+                instrumentation.count("llm_retries")
+                time.sleep(http_client.backoff_delay(attempt, getattr(e, "response", None)))
+
+    def map(self, texts, map_prompt_template, step="map"):
+        """
+        Run the map prompt over every text concurrently, keeping the input order.
+        """
+        if len(texts) <= 1:
+            return [self.call(map_prompt_template, text, step) for text in texts]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(lambda text: self.call(map_prompt_template, text, step), texts))
+
+    def group(self, summaries):
+        """
+        Split summaries into consecutive groups whose token total fits in `reduce_token_max`.
+        """
+        groups, current, current_tokens = [], [], 0
+        for summary in summaries:
+            summary_tokens = self.count_tokens(summary)
+            if current and current_tokens + summary_tokens > self.reduce_token_max:
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(summary)
+            current_tokens += summary_tokens
+        if current:
+            groups.append(current)
+        return groups
+
+    def reduce(self, summaries, combine_prompt_template, collapse_prompt_template):
+        """
+        Collapse summaries level by level until they fit in one combine call.
+        """
+        groups = self.group(summaries)
+        # Stop when everything fits, or when grouping can't shrink the list any further.
+        while len(groups) > 1 and len(groups) < len(summaries):
+            self._count("reduce_levels")
+            summaries = self.map(
+                ["\n\n".join(g) for g in groups], collapse_prompt_template, step="reduce"
+            )
+            groups = self.group(summaries)
+        self._count("reduce_levels")
+        return self.call(combine_prompt_template, "\n\n".join(summaries), step="reduce")
+
+    def map_reduce(
+        self, texts, map_prompt_template, combine_prompt_template, collapse_prompt_template=None
+    ):
+        summaries = self.map(texts, map_prompt_template)
+        return self.reduce(
+            summaries, combine_prompt_template, collapse_prompt_template or map_prompt_template
+        )
+
+    def stuff(self, text, prompt_template):
+        """
+        Summarize all of `text` in one call.
+        """
+        return self.call(prompt_template, text, step="stuff")
+
+    def refine(self, texts, initial_prompt_template, refine_prompt_template):
+        """
+        Summarize the first text, then fold in the others one at a time; the refine
+        template gets the summary so far as `existing_answer`.
+        """
+        if not texts:
+            return ""
+        summary = self.call(initial_prompt_template, texts[0], step="refine")
+        for text in texts[1:]:
+            summary = self.call(refine_prompt_template, text, step="refine", existing_answer=summary)
+        return summary
@@ -1,21 +1,36 @@
 from typing import List, Literal, Optional
+import functools
 import os
 import json
-import requests
-from bs4 import BeautifulSoup
-from pydantic import BaseModel, Field
-from urllib.parse import urlparse, urljoin
-from prompt_toolkit import print_formatted_text
-
-from openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.chains.summarize import load_summarize_chain
-from langchain_core.output_parsers import JsonOutputParser
-
-from trafilatura.spider import focused_crawler
-
-import lang_tools_test
+import logging
+import time
+from pydantic import BaseModel, Field, create_model
+
+# langchain and the OpenAI client are imported where they are used, so importing this
+# module (e.g. in batch workers) stays fast; see benchmarks/bench_import_time.py.
+import crawler
+import dedup
+import html_text
+import http_client
+import instrumentation
+import llm_cache
+import page_cache
+import pipeline
+import planner
+import recrawl
+import relevance
+import structured
+import summarize_engine
+import tokens
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "gpt-4o"
+# Model for the summarization steps before the final WebsiteSummary prompt; a
+# cheaper one (e.g. gpt-4o-mini) lets the planner pick "stuff" or "map_reduce" more often.
+MAP_MODEL_NAME = os.getenv("SCRAPER_MAP_MODEL", MODEL_NAME)
+MAP_MAX_TOKENS = 1000
+TEMPERATURE = 0.5
 
 class Employee(BaseModel):
     name: str = Field(..., description="REQUIRED: The name of the person.")
@@ -46,140 +61,325 @@ class WebsiteSummary(BaseModel):
     )
 
 
-def fetch_and_extract_text(url):
+def summary_schema(fields):
+    """
+    `WebsiteSummary` reduced to `fields`, for a prompt that only asks for those.
+    """
+    if set(fields) >= set(WebsiteSummary.__fields__):
+        return WebsiteSummary
+    return create_model(
+        "WebsiteSummary",
+        **{
+            name: (WebsiteSummary.__fields__[name].outer_type_, WebsiteSummary.__fields__[name].field_info)
+            for name in fields
+        },
+    )
+
+
+def fetch_and_extract_text(url, cache=None):
     """
     Fetch HTML content from the URL and extract text.
     """
-    print(f"Fetching and extracting text from {url}")
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/56.0.2924.76 Safari/537.36",
-        "Upgrade-Insecure-Requests": "1",
-        "DNT": "1",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.5",
-        "Accept-Encoding": "gzip, deflate",
-    }
+    logger.info("Fetching and extracting text from %s", url)
     try:
-        response = requests.get(url, headers=headers)
+        response = page_cache.fetch(url, cache)
         response.raise_for_status()  # Check if the request was successful
-        soup = BeautifulSoup(response.text, "html.parser")
-        text_content = soup.get_text(separator=" ", strip=True)
-        return text_content
-    except requests.RequestException as e:
-        print(f"Error fetching or parsing {url}: {e}")
+        return page_cache.cached_extract(
+            response.content, "get_text", lambda _: extract_text_from_html(response.text), cache
+        )
+    except http_client.REQUEST_ERRORS as e:
+        logger.warning("Error fetching or parsing %s: %s", url, e)
         return ""
 
 
-def get_all_website_links(url, max_urls=5):
+def extract_text_from_html(html):
     """
-    Returns all URLs that is found on `url` in which it belongs to the same website
+    Extract the visible text from an already downloaded HTML document.
     """
-    # All URLs of `url`
-    urls = set()
-    # Domain name of the URL without the protocol
-    domain_name = urlparse(url).netloc
-    # Send a HTTP request to the given URL
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/56.0.2924.76 Safari/537.36",
-        "Upgrade-Insecure-Requests": "1",
-        "DNT": "1",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.5",
-        "Accept-Encoding": "gzip, deflate",
-    }
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-    except requests.RequestException as e:
-        print(f"Error fetching {url}: {e}")
-        return urls  # Return empty set on failure
-
-    # Parse the content of the request with BeautifulSoup
-    soup = BeautifulSoup(response.text, "html.parser")
-
-    for a_tag in soup.findAll("a"):
-        href = a_tag.attrs.get("href")
-        if len(urls) >= max_urls:
-            break
-        # if href == "" or href is None:
-        #     # href empty tag
-        #     continue
-        # Join the URL if it's relative (not absolute link)
-        href = urljoin(url, href)
-        parsed_href = urlparse(href)
-        # Remove URL GET parameters, URL fragments, etc.
-        href = parsed_href.scheme + "://" + parsed_href.netloc + parsed_href.path
-
-        if href in urls:
-            # Already in the set
-            continue
-        if domain_name not in href:
-            # External link
-            continue
-        urls.add(href)
-    return urls
-
-
-def fetch_text(start_url, chain_type="map_reduce", max_urls=5):
-    combined_text = ""
-    crawler_results = focused_crawler(start_url, max_seen_urls=max_urls)
-    print("CRAWLER RESULTS: ", crawler_results)
-    urls, _ = crawler_results
-    if not urls:
-        urls = get_all_website_links(start_url, max_urls=max_urls)
-
-    # urls = get_all_website_links(start_url, max_urls=max_urls)
-    # urls=['https://dolphinstudios.co/']
-    if len(urls) > 5:
-        urls = list(urls)[:5]
-    print("******URLS TO SCRAPE : ", urls)
-    for url in urls:
-        # print(url)
-        text_content = fetch_and_extract_text(url)
-
-        combined_text += " " + text_content  # Concatenate text from all URLs
+    return html_text.extract_text(html, "all")
+
+
+def extract_fetched_page(page, cache=None, extraction_pool=None):
+    """
+    Extract the text of a page downloaded by `fetcher`. Failed downloads give an
+    empty string, like `fetch_and_extract_text`. With an `extract_pool.ExtractionPool`
+    the parsing runs in a worker process.
+    """
+    logger.info("Extracting text from %s", page.url)
+    if not page.ok:
+        logger.warning("Error fetching or parsing %s: %s", page.url, page.error)
+        return ""
+    if extraction_pool is not None:
+        extract = lambda content: extraction_pool.extract_text(content, mode="all")
+    else:
+        extract = lambda _: extract_text_from_html(page.text)
+    return page_cache.cached_extract(page.content, "get_text", extract, cache)
+
+
+def extract_fetched_page_data(page, cache=None, extraction_pool=None):
+    """
+    `(text, structured_data)` of a page downloaded by `fetcher`: its text as from
+    `extract_fetched_page` and its `structured.StructuredData` (None if the download failed).
+    """
+    text = extract_fetched_page(page, cache=cache, extraction_pool=extraction_pool)
+    if not page.ok:
+        return text, None
+    return text, structured.cached_extract(page.content, cache)
+
+
+def iter_page_texts(urls, cache=None, ordered=True, extraction_pool=None, **fetch_kwargs):
+    """
+    Yield `(url, text)` for each URL as soon as it has been fetched and extracted,
+    while the other pages are still downloading. With `ordered=True` pages come
+    out in the order of `urls`; otherwise in completion order. `fetch_kwargs` go to
+    `fetcher.fetch_iter` (e.g. a `crawl_delay`).
+    """
+    extract = functools.partial(
+        extract_fetched_page, cache=cache, extraction_pool=extraction_pool
+    )
+    return pipeline.iter_pages(urls, extract, ordered=ordered, cache=cache, **fetch_kwargs)
+
+
+def fetch_and_extract_texts(urls, cache=None):
+    """
+    Fetch every URL concurrently and extract the text of each page, in the order of `urls`.
+    Pages that fail to download yield an empty string, like `fetch_and_extract_text`.
+    """
+    return [text for _, text in iter_page_texts(urls, cache=cache)]
+
+
+def get_all_website_links(url, max_urls=5, cache=None):
+    """
+    Returns up to `max_urls` URLs found on `url` that belong to the same website,
+    best candidates for the summary (team, about, leadership...) first.
+    """
+    site_crawler = crawler.Crawler(max_pages=max_urls + 1, cache=cache)
+    return site_crawler.discover(url)[1:]
+
+
+def discover_site(start_url, max_urls=5, cache=None):
+    """
+    `(urls, fetch_kwargs)`: `start_url` followed by the highest-priority pages
+    linked from it, `max_urls` in total, and the `crawler.Crawler.fetch_kwargs` that
+    let the fetch reuse the pages discovery already downloaded.
+    """
+    site_crawler = crawler.Crawler(max_pages=max_urls, cache=cache)
+    urls = site_crawler.discover(start_url)
+    logger.info("URLs to scrape: %s", urls)
+    return urls, site_crawler.fetch_kwargs()
+
+
+def find_site_urls(start_url, max_urls=5, cache=None):
+    """
+    `start_url` followed by the highest-priority pages linked from it, `max_urls` in total.
+    """
+    return discover_site(start_url, max_urls=max_urls, cache=cache)[0]
+
+
+def iter_site_texts(start_url, max_urls=5, cache=None, ordered=True, extraction_pool=None):
+    """
+    Crawl `start_url` and yield `(url, text)` for each page as it is extracted.
+    """
+    urls, fetch_kwargs = discover_site(start_url, max_urls=max_urls, cache=cache)
+    return iter_page_texts(
+        urls, cache=cache, ordered=ordered, extraction_pool=extraction_pool, **fetch_kwargs
+    )
+
+
+def iter_site_data(start_url, max_urls=5, cache=None, extraction_pool=None):
+    """
+    Like `iter_site_texts`, yielding `(url, (text, structured_data))` in crawl order.
+    """
+    urls, fetch_kwargs = discover_site(start_url, max_urls=max_urls, cache=cache)
+    extract = functools.partial(
+        extract_fetched_page_data, cache=cache, extraction_pool=extraction_pool
+    )
+    return pipeline.iter_pages(urls, extract, ordered=True, cache=cache, **fetch_kwargs)
+
+
+def fetch_text(
+    start_url, chain_type="map_reduce", max_urls=5, cache=None, extraction_pool=None
+):
+    # Concatenate text from all URLs
+    combined_text = "".join(
+        " " + text_content
+        for _, text_content in iter_site_texts(
+            start_url, max_urls=max_urls, cache=cache, extraction_pool=extraction_pool
+        )
+    )
     # call summarize_text funcion to get summerise
     # print(combined_text)
     return combined_text
 
 
-def scrape(start_url, chain_type="map_reduce", max_urls=5):
-    combined_text = ""
-    crawler_results = focused_crawler(start_url, max_seen_urls=max_urls)
-    print("CRAWLER RESULTS: ", crawler_results)
-    urls, _ = crawler_results
-    if not urls:
-        urls = get_all_website_links(start_url, max_urls=max_urls)
-    # urls=['https://dolphinstudios.co/']
-    if len(urls) > 5:
-        urls = list(urls)[:5]
-    print("******URLS TO SCRAPE : ", urls)
-    for url in urls:
-        print(url)
-        text_content = fetch_and_extract_text(url)
-
-        combined_text += " " + text_content  # Concatenate text from all URLs
-    # call summarize_text funcion to get summerise
-    print(combined_text)
-    summary = Summarize()
-
-    if lang_tools_test.num_tokens_from_string(combined_text) > 14000:
-        print(
-            "Text too long to summarize individually, splitting into chunks and summarizing separately"
+def scrape(
+    start_url,
+    chain_type="auto",
+    max_urls=5,
+    cache=None,
+    extraction_pool=None,
+    deduplicate=True,
+    llm=None,
+    token_budget=relevance.TOKEN_BUDGET,
+    structured_data=True,
+    manifest=None,
+    map_llm=None,
+):
+    """
+    Crawl `start_url`, summarize the site and return a `WebsiteSummary` dict. Sites
+    with more than `token_budget` tokens of text are cut down to their most relevant
+    chunks (`relevance.select_chunks`) and only summarized before the final prompt
+    when those chunks would leave out too much; `token_budget=None` keeps all the text.
+
+    How the text is summarized is chosen by `planner.plan` from its token count and
+    the models (`llm` for the final prompt, `map_llm` for the summarization steps,
+    by default `llm`): the cheapest strategy predicted to finish in time. A
+    `chain_type` other than "auto" ("stuff", "refine" or "map_reduce") is used
+    whenever the text is too long to send directly.
+
+    With `structured_data`, fields the site publishes as JSON-LD, meta tags or team
+    markup (`structured.extract`) are filled in directly: the LLM is only asked for
+    the others, and not called at all when `structured.REQUIRED_FIELDS` are all known.
+
+    With a `recrawl.Manifest` (by default the one from SCRAPER_MANIFEST_PATH, if set)
+    the site is rescraped incrementally: pages whose sitemap `lastmod` did not change
+    are read from the manifest instead of fetched, and the stored summary is returned
+    when the site's text is unchanged.
+    """
+    # Count tokens page by page while the remaining pages are still downloading
+    token_counter = tokens.TokenCounter()
+    # Drop near-duplicate pages and nav/footer text already seen on an earlier page
+    deduplicator = dedup.SiteDeduplicator() if deduplicate else None
+    texts = []
+    site_data = structured.StructuredData()
+    manifest = manifest or recrawl.get_default_manifest()
+    refresh = None
+    if manifest is not None:
+        refresh = recrawl.Refresh(manifest, start_url, max_urls=max_urls, cache=cache)
+        pages = refresh.iter_pages(
+            functools.partial(
+                extract_fetched_page_data, cache=cache, extraction_pool=extraction_pool
+            )
         )
-        summarize_text_data = summary.summarize_webpage(
-            combined_text, chain_type=chain_type
+    elif structured_data:
+        pages = iter_site_data(
+            start_url, max_urls=max_urls, cache=cache, extraction_pool=extraction_pool
         )
     else:
+        pages = (
+            (url, (text, None))
+            for url, text in iter_site_texts(
+                start_url, max_urls=max_urls, cache=cache, extraction_pool=extraction_pool
+            )
+        )
+    for url, (text_content, page_data) in pages:
+        if structured_data and page_data is not None:
+            site_data.update(page_data)
+        if deduplicator is not None:
+            text_content = deduplicator.add(url, text_content)
+            if text_content is None:
+                continue
+        texts.append(" " + text_content)
+        token_counter.add(" " + text_content)
+    # Concatenate text from all URLs
+    combined_text = "".join(texts)
+    # call summarize_text funcion to get summerise
+    instrumentation.dump("COMBINED TEXT:", combined_text)
+    if deduplicator is not None:
+        logger.info("Dedup report: %s", deduplicator.report)
+    cache = cache or page_cache.get_default_cache()
+    if cache is not None:
+        logger.info("Page cache stats: %s", cache.stats)
+    if refresh is not None:
+        stored = refresh.stored_summary()
+        if stored is not None:
+            logger.info("Content of %s unchanged since the last scrape, reusing its summary", start_url)
+            refresh.save(stored)
+            return stored
+    result = summarize_site(
+        start_url,
+        combined_text,
+        token_counter,
+        site_data,
+        chain_type=chain_type,
+        llm=llm,
+        token_budget=token_budget,
+        structured_data=structured_data,
+        map_llm=map_llm,
+    )
+    if refresh is not None:
+        refresh.save(result)
+        logger.info("Manifest stats: %s", refresh.manifest.stats)
+    return result
+
+
+def summarize_site(
+    start_url,
+    combined_text,
+    token_counter,
+    site_data,
+    chain_type="auto",
+    llm=None,
+    token_budget=relevance.TOKEN_BUDGET,
+    structured_data=True,
+    map_llm=None,
+):
+    """
+    Summarize a site's combined text (counted by `token_counter`) into a
+    `WebsiteSummary` dict, prefilled from its `structured.StructuredData`; see `scrape`.
+    """
+    known = site_data.prefill()
+    if structured_data and site_data.complete():
+        logger.info("Structured data has every required field, skipping the LLM for %s", start_url)
+        instrumentation.count("structured_data_complete")
+        return WebsiteSummary(**known).dict()
+    if known:
+        logger.info("Prefilled from structured data: %s", sorted(known))
+    summary = Summarize(llm=llm, map_llm=map_llm)
+    started = time.perf_counter()
+
+    text, text_tokens, chunks = combined_text, token_counter.total, None
+    if token_budget is not None and token_counter.exceeds(token_budget):
+        # The chunks are cut from token ids, so their sizes are known without recounting.
+        chunk_ids = token_counter.chunk_ids(relevance.CHUNK_TOKENS, overlap=0)
+        selection = relevance.select_chunks(
+            token_counter.decode(chunk_ids), token_budget, sizes=[len(ids) for ids in chunk_ids]
+        )
+        logger.info("Relevance selection: %s", selection.report)
+        if selection.needs_map_reduce:
+            text = selection.relevant_text
+            text_tokens = tokens.count_tokens(text)
+        else:
+            text, text_tokens = selection.text, selection.tokens_out
+
+    # Text over the token budget was left out by relevance selection, so it is only
+    # sent directly when it fits in the budget.
+    map_model, final_model = summary.llm_settings("map")[0], summary.llm_settings()[0]
+    plan = planner.plan(
+        text_tokens,
+        map_model=map_model,
+        final_model=final_model,
+        strategies=planner.STRATEGIES if chain_type == "auto" else ("direct", chain_type),
+        direct_max_tokens=token_budget,
+    )
+    logger.info("Summarizing %s with %s: %s", start_url, plan.strategy, plan.predicted.as_dict())
+    if plan.strategy == "direct":
         summarize_text_data = {
-            "output_text": "This is the raw data of the company, based on their website"
-            + str(combined_text)
+            "output_text": "This is the raw data of the company, based on their website " + text
         }
+    else:
+        if text is combined_text and plan.strategy != "stuff":
+            chunks = token_counter.chunks()
+        summarize_text_data = summary.summarize_webpage(
+            text, chain_type=plan.strategy, chunks=chunks
+        )
 
-    parser = JsonOutputParser(pydantic_object=WebsiteSummary)
+    from langchain_core.output_parsers import JsonOutputParser
+    from langchain_core.prompts import PromptTemplate
 
     # Set up a parser + inject instructions into the prompt template.
-    parser = JsonOutputParser(pydantic_object=WebsiteSummary)
+    # Only the fields not already found in structured data are asked for.
+    parser = JsonOutputParser(pydantic_object=summary_schema(site_data.missing()))
 
     prompt = PromptTemplate(
         template="Answer the user query.\n{format_instructions}\n{query}\n",
@@ -187,51 +387,183 @@ def scrape(start_url, chain_type="map_reduce", max_urls=5):
         partial_variables={"format_instructions": parser.get_format_instructions()},
     )
 
-    chain = prompt | summary.llm | parser
-
     # Note: At this point, summarize_text_data is a dictionary containing the output from summarize_webpage
-    formatted_summarize_text_data = chain.invoke(
-        {"query": "Please report on this company: " + str(summarize_text_data)}
+    query = "Please report on this company: " + str(summarize_text_data)
+    if known:
+        query += "\nAlready known about the company: " + json.dumps(known)
+
+    def report():
+        # Through the engine, so the final prompt shares the rate limit and 429 retries.
+        return parser.parse(summary.report_engine.invoke(prompt.format(query=query), step="report"))
+
+    formatted_summarize_text_data = summary.memoize_json(
+        query, prompt.template + parser.get_format_instructions(), report
     )
+    if summary.cache is not None:
+        logger.info("LLM cache stats: %s", summary.cache.stats)
+    usage = summary.usage
+    plan.record(time.perf_counter() - started, usage["map"], usage["report"])
 
-    print("summarize", formatted_summarize_text_data)
     # After obtaining summarize_text_data from summarize_webpage
-
-    print("-----------------------------------------------------")
-    print(formatted_summarize_text_data.get("title"))
+    instrumentation.dump("SUMMARY:", formatted_summarize_text_data)
 
     # the format of the schemas.py objects - WebsiteSummary and Employee
     # # call websitesummary class for schema
-    print("-----------------------------------------------------")
-    website_summary = WebsiteSummary(**formatted_summarize_text_data)
-    print(website_summary)
-    print("-----------------------------------------------------")
+    website_summary = WebsiteSummary(**site_data.merge(formatted_summarize_text_data))
     # must we fetch employee details
-    print(website_summary.employees)
+    instrumentation.dump("EMPLOYEES:", website_summary.employees)
     return website_summary.dict()
 
 
 
 class Summarize:
-    def __init__(self):
+    def __init__(self, cache: Optional[llm_cache.LLMCache] = None, llm=None, map_llm=None):
         self.__apikey = os.getenv("OPENAI_API_KEY")
-        self.llm = ChatOpenAI(
-            openai_api_key=self.__apikey,
-            model_name="gpt-4o",
-            temperature=0.5,
-            max_tokens=4000,
+        self._llm = llm
+        # A caller that passes only `llm` gets it for every step.
+        self._map_llm = map_llm if map_llm is not None else llm
+        self.cache = cache or llm_cache.get_default_cache()
+        self._engine = None
+        self._report_engine = None
+
+    @property
+    def llm(self):
+        # Built on first use: cached results never need the client.
+        if self._llm is None:
+            from langchain_openai import ChatOpenAI
+
+            self._llm = ChatOpenAI(
+                openai_api_key=self.__apikey,
+                model_name=MODEL_NAME,
+                temperature=TEMPERATURE,
+                max_tokens=4000,
+            )
+        return self._llm
+
+    @property
+    def map_llm(self):
+        """
+        The model for summarization steps: MAP_MODEL_NAME, or `llm` when it is the same.
+        """
+        if self._map_llm is None:
+            if MAP_MODEL_NAME == MODEL_NAME:
+                return self.llm
+            from langchain_openai import ChatOpenAI
+
+            self._map_llm = ChatOpenAI(
+                openai_api_key=self.__apikey,
+                model_name=MAP_MODEL_NAME,
+                temperature=TEMPERATURE,
+                max_tokens=MAP_MAX_TOKENS,
+            )
+        return self._map_llm
+
+    def llm_settings(self, step="report"):
+        """
+        `(model_name, temperature)` of the model for `step`: "report" or "map".
+        """
+        if step == "map":
+            if self._map_llm is not None:
+                return llm_cache.llm_settings(self._map_llm)
+            if self._llm is None:
+                return MAP_MODEL_NAME, TEMPERATURE
+        if self._llm is None:
+            return MODEL_NAME, TEMPERATURE
+        return llm_cache.llm_settings(self._llm)
+
+    def memoize(self, text, template, compute, step="report"):
+        """
+        Return `compute()` for a string LLM result, reusing a cached result for the same
+        text, prompt template and model settings.
+        """
+        if self.cache is None:
+            return compute()
+        model_name, temperature = self.llm_settings(step)
+        return self.cache.memoize(text, template, model_name, temperature, compute)
+
+    def memoize_json(self, text, template, compute):
+        """
+        Like `memoize`, for structured (JSON-serializable) LLM results.
+        """
+        if self.cache is None:
+            return compute()
+        model_name, temperature = self.llm_settings()
+        return self.cache.memoize_json(text, template, model_name, temperature, compute)
+
+    def rate_limiter(self, step="report"):
+        """
+        The process-wide rate limiter of the API key and model used for `step`, shared
+        by every `Summarize` (e.g. batch.py's worker threads).
+        """
+        return summarize_engine.shared_rate_limiter((self.__apikey, self.llm_settings(step)[0]))
+
+    @property
+    def engine(self):
+        """
+        The `SummarizeEngine` running the summarization steps on `map_llm`.
+        """
+        if self._engine is None:
+            self._engine = summarize_engine.SummarizeEngine(
+                self.map_llm,
+                memoize=functools.partial(self.memoize, step="map"),
+                rate_limiter=self.rate_limiter("map"),
+            )
+        return self._engine
+
+    @property
+    def report_engine(self):
+        """
+        The `SummarizeEngine` sending the final prompt to `llm`.
+        """
+        if self._report_engine is None:
+            self._report_engine = summarize_engine.SummarizeEngine(
+                self.llm, rate_limiter=self.rate_limiter()
+            )
+        return self._report_engine
+
+    @property
+    def usage(self):
+        """
+        LLM calls and tokens spent so far on the summarization steps ("map") and on
+        the final prompt ("report"). Answers from the LLM cache are free.
+        """
+        keys = ("calls", "prompt_tokens", "output_tokens")
+        usage = {}
+        for step, engine in (("map", self._engine), ("report", self._report_engine)):
+            stats = engine.stats if engine is not None else {}
+            usage[step] = {key: stats.get(key, 0) for key in keys}
+        return usage
+
+    def map_reduce(self, chunks, map_prompt_template, combine_prompt_template):
+        """
+        Summarize the chunks in parallel with the map prompt and reduce the summaries
+        as a tree with the combine prompt. Chunk summaries are cached individually, so
+        when only part of a site changes only the new chunks are sent to the LLM.
+        """
+        output_text = self.engine.map_reduce(
+            [chunk.page_content for chunk in chunks],
+            map_prompt_template,
+            combine_prompt_template,
         )
+        logger.info("Summarize engine stats: %s", self.engine.stats)
+        return {"output_text": output_text}
 
     def summarize_webpage(
-        self, text: str, chain_type: Literal["stuff", "refine", "map_reduce"]
+        self,
+        text: str,
+        chain_type: Literal["stuff", "refine", "map_reduce"],
+        chunks: Optional[List[str]] = None,
     ) -> str:
+        from langchain_core.documents import Document
+        from langchain_core.prompts import PromptTemplate
+
         try:
             if text == "" or len(text) < 30:
                 return {"message": "No text to summarize"}
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=6000, chunk_overlap=1000
-            )
-            chunks = text_splitter.create_documents([text])
+            # Split by tokens, reusing the chunks of an existing TokenCounter if given
+            if chunks is None and chain_type != "stuff":
+                chunks = tokens.split_by_tokens(text)
+            chunks = [Document(page_content=chunk) for chunk in chunks or []]
             map_custom_prompt = """
             Summarize the following text in a clear and concise way:
             TEXT:`{text}`
@@ -255,31 +587,42 @@ class Summarize:
             combine_prompt_template = PromptTemplate(
                 input_variables=["text"], template=combine_custom_prompt
             )
+            refine_custom_prompt = """
+            Your job is to produce a final summary.
+            We have provided an existing summary up to a certain point: `{existing_answer}`
+            Refine the existing summary (only if needed) with the additional text below,
+            keeping every person, product and competitor it mentions.
+            Text:`{text}`
+            Refined Summary:
+            """
+            refine_prompt_template = PromptTemplate(
+                input_variables=["existing_answer", "text"], template=refine_custom_prompt
+            )
             if chain_type == "map_reduce":
-                summary_chain = load_summarize_chain(
-                    llm=self.llm,
-                    chain_type=chain_type,
-                    verbose=True,
-                    map_prompt=map_prompt_template,
-                    combine_prompt=combine_prompt_template,
+                summary = self.map_reduce(
+                    chunks, map_prompt_template, combine_prompt_template
                 )
+            elif chain_type == "stuff":
+                summary = {"output_text": self.engine.stuff(text, combine_prompt_template)}
             else:
-                # STUFF OR REFINE METHOD
-                summary_chain = load_summarize_chain(
-                    llm=self.llm, chain_type=chain_type, verbose=True
-                )
-            summary = summary_chain.invoke(chunks)
+                summary = {
+                    "output_text": self.engine.refine(
+                        [chunk.page_content for chunk in chunks],
+                        map_prompt_template,
+                        refine_prompt_template,
+                    )
+                }
             if summary and "output_text" in summary and summary["output_text"].strip():
                 # Ensure the output text is not empty and is valid JSON before parsing
                 try:
                     return summary
                 except json.JSONDecodeError as e:
-                    print(f"Error parsing JSON from output_text: {e}")
-                    print(f"Invalid JSON: {summary['output_text']}")
+                    logger.warning("Error parsing JSON from output_text: %s", e)
+                    instrumentation.dump("INVALID JSON:", summary["output_text"])
                     # Return or handle invalid JSON (for example, you can return an error message)
                     return {"error": "Invalid JSON in output_text"}
             else:
-                print("No valid output_text found in summary")
+                logger.warning("No valid output_text found in summary")
                 # Return or handle missing output_text (for example, you can return an error message)
                 return {"error": "No output_text found"}
 
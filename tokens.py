@@ -0,0 +1,130 @@
+"""
+Token counting and token-based chunking.
+
+Encodings are loaded once per process. `TokenCounter` counts pages incrementally
+as they stream in and then chunks the same token ids, so a site's text is only
+encoded once.
+"""
+import zlib
+from functools import lru_cache
+from typing import List
+
+import instrumentation
+
+DEFAULT_ENCODING = "cl100k_base"
+# Roughly the old chunk_size=6000 / chunk_overlap=1000 characters.
+CHUNK_TOKENS = 1500
+CHUNK_OVERLAP_TOKENS = 250
+# On average one page in this many ends a chunk regardless of how full it is (see
+# `TokenCounter.chunks`).
+PAGE_CUT_ONE_IN = 4
+
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = DEFAULT_ENCODING):
+    import tiktoken
+
+    return tiktoken.get_encoding(encoding_name)
+
+
+def encode(text: str, encoding_name: str = DEFAULT_ENCODING) -> List[int]:
+    with instrumentation.span("tokenize"):
+        token_ids = get_encoding(encoding_name).encode(text, disallowed_special=())
+    instrumentation.count("tokens", len(token_ids))
+    return token_ids
+
+
+def count_tokens(text: str, encoding_name: str = DEFAULT_ENCODING) -> int:
+    return len(encode(text, encoding_name))
+
+
+def chunk_token_ids(token_ids, chunk_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP_TOKENS):
+    """
+    Split a list of token ids into windows of `chunk_tokens` that overlap by `overlap`.
+    """
+    if overlap >= chunk_tokens:
+        raise ValueError("overlap must be smaller than chunk_tokens")
+    step = chunk_tokens - overlap
+    chunks = []
+    for start in range(0, len(token_ids), step):
+        chunks.append(token_ids[start : start + chunk_tokens])
+        if start + chunk_tokens >= len(token_ids):
+            break
+    return chunks
+
+
+def split_by_tokens(
+    text: str,
+    chunk_tokens: int = CHUNK_TOKENS,
+    overlap: int = CHUNK_OVERLAP_TOKENS,
+    encoding_name: str = DEFAULT_ENCODING,
+) -> List[str]:
+    encoding = get_encoding(encoding_name)
+    return [
+        encoding.decode(chunk)
+        for chunk in chunk_token_ids(encode(text, encoding_name), chunk_tokens, overlap)
+    ]
+
+
+class TokenCounter:
+    """
+    Running token count over text that arrives in pieces (e.g. one page at a time).
+    The token ids are kept so `chunks` can split the text without re-encoding it.
+    """
+
+    def __init__(self, encoding_name: str = DEFAULT_ENCODING):
+        self.encoding_name = encoding_name
+        self.page_counts = []
+        # (token ids, whether a chunk always ends after the page) per page.
+        self._pages = []
+
+    def add(self, text: str) -> int:
+        token_ids = encode(text, self.encoding_name)
+        cut = zlib.crc32(text.encode("utf-8")) % PAGE_CUT_ONE_IN == 0
+        self._pages.append((token_ids, cut))
+        self.page_counts.append(len(token_ids))
+        return len(token_ids)
+
+    @property
+    def total(self) -> int:
+        return sum(self.page_counts)
+
+    def exceeds(self, threshold: int) -> bool:
+        # The pages are already encoded (their ids are needed for `chunks`), so this
+        # is a comparison, not another pass over the text.
+        return self.total > threshold
+
+    def chunk_ids(self, chunk_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP_TOKENS) -> List[List[int]]:
+        """
+        Token ids of the chunks. Chunks never span a page boundary unless they pack
+        whole pages, and a page longer than a chunk is windowed from its own start, so
+        an edit to one page does not move the chunk boundaries of the pages after it.
+        Small pages are packed together until the next one does not fit or a page
+        whose content hash picks it as a cut point (content-defined, so the packing
+        falls back in step right after a changed page).
+        """
+        chunks, group = [], []
+        for token_ids, cut in self._pages:
+            if group and len(group) + len(token_ids) > chunk_tokens:
+                chunks.append(group)
+                group = []
+            if len(token_ids) > chunk_tokens:
+                chunks.extend(chunk_token_ids(token_ids, chunk_tokens, overlap))
+                continue
+            group = group + token_ids
+            if cut:
+                chunks.append(group)
+                group = []
+        if group:
+            chunks.append(group)
+        return chunks
+
+    def decode(self, chunk_ids) -> List[str]:
+        """
+        The text of each list of token ids from `chunk_ids`.
+        """
+        encoding = get_encoding(self.encoding_name)
+        return [encoding.decode(chunk) for chunk in chunk_ids]
+
+    def chunks(self, chunk_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP_TOKENS) -> List[str]:
+        return self.decode(self.chunk_ids(chunk_tokens, overlap))